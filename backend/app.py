@@ -1,20 +1,58 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 import os
-import pandas as pd
-from datetime import datetime
+import sys
+import click
+import time
+from datetime import datetime, timedelta
 import json
+from collections import Counter
+
+from sqlalchemy import case, func, cast
+from app.pagination import (
+    parse_limit, keyset_page, iter_keyset, stream_rows, ndjson_lines, json_array_chunks
+)
+from app.exporters import EXPORTERS, export_rows
+from app.pipeline import JobPipeline, CANCELLED, FAILED, SUCCEEDED, job
+from app.report_cache import ReportCache
+from app.downloads import precompress, send_download
+from app.engine_profile import configure_engine_options, apply_engine_profile
+from app.replica import RoutingSession, configure_replica, read_replica, read_with_fallback
+from app.metrics import RequestMetrics
+from app.ingest import Field, read_batches, validate_batch, insert_batch, MAX_REPORTED_ERRORS
+from config import Config
+from app.aggregates import (
+    HISTOGRAM_PRECISION, histogram_bucket, histogram_percentile, upsert_increments
+)
+from app.settings_store import DEFAULT_SETTINGS, SECRET_SETTINGS, SettingsStore
+from app.auth import role_required
 
 app = Flask(__name__)
-CORS(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stratosys.db'
+# Cross-origin pages follow X-Next-Cursor to page through listings
+CORS(app, expose_headers=['X-Next-Cursor'])
+app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_engine_options(app)
+configure_replica(app, Config.DATABASE_REPLICA_URL)
 app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-in-production'
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+app.config['DOWNLOAD_OFFLOAD'] = Config.DOWNLOAD_OFFLOAD
+app.config['DOWNLOAD_ACCEL_PREFIX'] = Config.DOWNLOAD_ACCEL_PREFIX
+app.config['USE_X_SENDFILE'] = Config.DOWNLOAD_OFFLOAD == 'x-sendfile'
+app.config['SLOW_REQUEST_SECONDS'] = Config.SLOW_REQUEST_SECONDS
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+apply_engine_profile(app, db)
+metrics = RequestMetrics(app, db)
 jwt = JWTManager(app)
+jobs = JobPipeline(app)
+report_cache = ReportCache(
+    'reports',
+    max_bytes=int(os.environ.get('REPORT_CACHE_MAX_BYTES', 1024 * 1024 * 1024)),
+    max_age=int(os.environ.get('REPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+)
 
 # Database Models
 class User(db.Model):
@@ -34,6 +72,12 @@ class Submission(db.Model):
     group = db.Column(db.String(50))
     responses = db.Column(db.JSON)
 
+    __table_args__ = (
+        db.Index('ix_submission_date', 'date'),
+        db.Index('ix_submission_group', 'group'),
+        db.Index('ix_submission_score', 'score'),
+    )
+
 class Report(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -44,9 +88,129 @@ class Report(db.Model):
     file_path = db.Column(db.String(500))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
-# Initialize database
-with app.app_context():
+    __table_args__ = (
+        db.Index('ix_report_file_path', 'file_path'),
+    )
+
+class SubmissionRollup(db.Model):
+    # Running totals per scope: ('all', ''), ('group', <group>), ('day', 'YYYY-MM-DD')
+    scope = db.Column(db.String(10), primary_key=True)
+    key = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_max = db.Column(db.Float)
+
+class ScoreBucket(db.Model):
+    # Score histogram at HISTOGRAM_PRECISION decimal places, used for percentiles
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class Settings(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), unique=True, nullable=False)
+    value = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+class SettingsVersion(db.Model):
+    __tablename__ = 'settings_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+settings = SettingsStore(db, Settings, SettingsVersion, DEFAULT_SETTINGS, SECRET_SETTINGS)
+
+def is_scored(score):
+    # Unscored submissions default to 0 and have never counted towards the stats
+    return bool(score)
+
+def record_submissions(rows):
+    """Fold new submissions into the rollups within the current transaction.
+
+    ``rows`` holds equal-length ``score``, ``group`` and ``date`` lists.
+    Rows are totalled per (group, day) first, so a batch costs a few
+    executemany upserts however many rows it has.
+    """
+    # Identical (group, day, score) rows are counted in C before the loop
+    days = [date.date() for date in rows['date']]
+    combos = {}
+    buckets = {}
+    for (group, day, score), repeat in Counter(zip(rows['group'], days, rows['score'])).items():
+        key = (group or '', day)
+        totals = combos.get(key)
+        if totals is None:
+            totals = combos[key] = [0, 0, 0, None]
+        totals[0] += repeat
+        if is_scored(score):
+            totals[1] += repeat
+            totals[2] += score * repeat
+            if totals[3] is None or score > totals[3]:
+                totals[3] = score
+            bucket = histogram_bucket(score)
+            buckets[bucket] = buckets.get(bucket, 0) + repeat
+
+    rollups = {}
+    for (group, day), (count, score_count, score_sum, score_max) in combos.items():
+        for key in (('all', ''), ('group', group), ('day', day.strftime('%Y-%m-%d'))):
+            totals = rollups.setdefault(key, {'scope': key[0], 'key': key[1], 'count': 0,
+                                              'score_count': 0, 'score_sum': 0, 'score_max': None})
+            totals['count'] += count
+            totals['score_count'] += score_count
+            totals['score_sum'] += score_sum
+            if score_max is not None and (totals['score_max'] is None or score_max > totals['score_max']):
+                totals['score_max'] = score_max
+
+    upsert_increments(db.session, SubmissionRollup.__table__, ['scope', 'key'],
+                      ['count', 'score_count', 'score_sum'], ['score_max'], list(rollups.values()))
+    upsert_increments(db.session, ScoreBucket.__table__, ['bucket'], ['count'], [],
+                      [{'bucket': bucket, 'count': count} for bucket, count in buckets.items()])
+
+def record_submission(submission):
+    record_submissions({'score': [submission.score], 'group': [submission.group], 'date': [submission.date]})
+
+def rebuild_rollups():
+    """Recompute every rollup from the submissions table with SQL aggregates."""
+    scored = Submission.score != 0
+    score = case((scored, Submission.score))
+    totals = [
+        func.count(Submission.id),
+        func.count(score),
+        func.coalesce(func.sum(score), 0),
+        func.max(score)
+    ]
+    scopes = [
+        ('all', None),
+        ('group', func.coalesce(Submission.group, '')),
+        ('day', func.date(Submission.date))
+    ]
+
+    SubmissionRollup.query.delete()
+    ScoreBucket.query.delete()
+    for scope, key in scopes:
+        if key is None:
+            rows = [('',) + tuple(db.session.query(*totals).one())]
+        else:
+            rows = db.session.query(key, *totals).group_by(key).all()
+        for key_value, count, score_count, score_sum, score_max in rows:
+            db.session.add(SubmissionRollup(
+                scope=scope, key=str(key_value), count=count,
+                score_count=score_count, score_sum=score_sum, score_max=score_max
+            ))
+
+    bucket = cast(Submission.score * 10 ** HISTOGRAM_PRECISION + 0.5, db.Integer)
+    for bucket_value, count in (db.session.query(bucket, func.count())
+                                .filter(scored).group_by(bucket)):
+        db.session.add(ScoreBucket(bucket=bucket_value, count=count))
+    db.session.commit()
+
+def init_db():
+    """Create missing tables and indexes, seed sample data and fill empty rollups."""
     db.create_all()
+    # create_all skips tables that already exist, so add indexes they lack
+    for table in (Submission.__table__, Report.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
     
     # Create sample data if none exists
     if User.query.count() == 0:
@@ -71,38 +235,143 @@ with app.app_context():
             
         db.session.commit()
 
+    if SubmissionRollup.query.first() is None and Submission.query.first() is not None:
+        rebuild_rollups()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the schema and seed sample data: python app.py init-db"""
+    init_db()
+    click.echo('Database initialised')
+
+def submission_row(sub, include_id=True):
+    row = {
+        'name': sub.name,
+        'email': sub.email,
+        'score': sub.score,
+        'date': sub.date.strftime('%Y-%m-%d'),
+        'group': sub.group
+    }
+    if include_id:
+        row['id'] = sub.id
+    return row
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{name} must be YYYY-MM-DD')
+
+def parse_float_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+def filtered_submissions(date_order=False):
+    """Submission query with the group/score/date filters from the query string.
+
+    ``date_order`` is for listings sorted by date.  ix_submission_group
+    holds each group in id order, so the group filter is then written so
+    that the planner walks ix_submission_date instead of sorting every
+    matching row for each page.  A (group, date) index would avoid that
+    but costs bulk inserts about a third of their throughput.
+    """
+    query = Submission.query
+    groups = request.args.getlist('group')
+    if groups:
+        group = Submission.group
+        if date_order:
+            # group || '' is the same value (NULL stays NULL) but no index matches it
+            group = group.concat('')
+        query = query.filter(group.in_(groups))
+    min_score = parse_float_arg('min_score')
+    if min_score is not None:
+        query = query.filter(Submission.score >= min_score)
+    max_score = parse_float_arg('max_score')
+    if max_score is not None:
+        query = query.filter(Submission.score <= max_score)
+    date_from = parse_date_arg('date_from')
+    if date_from:
+        query = query.filter(Submission.date >= date_from)
+    date_to = parse_date_arg('date_to')
+    if date_to:
+        # date_to is inclusive of the whole day
+        query = query.filter(Submission.date < date_to + timedelta(days=1))
+    return query
+
+def submission_sort_columns():
+    sort = request.args.get('sort', 'id')
+    if sort == 'id':
+        return [Submission.id]
+    if sort == 'date':
+        return [Submission.date, Submission.id]
+    raise ValueError('sort must be one of: id, date')
+
+def submission_listing_query():
+    """``(query, sort columns)`` for the submission listings, before the keyset clause."""
+    columns = submission_sort_columns()
+    return filtered_submissions(date_order=columns[0] is Submission.date), columns
+
+def list_submissions(serialize, envelope=None):
+    """Shared body of the submission listings.
+
+    Without ``stream`` this returns one keyset page; the cursor for the next
+    page is sent in ``X-Next-Cursor`` (and ``next_cursor`` when enveloped).
+    ``stream=ndjson`` or ``stream=json`` instead streams the matching rows
+    from a server-side cursor, so memory stays flat regardless of size.
+    Streams honour ``after`` too, but ``limit`` only applies when given;
+    a limited, enveloped JSON stream ends with its ``next_cursor``.
+    """
+    query, columns = submission_listing_query()
+    after = request.args.get('after')
+
+    stream = request.args.get('stream')
+    if stream in ('ndjson', 'json'):
+        limit = parse_limit(request.args.get('limit'), default=None, maximum=None)
+        rows = stream_rows(query, columns, after, limit)
+    if stream == 'ndjson':
+        return Response(stream_with_context(ndjson_lines(rows, serialize)),
+                        mimetype='application/x-ndjson')
+    if stream == 'json':
+        return Response(stream_with_context(json_array_chunks(rows, serialize, envelope)),
+                        mimetype='application/json')
+    if stream:
+        raise ValueError('stream must be one of: ndjson, json')
+
+    limit = parse_limit(request.args.get('limit'))
+    rows, next_cursor = keyset_page(query, columns, after, limit)
+    data = [serialize(row) for row in rows]
+    if envelope:
+        response = jsonify({envelope: data, 'next_cursor': next_cursor})
+    else:
+        response = jsonify(data)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
 @app.route('/fetch-data', methods=['GET'])
+@read_replica
 def fetch_data():
     try:
-        submissions = Submission.query.all()
-        data = []
-        for sub in submissions:
-            data.append({
-                'name': sub.name,
-                'email': sub.email,
-                'score': sub.score,
-                'date': sub.date.strftime('%Y-%m-%d'),
-                'group': sub.group
-            })
-        return jsonify({'data': data})
+        return list_submissions(lambda sub: submission_row(sub, include_id=False), envelope='data')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/submissions', methods=['GET'])
 def get_submissions():
     try:
-        submissions = Submission.query.all()
-        data = []
-        for sub in submissions:
-            data.append({
-                'id': sub.id,
-                'name': sub.name,
-                'email': sub.email,
-                'score': sub.score,
-                'date': sub.date.strftime('%Y-%m-%d'),
-                'group': sub.group
-            })
-        return jsonify(data)
+        return list_submissions(submission_row)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -117,12 +386,74 @@ def create_submission():
             group=data.get('group', 'Default')
         )
         db.session.add(submission)
+        db.session.flush()
+        record_submission(submission)
         db.session.commit()
         return jsonify({'message': 'Submission created successfully', 'id': submission.id}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+SUBMISSION_SCHEMA = {
+    'name': Field('string', required=True, max_length=100),
+    'email': Field('string', required=True, max_length=120),
+    'score': Field('number', default=0),
+    'group': Field('string', default='Default', max_length=50),
+    'date': Field('datetime', default=datetime.utcnow),
+    'responses': Field('json')
+}
+
+@app.route('/api/submissions/bulk', methods=['POST'])
+def bulk_create_submissions():
+    """Insert many submissions from a JSON array, NDJSON or CSV body.
+
+    Each batch is validated column-wise, then inserted with a single
+    executemany and committed together with its rollup updates.  Invalid
+    rows are skipped and reported; with ``?atomic=1`` nothing is committed
+    unless every row is valid.
+    """
+    atomic = request.args.get('atomic') in ('1', 'true')
+    started = time.perf_counter()
+    inserted = 0
+    rows_seen = 0
+    errors = []
+    error_count = 0
+    try:
+        for batch in read_batches(request):
+            columns, batch_errors = validate_batch(batch, SUBMISSION_SCHEMA, offset=rows_seen)
+            rows_seen += len(batch)
+            valid = len(batch) - len(batch_errors)
+            error_count += len(batch_errors)
+            errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            if valid and not (atomic and error_count):
+                insert_batch(db.session, Submission.__table__, columns)
+                record_submissions(columns)
+                inserted += valid
+                if not atomic:
+                    db.session.commit()
+        if atomic and error_count:
+            db.session.rollback()
+            inserted = 0
+        else:
+            db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'inserted': inserted}), 500
+
+    seconds = time.perf_counter() - started
+    return jsonify({
+        'inserted': inserted,
+        'failed': error_count,
+        'errors': errors,
+        'errors_truncated': error_count > len(errors),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows_seen / seconds, 1) if seconds else None
+    }), 201 if inserted else 200
+
 @app.route('/api/reports', methods=['GET'])
+@read_replica
 def get_reports():
     try:
         reports = Report.query.all()
@@ -140,12 +471,106 @@ def get_reports():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+EXPORT_HEADER = ['Name', 'Email', 'Score', 'Date', 'Group']
+EXPORT_CHUNK_SIZE = 5000
+
+def iter_export_rows(ctx=None, total=None, max_id=None):
+    """Yield export rows as plain tuples, fetched in keyset-paged chunks.
+
+    ``max_id`` stops at the newest submission of a ``data_version()``, so
+    the file holds exactly the rows its cache key promises.
+    """
+    query = db.session.query(Submission.id, Submission.name, Submission.email,
+                             Submission.score, Submission.date, Submission.group)
+    if max_id is not None:
+        query = query.filter(Submission.id <= max_id)
+    for done, row in enumerate(iter_keyset(query, [Submission.id], EXPORT_CHUNK_SIZE), 1):
+        yield (row.name, row.email, row.score, row.date.strftime('%Y-%m-%d'), row.group)
+        if ctx and done % EXPORT_CHUNK_SIZE == 0:
+            ctx.progress(done, total, message=f'Exported {done} rows')
+
+def data_version():
+    """Cheap fingerprint of the submissions table; submissions are append-only."""
+    totals = db.session.get(SubmissionRollup, ('all', ''))
+    max_id = db.session.query(func.max(Submission.id)).scalar()
+    return [max_id, totals.count if totals else 0]
+
+def finish_export_report(status, report_id, export_kind, output_path, version=None):
+    """Give the report row its final status, also when no attempt started."""
+    db.session.rollback()
+    report = db.session.get(Report, report_id)
+    if report is not None and status != SUCCEEDED:
+        report.status = 'cancelled' if status == CANCELLED else 'failed'
+        db.session.commit()
+
+@job('export_submissions', retries=2, on_finished=finish_export_report)
+def export_report_job(ctx, report_id, export_kind, output_path, version=None):
+    """Export the submissions as of ``version`` (the ``data_version()`` in the cache key)."""
+    report = db.session.get(Report, report_id)
+    # Write beside the final name and rename, so concurrent requests for
+    # the same cache key never see a partial file
+    partial_path = f'{output_path}.tmp-{ctx.job_id}'
+    try:
+        report.status = 'processing'
+        db.session.commit()
+
+        max_id, total = version if version else (None, None)
+        if total is None:
+            totals = db.session.get(SubmissionRollup, ('all', ''))
+            total = totals.count if totals else None
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        # The full-table read goes to the replica once it has caught up with
+        # the version; a lagging replica would file old rows under a new key.
+        # The status updates stay on the primary.
+        metadata = read_with_fallback(
+            lambda: export_rows(partial_path, export_kind, EXPORT_HEADER, iter_export_rows(ctx, total, max_id)),
+            Submission.id, target=max_id)
+        os.replace(partial_path, output_path)
+        precompress(output_path)
+        report.file_path = output_path
+        report.status = 'completed'
+        db.session.commit()
+        report_cache.evict()
+        return {
+            'report_id': report.id,
+            'download_url': f'/download-report/{report.id}',
+            'metadata': metadata
+        }
+    except BaseException:
+        # finish_export_report or the next attempt sets the status
+        db.session.rollback()
+        raise
+    finally:
+        # Gone after a successful rename; a failed or cancelled attempt leaves it
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+def completed_report_query(file_path):
+    """The newest completed report stored at ``file_path`` (a report cache entry)."""
+    return Report.query.filter_by(file_path=file_path, status='completed').order_by(Report.id.desc())
+
 @app.route('/generate-report', methods=['POST'])
 def generate_report():
     try:
         data = request.get_json()
         report_type = data.get('report_type', 'summary')
         report_format = data.get('format', 'pdf')
+        export_kind = 'csv_gz' if report_format == 'csv' and data.get('gzip') else report_format
+
+        # Reuse the file from an earlier identical request over the same data
+        if export_kind in EXPORTERS:
+            extension, _ = EXPORTERS[export_kind]
+            params = {'report_type': report_type, 'export': export_kind}
+            version = data_version()
+            output_path = report_cache.path_for(params, version, extension)
+            cached = completed_report_query(output_path).first()
+            if report_cache.lookup(output_path, cached is not None):
+                return jsonify({
+                    'message': 'Report generated successfully',
+                    'report_id': cached.id,
+                    'download_url': f'/download-report/{cached.id}',
+                    'cached': True
+                })
         
         # Create report record
         report = Report(
@@ -157,41 +582,58 @@ def generate_report():
         db.session.add(report)
         db.session.commit()
         
-        # Generate actual report file
-        if report_format == 'excel':
-            submissions = Submission.query.all()
-            df_data = []
-            for sub in submissions:
-                df_data.append({
-                    'Name': sub.name,
-                    'Email': sub.email,
-                    'Score': sub.score,
-                    'Date': sub.date.strftime('%Y-%m-%d'),
-                    'Group': sub.group
-                })
-            df = pd.DataFrame(df_data)
-            output_path = f'reports/report_{report.id}.xlsx'
-            os.makedirs('reports', exist_ok=True)
-            df.to_excel(output_path, index=False)
-            report.file_path = output_path
+        # Generate actual report file in the background
+        if export_kind in EXPORTERS:
+            report.status = 'processing'
             db.session.commit()
-            
+            job_id = jobs.submit(export_report_job, report.id, export_kind, output_path, version)
+
+            # Callers may wait briefly so small exports come back in one round trip
+            state = jobs.wait(job_id, min(float(data.get('wait', 0)), 30))
+            if state['status'] == SUCCEEDED:
+                return jsonify({'message': 'Report generated successfully', 'job_id': job_id,
+                                **state['result']})
+            if state['status'] == FAILED:
+                return jsonify({'error': state['error'], 'report_id': report.id, 'job_id': job_id}), 500
+            if state['status'] == CANCELLED:
+                return jsonify({'error': 'Report generation was cancelled', 'report_id': report.id,
+                                'job_id': job_id}), 409
             return jsonify({
-                'message': 'Report generated successfully',
+                'message': 'Report generation started',
                 'report_id': report.id,
-                'download_url': f'/download-report/{report.id}'
-            })
+                'job_id': job_id,
+                'status_url': f'/api/jobs/{job_id}'
+            }), 202
         
         return jsonify({'message': 'Report generation started', 'report_id': report.id})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/reports/cache', methods=['GET'])
+def get_report_cache_stats():
+    return jsonify(report_cache.stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    state = jobs.get(job_id)
+    if state is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(state)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({'error': 'Job is not running'}), 409
+    return jsonify({'id': job_id, 'status': 'cancelling'}), 202
+
 @app.route('/download-report/<int:report_id>')
 def download_report(report_id):
     try:
         report = Report.query.get_or_404(report_id)
         if report.file_path and os.path.exists(report.file_path):
-            return send_file(report.file_path, as_attachment=True)
+            # Cached files are named by hash; offer a readable name instead
+            extension = os.path.basename(report.file_path).split('.', 1)[-1]
+            return send_download(report.file_path, f"{report.title.replace(' ', '_')}.{extension}")
         else:
             return jsonify({'error': 'Report file not found'}), 404
     except Exception as e:
@@ -212,7 +654,8 @@ def login():
                 db.session.add(user)
                 db.session.commit()
             
-            access_token = create_access_token(identity=user.id)
+            # PyJWT needs a string subject; the role claim authorises admin-only routes
+            access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
             return jsonify({
                 'access_token': access_token,
                 'user': {
@@ -227,47 +670,87 @@ def login():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def rollup_stats(rollup):
+    if rollup is None or rollup.score_count == 0:
+        return 0, 0
+    return rollup.score_sum / rollup.score_count, rollup.score_max
+
 @app.route('/api/dashboard/stats', methods=['GET'])
+@read_replica
 def get_dashboard_stats():
     try:
-        total_submissions = Submission.query.count()
-        scores = [s.score for s in Submission.query.all() if s.score]
-        avg_score = sum(scores) / len(scores) if scores else 0
-        top_score = max(scores) if scores else 0
-        
-        # Calculate median
-        sorted_scores = sorted(scores)
-        n = len(sorted_scores)
-        median_score = sorted_scores[n//2] if n % 2 == 1 else (sorted_scores[n//2-1] + sorted_scores[n//2]) / 2 if n > 0 else 0
-        
+        days = int(request.args.get('days', 30))
+        totals = db.session.get(SubmissionRollup, ('all', ''))
+        total_submissions = totals.count if totals else 0
+        scored_count = totals.score_count if totals else 0
+        avg_score, top_score = rollup_stats(totals)
+
+        buckets = db.session.query(ScoreBucket.bucket, ScoreBucket.count) \
+            .order_by(ScoreBucket.bucket).all()
+        percentiles = {
+            f'p{int(q * 100)}': round(histogram_percentile(buckets, scored_count, q), 2)
+            for q in (0.25, 0.5, 0.75, 0.9)
+        }
+
+        groups = []
+        for rollup in SubmissionRollup.query.filter_by(scope='group').order_by(SubmissionRollup.key):
+            group_avg, group_top = rollup_stats(rollup)
+            groups.append({
+                'group': rollup.key,
+                'submissions': rollup.count,
+                'averageScore': round(group_avg, 2),
+                'topScore': group_top
+            })
+
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+        daily = []
+        for rollup in SubmissionRollup.query.filter(
+                SubmissionRollup.scope == 'day', SubmissionRollup.key >= since
+        ).order_by(SubmissionRollup.key):
+            day_avg, _ = rollup_stats(rollup)
+            daily.append({
+                'date': rollup.key,
+                'submissions': rollup.count,
+                'averageScore': round(day_avg, 2)
+            })
+
         return jsonify({
             'totalSubmissions': total_submissions,
             'averageScore': round(avg_score, 2),
             'activeUsers': total_submissions,  # Simplified
             'topScore': top_score,
-            'medianScore': round(median_score, 2)
+            'medianScore': percentiles['p50'],
+            'percentiles': percentiles,
+            'groups': groups,
+            'daily': daily
         })
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
-    # Return current settings
-    return jsonify({
-        'companyName': 'StratoSys Report',
-        'timezone': 'UTC+8',
-        'emailNotifications': True,
-        'language': 'English'
-    })
+    try:
+        return jsonify(settings.get_many(request.args.getlist('key') or None))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/settings', methods=['POST'])
+@role_required('admin')
 def update_settings():
     try:
-        data = request.get_json()
-        # In a real app, save to database
-        return jsonify({'message': 'Settings updated successfully'})
+        version = settings.set_many(request.get_json(silent=True))
+        return jsonify({'message': 'Settings updated successfully', 'version': version})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    if len(sys.argv) > 1:
+        # ``flask --app app`` finds the app package, so CLI commands go through here
+        from flask.cli import FlaskGroup
+        FlaskGroup(create_app=lambda: app)()
+    else:
+        app.run(debug=True)
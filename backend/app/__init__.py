@@ -6,12 +6,18 @@ from flask_jwt_extended import JWTManager
 from celery import Celery
 import os
 from dotenv import load_dotenv
+from .pipeline import JobPipeline
+from .engine_profile import configure_engine_options, apply_engine_profile
+from .replica import RoutingSession, configure_replica
+from .metrics import RequestMetrics, serve_metrics
 
 load_dotenv()
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 celery = Celery(__name__)
 jwt = JWTManager()
+jobs = JobPipeline()
+metrics = RequestMetrics()
 
 def create_app():
     app = Flask(__name__)
@@ -19,11 +25,21 @@ def create_app():
     # Configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///app.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_engine_options(app)
+    configure_replica(app, os.getenv('DATABASE_REPLICA_URL'))
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key')
+    # Without a broker, jobs run on an in-process thread pool
+    app.config['JOB_BACKEND'] = os.getenv('JOB_BACKEND', 'celery' if os.getenv('CELERY_BROKER_URL') else 'thread')
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 4))
+    app.config['SLOW_REQUEST_SECONDS'] = float(os.getenv('SLOW_REQUEST_SECONDS', 1.0))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
     
     # Initialize extensions
-    CORS(app)
+    CORS(app, expose_headers=['X-Next-Cursor'])
     db.init_app(app)
+    apply_engine_profile(app, db)
+    metrics.init_app(app, db)
     jwt.init_app(app)
     Migrate(app, db)
     
@@ -32,9 +48,32 @@ def create_app():
         broker_url=os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
         result_backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
     )
+
+    class ContextTask(celery.Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery.Task = ContextTask
+    jobs.init_app(app, celery)
+
+    metrics_port = int(os.getenv('JOB_METRICS_PORT') or 0)
+    if metrics_port:
+        from celery.signals import worker_process_init
+
+        @worker_process_init.connect(weak=False)
+        def serve_job_metrics(**kwargs):
+            from billiard import current_process
+            serve_metrics(metrics_port + getattr(current_process(), 'index', 0))
     
+    from .auth import configure_auth
+    configure_auth(app, jwt)
+
     # Register blueprints
     from .routes import api
     app.register_blueprint(api, url_prefix='/api')
+
+    from .commands import register_commands
+    register_commands(app)
     
     return app
@@ -0,0 +1,92 @@
+"""SQL-side aggregation helpers and incrementally maintained rollups.
+
+Rollup rows are keyed tables of running counters.  ``upsert_increments``
+bumps them inside the writer's transaction, and score histograms store
+one row per fixed-precision bucket so percentiles are read from a
+bounded structure instead of sorting every score on each request.
+"""
+from sqlalchemy import case
+from sqlalchemy.dialects import postgresql, sqlite
+
+HISTOGRAM_PRECISION = 2
+
+
+def histogram_bucket(value, precision=HISTOGRAM_PRECISION):
+    # Same truncation as CAST(value * 10^p + 0.5 AS INTEGER), so a rebuild
+    # done in SQL lands every score in the bucket the incremental path used.
+    return int(value * 10 ** precision + 0.5)
+
+
+def bucket_value(bucket, precision=HISTOGRAM_PRECISION):
+    return bucket / 10 ** precision
+
+
+def _greatest(column, value):
+    return case((column.is_(None), value), (column < value, value), else_=column)
+
+
+def upsert_increment(session, table, keys, increments, maxima=None):
+    """Add ``increments`` to the row identified by ``keys`` and raise its ``maxima``.
+
+    The row is created if it does not exist yet.
+    """
+    upsert_increments(session, table, list(keys), list(increments), list(maxima or {}),
+                      [{**keys, **increments, **(maxima or {})}])
+
+
+def upsert_increments(session, table, key_names, increment_names, max_names, rows):
+    """Apply ``upsert_increment`` to many rows, each a dict of every named column.
+
+    SQLite and PostgreSQL do this as one ``INSERT ... ON CONFLICT``
+    statement executed for all rows at once; other databases fall back to
+    update-then-insert per row.
+    """
+    if not rows:
+        return
+    # A Connection works too, e.g. from inside flush events
+    bind = session.get_bind() if hasattr(session, 'get_bind') else session
+    dialect = bind.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table)
+        set_ = {name: table.c[name] + stmt.excluded[name] for name in increment_names}
+        set_.update({name: _greatest(table.c[name], stmt.excluded[name]) for name in max_names})
+        session.execute(stmt.on_conflict_do_update(index_elements=key_names, set_=set_), rows)
+        return
+
+    for row in rows:
+        set_ = {name: table.c[name] + row[name] for name in increment_names}
+        set_.update({name: _greatest(table.c[name], row[name]) for name in max_names})
+        where = [table.c[name] == row[name] for name in key_names]
+        result = session.execute(table.update().where(*where).values(**set_))
+        if result.rowcount == 0:
+            session.execute(table.insert().values(**row))
+
+
+def histogram_percentile(buckets, total, q, precision=HISTOGRAM_PRECISION):
+    """Linearly interpolated ``q`` quantile of a histogram.
+
+    ``buckets`` is an iterable of ``(bucket, count)`` sorted by bucket and
+    ``total`` the sum of the counts.  With ``q=0.5`` this matches the usual
+    median (mean of the two middle values for an even count).
+    """
+    if total <= 0:
+        return 0
+    position = q * (total - 1)
+    lower_rank = int(position)
+    upper_rank = min(lower_rank + 1, total - 1)
+    fraction = position - lower_rank
+
+    lower = upper = None
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if lower is None and seen > lower_rank:
+            lower = bucket_value(bucket, precision)
+        if seen > upper_rank:
+            upper = bucket_value(bucket, precision)
+            break
+    if lower is None or upper is None:
+        return 0
+    return lower + (upper - lower) * fraction
@@ -0,0 +1,484 @@
+"""Columnar side tables for form answers.
+
+``Submission.responses`` is a JSON blob, so per-question analysis would
+otherwise parse every row in Python.  Each form gets a derived table
+``form_<id>_answers`` with one typed column per question in
+``Form.fields`` (numbers as floats, dates as dates, each checkbox option
+as its own boolean), named after the field id and keyed by submission
+id.  Rows are written alongside the submission in the same transaction,
+so per-question aggregates, cross-tabs and filters are plain SQL over
+narrow typed columns.
+
+The tables are derived data: they live outside ``db.metadata`` (and so
+outside migrations) and can be rebuilt at any time with
+``rebuild_answers``.  When a form gains a question or a question changes
+type, the ``rebuild_form_answers`` job rebuilds the table from the row
+store; until it has, writes to it are skipped and reads raise
+``AnswersTableStale``.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .models import Form, Submission, db
+
+REBUILD_CHUNK_SIZE = 5000
+MAX_CACHED_TABLES = 256
+
+metadata = sa.MetaData()
+_tables = OrderedDict()
+# Guards _tables and metadata, which request threads and jobs share
+_tables_lock = threading.Lock()
+# Forms whose rebuild job has been queued by this process and not yet started
+_rebuilding = set()
+
+
+class AnswersTableStale(Exception):
+    """A form's side table lacks a question or has one with the wrong type."""
+
+    def __init__(self, form_id):
+        super().__init__(f'Answers for form {form_id} are being rebuilt')
+        self.form_id = form_id
+
+
+class AnswerColumn:
+    def __init__(self, name, key, kind, option=None):
+        self.name = name        # column in the side table
+        self.key = key          # key in Submission.responses
+        self.kind = kind        # 'number', 'date', 'option' or 'text'
+        self.option = option    # checkbox option this boolean column stands for
+
+    def sql_type(self):
+        return {'number': sa.Float, 'date': sa.Date, 'option': sa.Boolean}.get(self.kind, sa.Text)()
+
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '_', str(text).lower()).strip('_') or 'field'
+
+
+def _name_part(text, limit):
+    """A column-name fragment that depends only on ``text``.
+
+    Texts that are already short slugs are used as they are; anything else
+    gets a hash of the full text, so two texts never share a fragment.
+    """
+    text = str(text)
+    slug = _slug(text)
+    if slug == text and len(slug) <= limit:
+        return slug
+    return f'{slug[:limit]}_{hashlib.sha1(text.encode()).hexdigest()[:8]}'
+
+
+def field_list(fields):
+    if isinstance(fields, dict):
+        return [{'id': key, **(value if isinstance(value, dict) else {})} for key, value in fields.items()]
+    return [field for field in fields or [] if isinstance(field, dict)]
+
+
+def answer_columns(fields):
+    """Side-table columns for a form's field definitions, in field order.
+
+    Column names come from each field's id (and checkbox option), never
+    from its position, so reordering or removing fields leaves the other
+    questions' columns where they were.  Names stay within the 63
+    characters PostgreSQL allows.
+    """
+    columns = []
+    for field in field_list(fields):
+        key = field.get('id') or field.get('name') or field.get('label')
+        if not key:
+            continue
+        field_type = field.get('type', 'text')
+        if field_type == 'file':
+            continue
+        name = f'q_{_name_part(key, 24)}'
+        if field_type == 'checkbox' and field.get('options'):
+            for option in field['options']:
+                columns.append(AnswerColumn(f'{name}__{_name_part(option, 16)}', key, 'option', option))
+        elif field_type in ('number', 'date'):
+            columns.append(AnswerColumn(name, key, field_type))
+        else:
+            columns.append(AnswerColumn(name, key, 'text'))
+    # A field listed twice would otherwise get two columns of the same name
+    return list({column.name: column for column in columns}.values())
+
+
+def _fields_hash(fields):
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def answers_table(form_id, fields):
+    """The ``sa.Table`` for a form with these fields (cached per field definition)."""
+    cache_key = (form_id, _fields_hash(fields))
+    with _tables_lock:
+        entry = _tables.get(cache_key)
+        if entry is not None:
+            _tables.move_to_end(cache_key)
+            return entry
+        columns = answer_columns(fields)
+        name = f'form_{form_id}_answers'
+        if name in metadata.tables:
+            metadata.remove(metadata.tables[name])
+        table = sa.Table(
+            name, metadata,
+            sa.Column('submission_id', sa.Integer, primary_key=True, autoincrement=False),
+            sa.Column('submitted_at', sa.DateTime, index=True),
+            sa.Column('score', sa.Float),
+            *(sa.Column(column.name, column.sql_type()) for column in columns)
+        )
+        entry = _tables[cache_key] = (table, columns, set())
+        while len(_tables) > MAX_CACHED_TABLES:
+            evicted = _tables.popitem(last=False)[1][0]
+            if metadata.tables.get(evicted.name) is evicted:
+                metadata.remove(evicted)
+        return entry
+
+
+def _pending(connection):
+    """Side tables ensured in ``connection``'s open transaction, by (set id, engine id)."""
+    return connection.info.setdefault('answers_pending', {})
+
+
+def _commit_pending(connection):
+    for (_, bind_key), ensured in _pending(connection).items():
+        ensured.add(bind_key)
+    _pending(connection).clear()
+
+
+def _discard_pending(connection, *args):
+    # The DDL may have been rolled back with the transaction, so check again next time
+    _pending(connection).clear()
+
+
+def _track_transactions(engine):
+    if not event.contains(engine, 'commit', _commit_pending):
+        event.listen(engine, 'commit', _commit_pending)
+        event.listen(engine, 'rollback', _discard_pending)
+        event.listen(engine, 'rollback_savepoint', _discard_pending)
+
+
+def _same_type(reflected, expected):
+    try:
+        return reflected.python_type is expected.python_type
+    except NotImplementedError:
+        return False
+
+
+def ensure_answers_table(connection, form_id, fields):
+    """Create the form's side table if it is missing and return it with its columns.
+
+    Raises ``AnswersTableStale`` when the table lacks a question or has one
+    of another type.  Rebuilding copies every submission of the form, so
+    that is left to the ``rebuild_form_answers`` job rather than done in
+    whichever flush or request noticed.  A table only counts as ensured
+    for the engine once the transaction that checked or created it commits.
+    """
+    table, columns, ensured = answers_table(form_id, fields)
+    bind_key = id(connection.engine)
+    if bind_key in ensured or (id(ensured), bind_key) in _pending(connection):
+        return table, columns
+    if form_id in _rebuilding:
+        raise AnswersTableStale(form_id)
+
+    inspector = sa.inspect(connection)
+    if not inspector.has_table(table.name):
+        table.create(connection)
+    else:
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        if any(column.name not in existing or not _same_type(existing[column.name], column.type)
+               for column in table.columns):
+            raise AnswersTableStale(form_id)
+    _mark_ensured(connection, ensured)
+    return table, columns
+
+
+def _mark_ensured(connection, ensured):
+    _track_transactions(connection.engine)
+    _pending(connection)[(id(ensured), id(connection.engine))] = ensured
+
+
+def request_rebuild(form_id):
+    """Queue the ``rebuild_form_answers`` job unless this process already has."""
+    from . import jobs
+    with _tables_lock:
+        if form_id in _rebuilding:
+            return
+        _rebuilding.add(form_id)
+    try:
+        jobs.submit('rebuild_form_answers', form_id)
+    except Exception:
+        with _tables_lock:
+            _rebuilding.discard(form_id)
+        raise
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(str(value)[:10]).date()
+    except ValueError:
+        return None
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True)
+    return str(value)
+
+
+def answer_row(columns, submission_id, submitted_at, score, responses):
+    responses = responses if isinstance(responses, dict) else {}
+    row = {'submission_id': submission_id, 'submitted_at': submitted_at, 'score': score}
+    for column in columns:
+        value = responses.get(column.key)
+        if column.kind == 'option':
+            chosen = value if isinstance(value, list) else [value]
+            row[column.name] = None if value is None else column.option in chosen
+        elif column.kind == 'number':
+            row[column.name] = None if value in (None, '') else _number(value)
+        elif column.kind == 'date':
+            row[column.name] = None if value in (None, '') else _date(value)
+        else:
+            row[column.name] = _text(value)
+    return row
+
+
+def store_answers(connection, form_id, fields, submissions):
+    """Write side-table rows for ``submissions``, replacing any existing ones.
+
+    ``submissions`` are ``(id, submitted_at, score, responses)`` tuples.
+    """
+    if not submissions:
+        return
+    table, columns = ensure_answers_table(connection, form_id, fields)
+    rows = [answer_row(columns, *submission) for submission in submissions]
+    connection.execute(table.delete().where(table.c.submission_id.in_([row['submission_id'] for row in rows])))
+    connection.execute(table.insert(), rows)
+
+
+def delete_answers(connection, form_id, fields, submission_ids):
+    table, _ = ensure_answers_table(connection, form_id, fields)
+    connection.execute(table.delete().where(table.c.submission_id.in_(list(submission_ids))))
+
+
+def copy_answers(connection, form_id, table, columns):
+    """Fill ``table`` from the form's submissions; returns the number of rows."""
+    submissions = Submission.__table__
+    query = (sa.select(submissions.c.id, submissions.c.submitted_at, submissions.c.score, submissions.c.responses)
+             .where(submissions.c.form_id == form_id)
+             .order_by(submissions.c.id)
+             .execution_options(yield_per=REBUILD_CHUNK_SIZE))
+    total = 0
+    for chunk in connection.execute(query).partitions():
+        connection.execute(table.insert(), [answer_row(columns, *submission) for submission in chunk])
+        total += len(chunk)
+    return total
+
+
+def rebuild_answers(form):
+    """Recreate ``form``'s side table from its submissions."""
+    with _tables_lock:
+        _rebuilding.discard(form.id)
+    connection = db.session.connection()
+    table, columns, ensured = answers_table(form.id, form.fields)
+    table.drop(connection, checkfirst=True)
+    # Forget the table everywhere now; the recreation below is only marked
+    # as ensured again when this transaction commits
+    ensured.clear()
+    table.create(connection)
+    _mark_ensured(connection, ensured)
+    return copy_answers(connection, form.id, table, columns)
+
+
+def _readable_table(form):
+    connection = db.session.connection()
+    try:
+        return connection, *ensure_answers_table(connection, form.id, form.fields)
+    except AnswersTableStale:
+        request_rebuild(form.id)
+        raise
+
+
+def answers_frame(form, columns=None, where=None):
+    """Load (a subset of) a form's side table as a typed DataFrame.
+
+    ``where`` is a callable receiving the table and returning a SQLAlchemy
+    condition, e.g. ``lambda t: t.c.q_age > 30``.
+    """
+    import pandas as pd
+
+    connection, table, _ = _readable_table(form)
+    selected = [table.c[name] for name in columns] if columns else [table]
+    stmt = sa.select(*selected)
+    if where is not None:
+        stmt = stmt.where(where(table))
+    return pd.read_sql(stmt, connection)
+
+
+def question_summary(form, top_k=10):
+    """Per-question aggregates computed in SQL on the side table."""
+    connection, table, columns = _readable_table(form)
+    summary = {}
+
+    numbers = [column for column in columns if column.kind == 'number']
+    if numbers:
+        aggregates = []
+        for column in numbers:
+            c = table.c[column.name]
+            aggregates += [sa.func.count(c), sa.func.avg(c), sa.func.min(c), sa.func.max(c)]
+        values = connection.execute(sa.select(*aggregates)).one()
+        for index, column in enumerate(numbers):
+            count, mean, low, high = values[index * 4:index * 4 + 4]
+            summary[column.key] = {'type': 'number', 'count': count, 'mean': mean, 'min': low, 'max': high}
+
+    options = [column for column in columns if column.kind == 'option']
+    if options:
+        counts = connection.execute(sa.select(
+            *(sa.func.sum(sa.case((table.c[column.name], 1), else_=0)) for column in options)
+        )).one()
+        for column, count in zip(options, counts):
+            summary.setdefault(column.key, {'type': 'options', 'counts': {}})['counts'][column.option] = count or 0
+
+    for column in columns:
+        if column.kind in ('text', 'date'):
+            c = table.c[column.name]
+            rows = connection.execute(
+                sa.select(c, sa.func.count()).where(c.isnot(None)).group_by(c)
+                .order_by(sa.func.count().desc()).limit(top_k)
+            ).all()
+            summary[column.key] = {'type': column.kind,
+                                   'top': [[str(value), count] for value, count in rows]}
+    return summary
+
+
+def crosstab(form, rows, cols):
+    """Counts of submissions for each combination of two questions' answers.
+
+    ``rows`` and ``cols`` are response keys; checkbox questions contribute
+    one category per option.
+    """
+    connection, table, columns = _readable_table(form)
+
+    def dimension(key):
+        matching = [column for column in columns if column.key == key]
+        if not matching:
+            raise ValueError(f'Unknown question: {key}')
+        if matching[0].kind == 'option':
+            return [(column.option, table.c[column.name].is_(True)) for column in matching]
+        return table.c[matching[0].name]
+
+    row_dim, col_dim = dimension(rows), dimension(cols)
+    result = {}
+    # Option questions are expanded into one aggregate per option, the others grouped by value
+    for row_label, row_condition in (row_dim if isinstance(row_dim, list) else [(None, None)]):
+        group_by = [] if row_condition is not None else [row_dim]
+        if isinstance(col_dim, list):
+            select = [sa.func.sum(sa.case((condition, 1), else_=0)) for _, condition in col_dim]
+        else:
+            group_by.append(col_dim)
+            select = [sa.func.count()]
+        stmt = sa.select(*group_by, *select)
+        if row_condition is not None:
+            stmt = stmt.where(row_condition)
+        if group_by:
+            stmt = stmt.group_by(*group_by)
+        for record in connection.execute(stmt):
+            if row_condition is None:
+                row_key, record = record[0], record[1:]
+            else:
+                row_key = row_label
+            if isinstance(col_dim, list):
+                cells = {label: count or 0 for (label, _), count in zip(col_dim, record)}
+            else:
+                cells = {record[0]: record[1]}
+            target = result.setdefault(str(row_key), {})
+            for col_key, count in cells.items():
+                target[str(col_key)] = target.get(str(col_key), 0) + count
+    return result
+
+
+def form_fields(connection, form_id, session=None):
+    """``Form.fields`` of ``form_id``; with ``session``, read once per flush of it.
+
+    The submission listeners here and in ``app.form_stats`` share the cache,
+    so a flush of many submissions to one form selects its fields once.
+    """
+    if session is None:
+        return connection.execute(sa.select(Form.fields).where(Form.id == form_id)).scalar()
+    cache = session.info.setdefault('form_fields', {})
+    if form_id not in cache:
+        cache[form_id] = connection.execute(sa.select(Form.fields).where(Form.id == form_id)).scalar()
+    return cache[form_id]
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_form_fields(session, *args):
+    session.info.pop('form_fields', None)
+
+
+def _write_answers(session, form_id, write):
+    try:
+        write()
+    except AnswersTableStale:
+        # Queued once the submission is committed, so the rebuild copies it
+        session.info.setdefault('answers_rebuilds', set()).add(form_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _request_rebuilds(session):
+    for form_id in session.info.pop('answers_rebuilds', ()):
+        request_rebuild(form_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rebuilds(session, previous_transaction):
+    session.info.pop('answers_rebuilds', None)
+
+
+@event.listens_for(Submission, 'after_insert')
+@event.listens_for(Submission, 'after_update')
+def _store_submission_answers(mapper, connection, target):
+    session = object_session(target)
+    # A submission moved to another form leaves that form's table too
+    moved_from = sa.inspect(target).attrs.form_id.history.deleted
+    if moved_from and moved_from[0] not in (None, target.form_id):
+        old_form = moved_from[0]
+        old_fields = form_fields(connection, old_form, session)
+        if old_fields:
+            _write_answers(session, old_form,
+                           lambda: delete_answers(connection, old_form, old_fields, [target.id]))
+    fields = form_fields(connection, target.form_id, session)
+    if fields:
+        _write_answers(session, target.form_id, lambda: store_answers(
+            connection, target.form_id, fields, [(target.id, target.submitted_at, target.score, target.responses)]))
+
+
+@event.listens_for(Submission, 'after_delete')
+def _delete_submission_answers(mapper, connection, target):
+    session = object_session(target)
+    fields = form_fields(connection, target.form_id, session)
+    if fields:
+        _write_answers(session, target.form_id,
+                       lambda: delete_answers(connection, target.form_id, fields, [target.id]))
@@ -0,0 +1,145 @@
+"""JWT identities resolved from an in-process user cache.
+
+Tokens carry the user id as their subject plus ``role`` and ``active``
+claims, so a protected view can authorise from the token alone.  The
+user record behind ``current_user`` is looked up once per request
+through ``user_cache``: a small TTL/LRU cache of plain ``CachedUser``
+records, so views never hold ORM instances from another session.
+
+Updating or deleting a ``User`` evicts it from this process's cache
+once the transaction commits.  Other processes keep their copy for at
+most ``USER_CACHE_TTL`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+
+from flask import jsonify
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .models import User, db
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 1024
+
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    id: int
+    email: str
+    full_name: str
+    role: str
+    department: str
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.id, user.email, user.full_name, user.role, user.department,
+                   user.is_active is not False)
+
+
+class UserCache:
+    """LRU of ``CachedUser`` records by id, each kept for at most ``ttl`` seconds."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(user_id)
+                    return entry[1]
+                del self.entries[user_id]
+        user = db.session.get(User, user_id)
+        record = CachedUser.from_model(user) if user is not None else None
+        if record is not None and self.ttl > 0:
+            with self.lock:
+                self.entries[user_id] = (now + self.ttl, record)
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return record
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+
+
+user_cache = UserCache()
+
+
+def token_claims(user):
+    return {'role': user.role or 'user', 'active': user.is_active is not False}
+
+
+def configure_auth(app, jwt):
+    """Register the identity, claims and user loaders on ``jwt``."""
+    user_cache.ttl = int(app.config.setdefault('USER_CACHE_TTL', DEFAULT_TTL))
+    user_cache.max_size = int(app.config.setdefault('USER_CACHE_SIZE', DEFAULT_SIZE))
+
+    @jwt.user_identity_loader
+    def identity(user):
+        # PyJWT requires a string subject
+        return str(user.id if isinstance(user, (User, CachedUser)) else user)
+
+    @jwt.additional_claims_loader
+    def claims(user):
+        return token_claims(user) if isinstance(user, (User, CachedUser)) else {}
+
+    @jwt.token_verification_loader
+    def active_token(jwt_header, jwt_data):
+        return jwt_data.get('active', True) is not False
+
+    @jwt.user_lookup_loader
+    def lookup(jwt_header, jwt_data):
+        try:
+            user_id = int(jwt_data[app.config.get('JWT_IDENTITY_CLAIM', 'sub')])
+        except (TypeError, ValueError):
+            return None
+        user = user_cache.get(user_id)
+        return user if user is not None and user.is_active else None
+
+
+def role_required(*roles):
+    """Allow only tokens whose ``role`` claim is one of ``roles``; no database access."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if get_jwt().get('role') not in roles:
+                return jsonify({'error': 'Forbidden'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop('changed_users', None)
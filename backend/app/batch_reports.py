@@ -0,0 +1,228 @@
+"""Batch report rendering across a process pool.
+
+A batch renders one PDF per partition of the submissions (per form, or
+per any other key).  Rather than pickling rows to every worker, the
+parent writes a read-only columnar snapshot to disk once: numeric and
+datetime columns as ``.npy`` arrays, string columns Arrow-style as an
+offsets array plus one UTF-8 byte buffer, rows sorted by partition key.
+Workers memory-map the snapshot, so all of them share the same page
+cache, and each task only carries a partition's ``(start, stop)`` row
+range and the template schema.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+
+from .services.pdf_engine import compile_template
+
+ROW_CHUNK_SIZE = 1000
+MANIFEST = 'manifest.json'
+
+
+class Snapshot:
+    """Memory-mapped, read-only columnar copy of a table."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.rows = self.manifest['rows']
+        self.columns = {}
+        for name, kind in self.manifest['columns'].items():
+            if kind == 'string':
+                offsets = np.load(self._file(name, 'offsets.npy'), mmap_mode='r')
+                data_path = self._file(name, 'data.bin')
+                # np.memmap cannot map an empty file
+                data = np.memmap(data_path, dtype=np.uint8, mode='r') if os.path.getsize(data_path) \
+                    else np.zeros(0, dtype=np.uint8)
+                self.columns[name] = (kind, offsets, data)
+            else:
+                self.columns[name] = (kind, np.load(self._file(name, 'npy'), mmap_mode='r'))
+
+    def _file(self, name, suffix):
+        return os.path.join(self.path, f'{name}.{suffix}')
+
+    @property
+    def partitions(self):
+        """``{key: (start, stop)}`` row ranges, in snapshot order."""
+        return {key: tuple(bounds) for key, bounds in self.manifest['partitions']}
+
+    @classmethod
+    def write(cls, path, columns, kinds, partition_by):
+        """Write ``columns`` (name -> sequence, all the same length) as a snapshot.
+
+        ``kinds`` maps each name to ``'int'``, ``'float'``, ``'datetime'``
+        or ``'string'``.  Rows are stably sorted by the ``partition_by``
+        column so every partition is one contiguous range.
+        """
+        os.makedirs(path, exist_ok=True)
+        keys = np.asarray(columns[partition_by])
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1], True]) \
+            if len(keys) else np.array([0])
+        partitions = [
+            [sorted_keys[start].item(), [int(start), int(stop)]]
+            for start, stop in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+        for name, kind in kinds.items():
+            values = columns[name]
+            if kind == 'string':
+                encoded = [('' if values[i] is None else str(values[i])).encode('utf-8') for i in order]
+                lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum(lengths, out=offsets[1:])
+                np.save(os.path.join(path, f'{name}.offsets.npy'), offsets)
+                with open(os.path.join(path, f'{name}.data.bin'), 'wb') as f:
+                    f.write(b''.join(encoded))
+            else:
+                if kind == 'float':
+                    array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+                elif kind == 'datetime':
+                    array = np.array([np.datetime64('NaT') if v is None else v for v in values],
+                                     dtype='datetime64[us]')
+                else:
+                    array = np.asarray(values, dtype=np.int64)
+                np.save(os.path.join(path, f'{name}.npy'), array[order])
+
+        with open(os.path.join(path, MANIFEST), 'w') as f:
+            json.dump({'rows': int(len(keys)), 'columns': kinds, 'partition_by': partition_by,
+                       'partitions': partitions}, f)
+        return cls(path)
+
+    def column(self, name, start, stop):
+        """Python values of one column for rows ``start:stop``."""
+        kind, *arrays = self.columns[name]
+        if kind == 'string':
+            offsets, data = arrays
+            bounds = offsets[start:stop + 1].tolist()
+            buffer = data[bounds[0]:bounds[-1]].tobytes()
+            base = bounds[0]
+            return [buffer[a - base:b - base].decode('utf-8') for a, b in zip(bounds, bounds[1:])]
+        values = arrays[0][start:stop]
+        if kind == 'float':
+            return [None if v != v else v for v in values.tolist()]
+        return values.tolist()  # datetime64[us] -> datetime (NaT -> None)
+
+    def numbers(self, name, start, stop):
+        return self.columns[name][1][start:stop]
+
+    def iter_rows(self, start, stop, expand=None):
+        """Yield row dicts for ``start:stop``, a chunk of columns at a time.
+
+        ``expand`` names a string column holding JSON objects whose keys are
+        merged into each row.
+        """
+        names = list(self.columns)
+        for chunk_start in range(start, stop, ROW_CHUNK_SIZE):
+            chunk_stop = min(chunk_start + ROW_CHUNK_SIZE, stop)
+            values = [self.column(name, chunk_start, chunk_stop) for name in names]
+            for row in zip(*values):
+                record = dict(zip(names, row))
+                if expand and record.get(expand):
+                    extra = json.loads(record[expand])
+                    if isinstance(extra, dict):
+                        record = {**extra, **record}
+                yield record
+
+
+# -- worker side ---------------------------------------------------------------
+
+_snapshots = {}
+
+
+def _open_snapshot(path):
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        snapshot = _snapshots[path] = Snapshot(path)
+    return snapshot
+
+
+def partition_summary(snapshot, start, stop, score_column='score'):
+    summary = {'responses': stop - start}
+    if score_column in snapshot.columns:
+        scores = snapshot.numbers(score_column, start, stop)
+        scores = scores[~np.isnan(scores)]
+        if len(scores):
+            summary.update(average_score=float(scores.mean()), min_score=float(scores.min()),
+                           max_score=float(scores.max()))
+    return summary
+
+
+def render_partition(snapshot_path, key, start, stop, schema, output_path, extra=None, expand=None):
+    """Process-pool task: render rows ``start:stop`` of the snapshot into ``output_path``."""
+    started = time.perf_counter()
+    snapshot = _open_snapshot(snapshot_path)
+    data = {
+        'partition': key,
+        'summary': partition_summary(snapshot, start, stop),
+        'rows': lambda: snapshot.iter_rows(start, stop, expand),
+        **(extra or {})
+    }
+    partial = output_path + '.tmp'
+    stats = compile_template(schema).render(partial, data)
+    os.replace(partial, output_path)
+    return {'key': key, 'path': output_path, **stats, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+# -- parent side ---------------------------------------------------------------
+
+def render_batch(snapshot, schema, output_dir, workers=None, extra=None, expand=None,
+                 keys=None, on_done=None, is_cancelled=None):
+    """Render one report per snapshot partition on a process pool.
+
+    ``workers`` is capped at the CPU count, which is also the default.
+    ``extra`` is merged into every report's data (it may also be a dict of
+    per-key dicts under ``extra['by_key']``).  ``on_done(result, done,
+    total)`` is called as partitions finish.  Returns the per-partition
+    results in completion order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = snapshot.partitions
+    if keys is not None:
+        partitions = {key: bounds for key, bounds in partitions.items() if key in set(keys)}
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, cpus)
+    extra = dict(extra or {})
+    by_key = extra.pop('by_key', {})
+
+    results = []
+    # Spawned workers do not inherit the parent's database connections or threads
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(partitions), 1)),
+                             mp_context=get_context('spawn')) as pool:
+        futures = [
+            pool.submit(render_partition, snapshot.path, key, start, stop, schema,
+                        os.path.join(output_dir, f'report_{_file_key(key)}.pdf'),
+                        {**extra, **by_key.get(key, {})}, expand)
+            # Largest partitions first keeps the pool busy until the end
+            for key, (start, stop) in sorted(partitions.items(), key=lambda item: item[1][0] - item[1][1])
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_done:
+                on_done(results[-1], len(results), len(futures))
+            if is_cancelled and is_cancelled():
+                for pending in futures:
+                    pending.cancel()
+                break
+    return results
+
+
+def _file_key(key):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(key))
+
+
+def temporary_snapshot_dir():
+    return tempfile.mkdtemp(prefix='report-snapshot-')
+
+
+def remove_snapshot(path):
+    shutil.rmtree(path, ignore_errors=True)
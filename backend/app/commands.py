@@ -0,0 +1,20 @@
+"""Maintenance commands, run as ``flask --app app <command>`` from ``backend/``."""
+import click
+
+from .models import Form, db
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-form-stats')
+    @click.option('--form-id', type=int, multiple=True, help='Only these forms (repeatable).')
+    def rebuild_form_stats_command(form_id):
+        """Recompute materialised form statistics from the submissions."""
+        from .form_stats import rebuild_form_stats
+
+        query = Form.query.order_by(Form.id)
+        if form_id:
+            query = query.filter(Form.id.in_(form_id))
+        for form in query:
+            count = rebuild_form_stats(form)
+            db.session.commit()
+            click.echo(f'form {form.id}: {count} submissions')
@@ -0,0 +1,158 @@
+"""Serving generated report files.
+
+``precompress`` writes ``.gz`` (and ``.br`` when the optional ``brotli``
+package is installed) siblings next to a freshly generated file, and
+``send_download`` picks the best one the client accepts.  Responses carry
+an ETag and Last-Modified, so repeat downloads get a 304, and byte ranges
+for resuming large exports.  The file body never has to pass through
+Python: with ``offload='x-accel'`` nginx serves it from an internal
+location named by ``X-Accel-Redirect``, with ``'x-sendfile'`` Apache or
+lighttpd do, and otherwise the WSGI server's file wrapper (``sendfile``
+under gunicorn) streams it.
+"""
+import gzip
+import mimetypes
+import os
+import shutil
+import tempfile
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COPY_BUFFER = 1024 * 1024
+# Formats that are already compressed gain nothing from another pass
+ALREADY_COMPRESSED = ('.gz', '.br', '.zip', '.xlsx', '.docx', '.png', '.jpg')
+# Keep a variant only if it saves at least this fraction of the bytes
+MIN_SAVING = 0.1
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def variants(path):
+    """Existing precompressed variants of ``path`` as ``{encoding: path}``."""
+    return {encoding: path + suffix for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix)}
+
+
+def _partial(final, mode):
+    """Open a uniquely named partial file beside ``final``, with the permissions ``mode``.
+
+    Concurrent writers of the same variant each get their own partial, so
+    the rename only ever publishes a complete file.
+    """
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(final) or '.',
+                                   prefix=os.path.basename(final) + '.', suffix='.tmp')
+    os.chmod(partial, mode)
+    return os.fdopen(fd, 'wb'), partial
+
+
+def _keep_if_smaller(original_size, partial, final):
+    if os.path.getsize(partial) <= original_size * (1 - MIN_SAVING):
+        os.replace(partial, final)
+        return final
+    os.remove(partial)
+    return None
+
+
+def _write_variant(path, final, compress):
+    """Write ``compress(source, target)`` to a partial and keep it if it is worth it."""
+    stat = os.stat(path)
+    raw, partial = _partial(final, stat.st_mode & 0o777)
+    try:
+        with open(path, 'rb') as source, raw:
+            compress(source, raw)
+        return _keep_if_smaller(stat.st_size, partial, final)
+    except BaseException:
+        os.remove(partial)
+        raise
+
+
+def _gzip(source, raw):
+    # mtime=0 keeps the output byte-identical for identical input
+    with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as target:
+        shutil.copyfileobj(source, target, COPY_BUFFER)
+
+
+def _brotli(source, target):
+    compressor = brotli.Compressor(quality=5)
+    for block in iter(lambda: source.read(COPY_BUFFER), b''):
+        target.write(compressor.process(block))
+    target.write(compressor.finish())
+
+
+def precompress(path):
+    """Write compressed siblings of ``path``; returns the paths written."""
+    if path.lower().endswith(ALREADY_COMPRESSED):
+        return []
+    written = [_write_variant(path, path + '.gz', _gzip)]
+    if brotli is not None:
+        written.append(_write_variant(path, path + '.br', _brotli))
+    return [p for p in written if p]
+
+
+def remove_with_variants(path):
+    for candidate in [path] + [path + suffix for _, suffix in ENCODINGS]:
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+
+
+def _etag(stat, encoding=None):
+    # Same shape nginx uses (size and mtime), so offloaded and direct
+    # responses validate each other's ETags
+    tag = f'{stat.st_mtime_ns // 1_000_000_000:x}-{stat.st_size:x}'
+    return f'{tag}-{encoding}' if encoding else tag
+
+
+def _accepted(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def send_download(path, download_name=None, offload=None, accel_prefix=None, max_age=0):
+    """Response for downloading ``path`` as an attachment.
+
+    ``offload`` defaults to the ``DOWNLOAD_OFFLOAD`` config value and
+    ``accel_prefix`` (the nginx ``internal`` location mapped onto the
+    reports directory) to ``DOWNLOAD_ACCEL_PREFIX``.
+    """
+    config = current_app.config
+    offload = offload if offload is not None else config.get('DOWNLOAD_OFFLOAD')
+    download_name = download_name or os.path.basename(path)
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    if offload == 'x-accel':
+        prefix = accel_prefix or config.get('DOWNLOAD_ACCEL_PREFIX', '/protected/')
+        response = current_app.response_class(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path.replace(os.sep, '/'))
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+        # nginx handles conditional, range and gzip_static itself
+        return response
+
+    # A range refers to the identity bytes, so resumed downloads skip variants
+    encoding, served = None, path
+    if 'Range' not in request.headers:
+        for name, variant in variants(path).items():
+            if _accepted(name):
+                encoding, served = name, variant
+                break
+
+    stat = os.stat(served)
+    response = send_file(
+        served,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=_etag(stat, encoding),
+        last_modified=stat.st_mtime,
+        max_age=max_age
+    )
+    if encoding and response.status_code != 304:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Flask turns this into X-Sendfile when USE_X_SENDFILE is set
+    return response
@@ -0,0 +1,45 @@
+"""Engine options and connect-time pragmas from the config profile.
+
+Flask-SQLAlchemy builds its engines in ``init_app``, so
+``configure_engine_options`` has to run before that, and
+``install_sqlite_pragmas`` after, once the engines exist.  The pragmas
+are attached to the engines themselves (not to every SQLAlchemy
+``Engine``), so other databases opened by the process keep their own
+settings.
+"""
+from sqlalchemy import event
+
+from config import Config, engine_options, sqlite_pragmas
+
+
+def configure_engine_options(app, settings=Config):
+    """Fill ``SQLALCHEMY_ENGINE_OPTIONS`` for the app's database URI unless already set."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(uri, settings))
+
+
+def pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def install_sqlite_pragmas(engine, settings=Config):
+    """Run the profile's pragmas on every new connection of a SQLite ``engine``."""
+    if engine.dialect.name != 'sqlite':
+        return False
+    listener = pragma_listener(sqlite_pragmas(settings))
+    event.listen(engine, 'connect', listener)
+    return True
+
+
+def apply_engine_profile(app, db, settings=Config):
+    """Install the pragmas on every engine ``db`` created for ``app``."""
+    with app.app_context():
+        for engine in db.engines.values():
+            install_sqlite_pragmas(engine, settings)
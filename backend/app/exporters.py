@@ -0,0 +1,91 @@
+"""Streaming report writers.
+
+Each writer consumes an iterator of row tuples and writes it straight to
+disk, so peak memory depends on the chunk size rather than the number of
+rows being exported.
+"""
+import csv
+import gzip
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def write_excel(path, header, rows):
+    from openpyxl import Workbook
+
+    # write_only workbooks flush each row to a temp file as it is appended
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def write_csv(path, header, rows, compress=False):
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(header)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+EXPORTERS = {
+    'excel': ('xlsx', write_excel),
+    'csv': ('csv', write_csv),
+    'csv_gz': ('csv.gz', lambda path, header, rows: write_csv(path, header, rows, compress=True)),
+}
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux but bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes():
+    """Resident set size of this process right now, or None where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def export_rows(path, kind, header, rows):
+    """Write ``rows`` to ``path`` with the ``kind`` exporter and return timing metadata.
+
+    ``peak_rss_bytes`` is a process-lifetime high-water mark, so the memory
+    an export itself takes is reported as how far it raised that mark and
+    how much the resident set grew from start to finish.
+    """
+    _, writer = EXPORTERS[kind]
+    peak_before, rss_before = peak_rss_bytes(), current_rss_bytes()
+    started = time.perf_counter()
+    count = writer(path, header, rows)
+    seconds = time.perf_counter() - started
+    peak_after, rss_after = peak_rss_bytes(), current_rss_bytes()
+    return {
+        'rows': count,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(count / seconds, 1) if seconds else None,
+        'peak_rss_growth_bytes': peak_after - peak_before if peak_after is not None else None,
+        'rss_delta_bytes': rss_after - rss_before if rss_after is not None else None,
+        'process_peak_rss_bytes': peak_after
+    }
@@ -0,0 +1,259 @@
+"""Report data filters compiled to SQL.
+
+``Report.data_filters`` holds a small JSON DSL that is turned into a
+SQLAlchemy condition on ``Submission``, so filtering happens in the
+database (and on the indexed columns uses the indexes) instead of in
+Python after loading every row.  A filter is either a predicate::
+
+    {"field": "score", "op": "gte", "value": 50}
+    {"field": "submitted_at", "op": "between", "value": ["2024-01-01", "2024-03-31"]}
+    {"field": "submitted_at", "op": "within", "value": {"days": 30}}
+    {"field": "form_id", "op": "in", "value": [1, 2, 3]}
+    {"field": "responses.department", "op": "eq", "value": "Sales"}
+    {"field": "responses.address.city", "op": "exists"}
+
+or a combination: ``{"all": [...]}``, ``{"any": [...]}``, ``{"not": {...}}``.
+A bare list means ``all``.  Values compared with a column must suit its
+type (``score`` takes numbers, dates take ISO strings).
+``responses.<path>`` compares a value inside the JSON answers; its SQL
+type follows the type of the comparison value.
+
+``validate_filters`` checks a spec without touching the database (the
+create-report route rejects bad filters with a 400), and
+``compile_filters`` caches the compiled condition per distinct spec.
+Relative date windows are bound at execution time, so a cached ``within``
+condition never goes stale.
+"""
+import json
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import sqlalchemy as sa
+
+from .models import Submission
+
+COLUMNS = {
+    'id': Submission.id,
+    'form_id': Submission.form_id,
+    'user_id': Submission.user_id,
+    'respondent_name': Submission.respondent_name,
+    'respondent_email': Submission.respondent_email,
+    'score': Submission.score,
+    'submitted_at': Submission.submitted_at,
+    'google_response_id': Submission.google_response_id,
+}
+RESPONSES_PREFIX = 'responses.'
+# What a comparison value must be for each column type (dates are parsed instead)
+COLUMN_VALUE_TYPES = (
+    (sa.Integer, (int,), 'an integer'),
+    (sa.Float, (int, float), 'a number'),
+    (sa.String, (str,), 'a string'),
+)
+
+COMPARISONS = {
+    'eq': lambda c, v: c == v,
+    'ne': lambda c, v: c != v,
+    'lt': lambda c, v: c < v,
+    'lte': lambda c, v: c <= v,
+    'gt': lambda c, v: c > v,
+    'gte': lambda c, v: c >= v,
+}
+OPERATORS = set(COMPARISONS) | {'between', 'in', 'not_in', 'contains', 'is_null', 'exists', 'within'}
+WINDOW_UNITS = ('weeks', 'days', 'hours', 'minutes')
+MAX_DEPTH = 8
+MAX_IN_VALUES = 1000
+CACHE_SIZE = 256
+
+
+class FilterError(ValueError):
+    """A data filter that cannot be compiled; the message says where."""
+
+
+def _fail(path, message):
+    raise FilterError(f'{path or "filter"}: {message}')
+
+
+def _is_datetime_column(column):
+    return isinstance(column.type, sa.DateTime)
+
+
+def _parse_datetime(path, value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        _fail(path, f'{value!r} is not an ISO date or datetime')
+
+
+def _window(path, value):
+    if not isinstance(value, dict) or not value or set(value) - set(WINDOW_UNITS):
+        _fail(path, f'within takes an object of {", ".join(WINDOW_UNITS)}')
+    for amount in value.values():
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount < 0:
+            _fail(path, 'window amounts must be non-negative numbers')
+    try:
+        delta = timedelta(**value)
+        # The window is subtracted from now when the query runs, which must not overflow either
+        datetime.utcnow() - delta
+    except OverflowError:
+        _fail(path, 'window is too large')
+    return delta
+
+
+def _column_value(path, column, value):
+    """``value`` checked against the type of ``column``; date strings are parsed."""
+    if _is_datetime_column(column):
+        return _parse_datetime(path, value)
+    for column_type, types, expected in COLUMN_VALUE_TYPES:
+        if isinstance(column.type, column_type):
+            if isinstance(value, bool) or not isinstance(value, types):
+                _fail(path, f'{value!r} is not {expected}')
+            break
+    return value
+
+
+def _json_path(field):
+    keys = field[len(RESPONSES_PREFIX):].split('.')
+    if not all(keys):
+        raise FilterError(f'{field}: empty key in JSON path')
+    return tuple(int(key) if key.isdigit() else key for key in keys)
+
+
+def _json_element(field, sample):
+    """The JSON value at ``field``'s path, cast to suit the comparison value ``sample``."""
+    keys = _json_path(field)
+    element = Submission.responses[keys] if len(keys) > 1 else Submission.responses[keys[0]]
+    if isinstance(sample, bool):
+        return element.as_boolean()
+    if isinstance(sample, (int, float)):
+        return element.as_float()
+    return element.as_string()
+
+
+def _operand(path, field, op, value):
+    """The column expression and Python value(s) a predicate compares."""
+    if field in COLUMNS:
+        column = COLUMNS[field]
+        if op in ('between', 'in', 'not_in'):
+            value = [_column_value(path, column, v) for v in value]
+        elif op not in ('is_null', 'exists', 'within', 'contains'):
+            value = _column_value(path, column, value)
+        return column, value
+    if not field.startswith(RESPONSES_PREFIX):
+        _fail(path, f'unknown field {field!r}')
+    if op == 'within':
+        _fail(path, 'within only applies to date columns')
+    sample = value[0] if isinstance(value, list) and value else value
+    return _json_element(field, sample), value
+
+
+def _check_values(path, op, value):
+    if op in ('is_null', 'exists'):
+        if value not in (None, True, False):
+            _fail(path, f'{op} takes true, false or no value')
+    elif op == 'between':
+        if not isinstance(value, list) or len(value) != 2:
+            _fail(path, 'between takes [low, high]')
+    elif op in ('in', 'not_in'):
+        if not isinstance(value, list) or not value:
+            _fail(path, f'{op} takes a non-empty list')
+        if len(value) > MAX_IN_VALUES:
+            _fail(path, f'{op} takes at most {MAX_IN_VALUES} values')
+        if len({type(v) for v in value}) > 1 and not all(isinstance(v, (int, float)) for v in value):
+            _fail(path, f'{op} values must all have the same type')
+    elif op == 'contains':
+        if not isinstance(value, str):
+            _fail(path, 'contains takes a string')
+    elif op != 'within' and (value is None or isinstance(value, (list, dict))):
+        _fail(path, f'{op} takes a single value')
+
+
+def _predicate(node, path):
+    field, op = node.get('field'), node.get('op', 'eq')
+    unknown = set(node) - {'field', 'op', 'value'}
+    if unknown:
+        _fail(path, f'unexpected keys {sorted(unknown)}')
+    if not isinstance(field, str):
+        _fail(path, 'field must be a string')
+    if op not in OPERATORS:
+        _fail(path, f'unknown operator {op!r}')
+    value = node.get('value')
+    _check_values(path, op, value)
+    column, value = _operand(path, field, op, value)
+
+    if op in COMPARISONS:
+        return COMPARISONS[op](column, value)
+    if op == 'between':
+        return column.between(value[0], value[1])
+    if op == 'in':
+        return column.in_(value)
+    if op == 'not_in':
+        return sa.or_(column.not_in(value), column.is_(None))
+    if op == 'contains':
+        if not isinstance(column.type, sa.String):
+            _fail(path, 'contains only applies to text')
+        return column.contains(value, autoescape=True)
+    if op in ('is_null', 'exists'):
+        missing = column.is_(None)
+        wanted = value is not False
+        return missing if (op == 'is_null') == wanted else sa.not_(missing)
+    # within: the window is measured back from the time the query runs
+    if not _is_datetime_column(column):
+        _fail(path, 'within only applies to date columns')
+    delta = _window(path, value)
+    return column >= sa.bindparam(None, callable_=lambda: datetime.utcnow() - delta, type_=sa.DateTime)
+
+
+def _compile(node, path='', depth=0):
+    if depth > MAX_DEPTH:
+        _fail(path, f'filters nest at most {MAX_DEPTH} levels deep')
+    if isinstance(node, list):
+        node = {'all': node}
+    if not isinstance(node, dict):
+        _fail(path, 'expected an object or a list')
+    for combinator, join in (('all', sa.and_), ('any', sa.or_)):
+        if combinator in node:
+            children = node[combinator]
+            if len(node) != 1 or not isinstance(children, list):
+                _fail(path, f'{combinator} takes a list and nothing else')
+            return join(sa.true() if combinator == 'all' else sa.false(),
+                        *(_compile(child, f'{path}.{combinator}[{i}]'.lstrip('.'), depth + 1)
+                          for i, child in enumerate(children)))
+    if 'not' in node:
+        if len(node) != 1:
+            _fail(path, 'not takes a single filter')
+        return sa.not_(_compile(node['not'], f'{path}.not'.lstrip('.'), depth + 1))
+    return _predicate(node, path)
+
+
+def canonical(spec):
+    return json.dumps(spec, sort_keys=True, separators=(',', ':'), default=str)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile_canonical(key):
+    return _compile(json.loads(key))
+
+
+def compile_filters(spec):
+    """SQLAlchemy condition on ``Submission`` for ``spec``; ``None`` when there is no filter.
+
+    Raises ``FilterError`` (a ``ValueError``) for invalid specs.
+    """
+    if not spec:
+        return None
+    return _compile_canonical(canonical(spec))
+
+
+def validate_filters(spec):
+    """Raise ``FilterError`` unless ``spec`` compiles; returns ``spec``."""
+    compile_filters(spec)
+    return spec
+
+
+def apply_filters(query, spec):
+    condition = compile_filters(spec)
+    return query if condition is None else query.filter(condition)
@@ -0,0 +1,229 @@
+"""Materialised per-form statistics.
+
+``FormStats`` keeps running totals for each form (submission count,
+score count, sum and sum of squares) and a t-digest of the scores, and
+``FormAnswerCount`` one row per (question, answer) for choice-style
+questions.  Mapper events collect every inserted, updated or deleted
+submission and the end of each flush folds them in, one batch per form,
+within the writer's transaction, so a form dashboard reads a handful of
+rows whatever the number of submissions.
+
+Counters and histogram rows are bumped with ``upsert_increments`` and
+are exact.  The digest only approximates removals (see
+``app/tdigest.py``), and ``removed_since_rebuild`` tracks how much it
+has drifted; ``flask rebuild-form-stats`` recomputes everything from
+the submissions.
+"""
+import math
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .aggregates import upsert_increments
+from .answers import field_list, form_fields
+from .models import FormAnswerCount, FormStats, Submission, db
+from .tdigest import TDigest
+
+# Answers to these are too varied for a histogram to say anything
+FREE_TEXT_TYPES = {'text', 'textarea', 'paragraph', 'email', 'url', 'date', 'file'}
+MAX_KEY_LENGTH = 100
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+REBUILD_CHUNK_SIZE = 5000
+
+COUNTERS = ['submission_count', 'score_count', 'score_sum', 'score_sum_sq', 'removed_since_rebuild']
+
+
+def histogram_questions(fields):
+    """Response keys that get answer histograms, given a form's field definitions."""
+    questions = []
+    for field in field_list(fields):
+        key = field.get('id') or field.get('name') or field.get('label')
+        if key and field.get('type', 'text') not in FREE_TEXT_TYPES:
+            questions.append(key)
+    return questions
+
+
+def answer_tallies(questions, responses):
+    """``(question, answer)`` pairs one submission contributes to the histograms."""
+    if not isinstance(responses, dict):
+        return []
+    tallies = []
+    for question in questions:
+        value = responses.get(question)
+        for answer in value if isinstance(value, list) else [value]:
+            if answer is None or answer == '' or isinstance(answer, (dict, list)):
+                continue
+            tallies.append((str(question)[:MAX_KEY_LENGTH], str(answer)[:MAX_KEY_LENGTH]))
+    return tallies
+
+
+def record_changes(connection, form_id, fields, added=(), removed=()):
+    """Fold submissions into a form's stats; both lists hold ``(score, responses)``."""
+    if not added and not removed:
+        return
+    added_scores = [score for score, _ in added if score is not None]
+    removed_scores = [score for score, _ in removed if score is not None]
+    upsert_increments(connection, FormStats.__table__, ['form_id'], COUNTERS, [], [{
+        'form_id': form_id,
+        'submission_count': len(added) - len(removed),
+        'score_count': len(added_scores) - len(removed_scores),
+        'score_sum': sum(added_scores) - sum(removed_scores),
+        'score_sum_sq': sum(s * s for s in added_scores) - sum(s * s for s in removed_scores),
+        'removed_since_rebuild': len(removed),
+    }])
+
+    questions = histogram_questions(fields)
+    if questions:
+        deltas = {}
+        for sign, submissions in ((1, added), (-1, removed)):
+            for _, responses in submissions:
+                for key in answer_tallies(questions, responses):
+                    deltas[key] = deltas.get(key, 0) + sign
+        table = FormAnswerCount.__table__
+        upsert_increments(connection, table, ['form_id', 'question', 'answer'], ['count'], [], [
+            {'form_id': form_id, 'question': question, 'answer': answer, 'count': delta}
+            for (question, answer), delta in deltas.items() if delta
+        ])
+        if removed:
+            connection.execute(table.delete().where(table.c.form_id == form_id, table.c.count <= 0))
+
+    if added_scores or removed_scores:
+        stats = FormStats.__table__
+        select = sa.select(stats.c.score_digest).where(stats.c.form_id == form_id)
+        if connection.dialect.name != 'sqlite':
+            select = select.with_for_update()
+        digest = TDigest.from_list(connection.execute(select).scalar())
+        digest.update(added_scores)
+        for score in removed_scores:
+            digest.remove(score)
+        connection.execute(stats.update().where(stats.c.form_id == form_id)
+                           .values(score_digest=digest.to_list()))
+
+
+def rebuild_form_stats(form):
+    """Recompute ``form``'s stats from its submissions; the caller commits."""
+    connection = db.session.connection()
+    questions = histogram_questions(form.fields)
+    count = score_count = 0
+    score_sum = score_sum_sq = 0.0
+    digest = TDigest()
+    tallies = {}
+    query = (db.session.query(Submission.score, Submission.responses)
+             .filter(Submission.form_id == form.id)
+             .execution_options(yield_per=REBUILD_CHUNK_SIZE))
+    for score, responses in query:
+        count += 1
+        if score is not None:
+            score_count += 1
+            score_sum += score
+            score_sum_sq += score * score
+            digest.add(score)
+        for key in answer_tallies(questions, responses):
+            tallies[key] = tallies.get(key, 0) + 1
+
+    connection.execute(FormAnswerCount.__table__.delete().where(FormAnswerCount.form_id == form.id))
+    connection.execute(FormStats.__table__.delete().where(FormStats.form_id == form.id))
+    connection.execute(FormStats.__table__.insert().values(
+        form_id=form.id, submission_count=count, score_count=score_count, score_sum=score_sum,
+        score_sum_sq=score_sum_sq, score_digest=digest.to_list(), removed_since_rebuild=0,
+        rebuilt_at=datetime.utcnow()
+    ))
+    if tallies:
+        connection.execute(FormAnswerCount.__table__.insert(), [
+            {'form_id': form.id, 'question': question, 'answer': answer, 'count': n}
+            for (question, answer), n in tallies.items()
+        ])
+    return count
+
+
+def form_stats(form_id):
+    """Dashboard view of a form's materialised stats, read in two queries."""
+    stats = db.session.get(FormStats, form_id)
+    result = {'form_id': form_id, 'submissions': 0, 'scores': {'count': 0}, 'questions': {}}
+    if stats is None:
+        return result
+    result['submissions'] = stats.submission_count
+    n = stats.score_count
+    if n:
+        mean = stats.score_sum / n
+        variance = max(stats.score_sum_sq - stats.score_sum * mean, 0) / (n - 1) if n > 1 else 0.0
+        digest = TDigest.from_list(stats.score_digest)
+        result['scores'] = {
+            'count': n,
+            'mean': mean,
+            'variance': variance,
+            'std': math.sqrt(variance),
+            'quantiles': {f'p{round(q * 100)}': digest.quantile(q) for q in QUANTILES}
+        }
+    for question, answer, count in (db.session.query(FormAnswerCount.question, FormAnswerCount.answer,
+                                                     FormAnswerCount.count)
+                                    .filter(FormAnswerCount.form_id == form_id)):
+        result['questions'].setdefault(question, {})[answer] = count
+    result['removed_since_rebuild'] = stats.removed_since_rebuild
+    result['rebuilt_at'] = stats.rebuilt_at.isoformat() if stats.rebuilt_at else None
+    return result
+
+
+def _previous(target, name):
+    history = sa.inspect(target).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(target, name)
+
+
+# With active history, setting an expired attribute loads its old value first,
+# so the update handler can take the previous score and answers back out
+@event.listens_for(Submission.form_id, 'set', active_history=True)
+@event.listens_for(Submission.score, 'set', active_history=True)
+@event.listens_for(Submission.responses, 'set', active_history=True)
+def _load_previous(target, value, oldvalue, initiator):
+    pass
+
+
+def _queue(connection, target, form_id, added=(), removed=()):
+    """Hold a submission's changes until the flush ends, then fold them in per form."""
+    session = object_session(target)
+    if session is None:
+        record_changes(connection, form_id, form_fields(connection, form_id), added, removed)
+        return
+    pending = session.info.setdefault('form_stats_pending', {})
+    _, pending_added, pending_removed = pending.setdefault(form_id, (connection, [], []))
+    pending_added.extend(added)
+    pending_removed.extend(removed)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed(session, flush_context):
+    for form_id, (connection, added, removed) in session.info.pop('form_stats_pending', {}).items():
+        record_changes(connection, form_id, form_fields(connection, form_id, session), added, removed)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_pending(session, previous_transaction):
+    session.info.pop('form_stats_pending', None)
+
+
+@event.listens_for(Submission, 'after_insert')
+def _count_inserted(mapper, connection, target):
+    _queue(connection, target, target.form_id, added=[(target.score, target.responses)])
+
+
+@event.listens_for(Submission, 'after_update')
+def _count_updated(mapper, connection, target):
+    state = sa.inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ('form_id', 'score', 'responses')):
+        return
+    old_form = _previous(target, 'form_id')
+    old = (_previous(target, 'score'), _previous(target, 'responses'))
+    new = (target.score, target.responses)
+    if old_form == target.form_id:
+        _queue(connection, target, target.form_id, added=[new], removed=[old])
+    else:
+        _queue(connection, target, old_form, removed=[old])
+        _queue(connection, target, target.form_id, added=[new])
+
+
+@event.listens_for(Submission, 'after_delete')
+def _count_deleted(mapper, connection, target):
+    _queue(connection, target, target.form_id,
+           removed=[(_previous(target, 'score'), _previous(target, 'responses'))])
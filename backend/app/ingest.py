@@ -0,0 +1,332 @@
+"""Bulk ingestion: payload parsing and column-wise row validation.
+
+Payloads (a JSON array, an NDJSON stream or CSV) are read as batches of
+rows; ``validate_batch`` checks a whole batch column by column and hands
+back insert-ready records plus per-row errors.  Validation runs on plain
+lists: at 10k-row batches, building a DataFrame per batch cost more than
+the checks themselves.  pandas is imported only to read CSV and for dates
+that ``datetime.fromisoformat`` rejects.
+"""
+import json
+import math
+from datetime import datetime, timezone
+
+BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 1000
+
+
+class Field:
+    """One column of an ingest schema."""
+
+    def __init__(self, kind, required=False, default=None, max_length=None):
+        self.kind = kind  # 'string', 'number', 'datetime' or 'json'
+        self.required = required
+        self.default = default
+        self.max_length = max_length
+
+
+class Batch:
+    """Rows of one batch, read a column at a time.
+
+    ``invalid`` lists the rows that could not be parsed at all.
+    """
+
+    def __init__(self, size, columns, invalid=()):
+        self.size = size
+        self.columns = columns  # name -> list of values, or a callable building it
+        self.invalid = invalid
+
+    @classmethod
+    def from_records(cls, records, invalid=()):
+        return cls(len(records), lambda name: [record.get(name) for record in records], invalid)
+
+    @classmethod
+    def from_frame(cls, frame):
+        return cls(len(frame), lambda name: frame[name].tolist() if name in frame else None)
+
+    def __len__(self):
+        return self.size
+
+    def column(self, name):
+        """The values of ``name``, or None when no row has it."""
+        return self.columns(name) if callable(self.columns) else self.columns.get(name)
+
+
+def _batches_from_records(records, batch_size):
+    for start in range(0, len(records), batch_size):
+        yield Batch.from_records(records[start:start + batch_size])
+
+
+def _parse_ndjson_lines(lines):
+    # One json.loads over the whole batch is much cheaper than one per line;
+    # only a batch with a bad line pays for parsing line by line.
+    try:
+        records = json.loads('[' + ','.join(lines) + ']')
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+    # Keep the row count aligned so errors point at the right line
+    invalid = [index for index, record in enumerate(records) if not isinstance(record, dict)]
+    for index in invalid:
+        records[index] = {}
+    return Batch.from_records(records, invalid)
+
+
+def _batches_from_ndjson(stream, batch_size, read_size=1 << 20):
+    # Read in large blocks and split on newlines; a text wrapper iterating
+    # line by line costs more than parsing the JSON.
+    lines = []
+    tail = b''
+    while True:
+        block = stream.read(read_size)
+        if not block:
+            break
+        block = tail + block
+        parts = block.split(b'\n')
+        tail = parts.pop()
+        lines.extend(line for line in (part.strip() for part in parts) if line)
+        while len(lines) >= batch_size:
+            yield _parse_ndjson_lines(_decode(lines[:batch_size]))
+            del lines[:batch_size]
+    if tail.strip():
+        lines.append(tail.strip())
+    if lines:
+        yield _parse_ndjson_lines(_decode(lines))
+
+
+def _decode(lines):
+    return [line.decode('utf-8') for line in lines]
+
+
+def _batches_from_csv(stream, batch_size):
+    import pandas as pd
+    try:
+        for frame in pd.read_csv(stream, dtype=str, chunksize=batch_size):
+            yield Batch.from_frame(frame)
+    except pd.errors.EmptyDataError:
+        return
+
+
+def read_batches(request, batch_size=BATCH_SIZE):
+    """Yield ``Batch``es of at most ``batch_size`` rows from the request body.
+
+    A multipart ``file`` upload or a ``text/csv`` body is read as CSV, an
+    ``application/x-ndjson`` body line by line; anything else must be a JSON
+    array of objects.  NDJSON and CSV bodies are never held in memory whole.
+    """
+    if 'file' in request.files:
+        return _batches_from_csv(request.files['file'].stream, batch_size)
+    mimetype = request.mimetype
+    if mimetype == 'text/csv':
+        return _batches_from_csv(request.stream, batch_size)
+    if mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        return _batches_from_ndjson(request.stream, batch_size)
+
+    records = request.get_json(silent=True)
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError('Expected a JSON array of objects, NDJSON or CSV')
+    return _batches_from_records(records, batch_size)
+
+
+def _missing(value):
+    # None, or NaN from a float column or an empty CSV cell
+    return value is None or value != value
+
+
+def _parse_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return None if number != number else number
+
+
+def _parse_datetime(value):
+    """``value`` as a naive UTC datetime, or None if it is not ISO 8601."""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # fromisoformat covers the common forms; pandas the rest of ISO 8601
+        import pandas as pd
+        try:
+            parsed = pd.to_datetime(value, utc=True, format='ISO8601').to_pydatetime()
+        except (ValueError, OverflowError):
+            return None
+    # Stored naive in UTC, like the datetime.utcnow column defaults
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _fast_column(raw, field, size):
+    """The insert values of a column with nothing to report, or None.
+
+    Covers the common case, every value present and of the expected type,
+    with passes that run at C speed; anything else (a gap, a bad value, a
+    mixed column) returns None for ``_validate_column`` to go row by row.
+    """
+    if raw is None:
+        if field.required:
+            return None
+        default = field.default() if field.kind == 'datetime' and callable(field.default) else field.default
+        return [default] * size
+    types = set(map(type, raw))
+    if field.kind == 'string':
+        if types != {str}:
+            return None
+        values = [value.strip() for value in raw]
+        if '' in values or (field.max_length and max(map(len, values), default=0) > field.max_length):
+            return None
+        return values
+    if field.kind == 'number':
+        if not (types <= {int, float} or types == {str}):
+            return None
+        try:
+            values = list(map(float, raw))
+        except ValueError:
+            return None
+        return None if any(map(math.isnan, values)) else values
+    if field.kind == 'datetime':
+        if types != {str}:
+            return None
+        try:
+            # A trailing Z is UTC, which is how naive values are stored anyway
+            values = [datetime.fromisoformat(value[:-1] if value[-1:] == 'Z' else value) for value in raw]
+        except ValueError:
+            return None
+        if any(value.tzinfo is not None for value in values):
+            values = [value if value.tzinfo is None else value.astimezone(timezone.utc).replace(tzinfo=None)
+                      for value in values]
+        return values
+    return None
+
+
+def _validate_column(raw, field, size, flag):
+    """Return the insert values of one column, flagging bad rows."""
+    values = _fast_column(raw, field, size)
+    if values is not None:
+        return values
+    if raw is None:
+        raw = [None] * size
+    default = field.default
+    if field.kind == 'datetime' and callable(default):
+        default = default()
+    values = []
+    missing = []
+    invalid = []
+    too_long = []
+    for index, value in enumerate(raw):
+        if _missing(value):
+            missing.append(index)
+            values.append(default)
+            continue
+        if field.kind == 'string':
+            value = (value if isinstance(value, str) else str(value)).strip()
+            if not value:
+                missing.append(index)
+                values.append(default)
+                continue
+            if field.max_length and len(value) > field.max_length:
+                too_long.append(index)
+        elif value == '':
+            missing.append(index)
+            values.append(default)
+            continue
+        elif field.kind == 'number':
+            value = _parse_number(value)
+            if value is None:
+                invalid.append(index)
+        elif field.kind == 'datetime':
+            value = _parse_datetime(value)
+            if value is None:
+                invalid.append(index)
+        values.append(value)
+
+    if field.required:
+        flag(missing, 'is required')
+    if field.kind == 'number':
+        flag(invalid, 'must be a number')
+    elif field.kind == 'datetime':
+        flag(invalid, 'must be an ISO 8601 date')
+    flag(too_long, f'must be at most {field.max_length} characters')
+    return values
+
+
+def validate_batch(batch, schema, offset=0):
+    """Validate ``batch`` against ``schema`` in one column-wise pass.
+
+    Returns ``(columns, errors)``: insert-ready value lists per field,
+    holding only the valid rows, and ``{'row': n, 'errors': {field:
+    message}}`` entries numbered from ``offset``.
+    """
+    size = len(batch)
+    row_errors = {}
+    columns = {}
+
+    for name, field in schema.items():
+        def flag(indexes, message, name=name):
+            for index in indexes:
+                row_errors.setdefault(index, {})[name] = message
+
+        columns[name] = _validate_column(batch.column(name), field, size, flag)
+
+    for index in batch.invalid:
+        row_errors[index] = {'row': 'Invalid JSON'}
+
+    if row_errors:
+        keep = [index for index in range(size) if index not in row_errors]
+        columns = {name: [values[index] for index in keep] for name, values in columns.items()}
+    errors = [{'row': offset + index, 'errors': row_errors[index]} for index in sorted(row_errors)]
+    return columns, errors
+
+
+# Any datetime with a microsecond tells SQLite's default DATETIME format
+# apart from a custom storage format
+_DATETIME_PROBE = datetime(2001, 2, 3, 4, 5, 6, 7)
+
+
+def _bind_values(values, process):
+    if process is None:
+        return values
+    if None in values:
+        # Bound as SQL NULL; JSON's processor would store the string 'null'
+        return [None if value is None else process(value) for value in values]
+    if (set(map(type, values)) == {datetime}
+            and process(_DATETIME_PROBE) == _DATETIME_PROBE.isoformat(' ', 'microseconds')):
+        # Same text as the processor, formatted in C rather than per value in Python
+        return [value.isoformat(' ', 'microseconds') for value in values]
+    return list(map(process, values))
+
+
+def insert_batch(session, table, columns):
+    """Insert ``columns`` (equal-length value lists by column key) with one driver-level executemany.
+
+    Values are converted column by column with the dialect's bind
+    processors and handed to the driver as plain rows, which skips
+    SQLAlchemy's per-row parameter handling, the largest cost at this
+    batch size.  None is always bound as SQL NULL.
+    """
+    names = list(columns)
+    if not names or not columns[names[0]]:
+        return
+    connection = session.connection()
+    dialect = connection.dialect
+    compiled = table.insert().compile(dialect=dialect, column_keys=names)
+
+    values = {}
+    for name in names:
+        process = table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+        values[name] = _bind_values(columns[name], process)
+    if compiled.positional:
+        rows = list(zip(*(values[name] for name in compiled.positiontup)))
+    else:
+        rows = [dict(zip(names, row)) for row in zip(*(values[name] for name in names))]
+    connection.exec_driver_sql(compiled.string, rows)
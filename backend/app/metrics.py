@@ -0,0 +1,251 @@
+"""Request, SQL and job metrics in the Prometheus text format.
+
+``RequestMetrics.init_app`` times every request, counts its SQL
+statements and their time through engine events, measures the response
+body and serves the lot at ``/metrics``.  Job durations are recorded by
+``app.pipeline`` when a job finishes.  Requests slower than
+``SLOW_REQUEST_SECONDS`` are logged together with their slowest
+statements.
+
+Metrics live in process memory.  Each API process exposes its own, so
+scrape every process (for example one port per worker) rather than a
+load balancer in front of several.  Celery workers record jobs in their
+pool processes; with ``JOB_METRICS_PORT`` set each pool process serves
+its metrics on that port plus its pool index.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from itertools import count
+
+from flask import Response, current_app, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+JOB_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+SLOW_QUERIES_LOGGED = 10
+STATS_KEY = 'app.metrics.stats'
+MAX_LOGGED_STATEMENT = 500
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per combination of label values."""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self.series.items())
+        for label_values, counts, total in series:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_number(bound)}"}} {cumulative}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {_number(total)}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Time to handle a request, including streaming the body.',
+    ('method', 'endpoint', 'status'))
+RESPONSE_BYTES = registry.histogram(
+    'http_response_size_bytes', 'Response body size.', ('endpoint',), SIZE_BUCKETS)
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'SQL statements executed per request.', ('endpoint',), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = registry.histogram(
+    'http_request_db_seconds', 'Time per request spent executing SQL.', ('endpoint',))
+QUERY_SECONDS = registry.histogram(
+    'db_query_duration_seconds', 'SQL statement execution time.', ('bind',), QUERY_BUCKETS)
+JOB_SECONDS = registry.histogram(
+    'job_duration_seconds', 'Background job run time, retries included.', ('job', 'status'), JOB_BUCKETS)
+JOB_QUEUE_SECONDS = registry.histogram(
+    'job_queue_seconds', 'Time a background job waited before it started.', ('job',), JOB_BUCKETS)
+
+
+class RequestStats:
+    """What one request has done so far.
+
+    Kept in the WSGI environ rather than on ``g``: a streamed body runs in
+    a fresh app context, and its queries still belong to the request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, seq, statement)
+        self._seq = count()
+
+    def add_query(self, seconds, statement):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = (seconds, next(self._seq), statement)
+        if len(self.slowest) < SLOW_QUERIES_LOGGED:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+def record_job(name, status, run_seconds, queue_seconds):
+    JOB_SECONDS.observe(run_seconds, name, status)
+    JOB_QUEUE_SECONDS.observe(max(queue_seconds, 0.0), name)
+
+
+def install_query_hooks(engine, bind):
+    """Time every statement ``engine`` executes and charge it to the current request."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['metrics_started'].pop()
+        QUERY_SECONDS.observe(seconds, bind)
+        stats = request.environ.get(STATS_KEY) if has_request_context() else None
+        if stats is not None:
+            stats.add_query(seconds, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def failed_query(context):
+        started = context.connection.info.get('metrics_started') if context.connection else None
+        if started:
+            started.pop()
+
+
+def _counted(chunks, finish):
+    """Pass a streamed body through, then report its size once it is done."""
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk) if isinstance(chunk, bytes) else len(chunk.encode())
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        finish(size)
+
+
+class RequestMetrics:
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        # 0 turns the slow-request log off
+        app.config.setdefault('SLOW_REQUEST_SECONDS', 1.0)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', lambda: Response(registry.render(), content_type=CONTENT_TYPE))
+        if db is not None:
+            with app.app_context():
+                for bind, engine in db.engines.items():
+                    install_query_hooks(engine, bind or 'default')
+        app.extensions['metrics'] = self
+
+    def _start(self):
+        request.environ[STATS_KEY] = RequestStats()
+
+    def _finish(self, response):
+        stats = request.environ.get(STATS_KEY)
+        if stats is None:
+            return response
+        method, path, endpoint = request.method, request.path, request.endpoint or 'unmatched'
+        status = response.status_code
+        threshold = current_app.config['SLOW_REQUEST_SECONDS']
+
+        def finish(size):
+            seconds = time.perf_counter() - stats.started
+            REQUEST_SECONDS.observe(seconds, method, endpoint, str(status))
+            REQUEST_QUERIES.observe(stats.queries, endpoint)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, endpoint)
+            if size is not None:
+                RESPONSE_BYTES.observe(size, endpoint)
+            if threshold and seconds >= threshold:
+                log_slow_request(method, path, status, seconds, stats)
+
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = _counted(response.response, finish)
+        else:
+            finish(response.calculate_content_length())
+        return response
+
+
+def log_slow_request(method, path, status, seconds, stats):
+    lines = [f'Slow request {method} {path} -> {status} in {seconds:.3f}s '
+             f'({stats.queries} queries, {stats.db_seconds:.3f}s in SQL)']
+    for query_seconds, _, statement in sorted(stats.slowest, reverse=True):
+        statement = ' '.join(statement.split())
+        if len(statement) > MAX_LOGGED_STATEMENT:
+            statement = statement[:MAX_LOGGED_STATEMENT] + '...'
+        lines.append(f'  {query_seconds * 1000:.1f} ms  {statement}')
+    logger.warning('\n'.join(lines))
+
+
+def serve_metrics(port, host='0.0.0.0'):
+    """Serve this process's metrics on ``port`` from a daemon thread (for job workers)."""
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    def metrics_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', CONTENT_TYPE)])
+        return [registry.render().encode()]
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = make_server(host, port, metrics_app, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
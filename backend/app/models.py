@@ -25,7 +25,8 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
     def generate_token(self):
-        return create_access_token(identity=self.id)
+        # The loaders in app/auth.py turn the user into its id and role/active claims
+        return create_access_token(identity=self)
 
     def to_dict(self):
         return {
@@ -49,6 +50,11 @@ class Form(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    responses_synced_at = db.Column(db.DateTime)  # Watermark for incremental Google Forms sync
+    
+    __table_args__ = (
+        db.Index('ix_form_created_by', 'created_by'),
+    )
     
     # Relationships
     submissions = db.relationship('Submission', backref='form', lazy=True)
@@ -78,6 +84,15 @@ class Submission(db.Model):
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     google_response_id = db.Column(db.String(100))
     
+    __table_args__ = (
+        db.Index('ix_submission_form_submitted_at', 'form_id', 'submitted_at'),
+        db.Index('ix_submission_form_score', 'form_id', 'score'),
+        db.Index('ix_submission_submitted_at', 'submitted_at'),
+        db.Index('ix_submission_score', 'score'),
+        db.Index('ix_submission_user_id', 'user_id'),
+        db.Index('uq_submission_form_response', 'form_id', 'google_response_id', unique=True),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,6 +106,28 @@ class Submission(db.Model):
             'google_response_id': self.google_response_id
         }
 
+class FormStats(db.Model):
+    # Running per-form totals maintained by app/form_stats.py
+    __tablename__ = 'form_stats'
+
+    form_id = db.Column(db.Integer, db.ForeignKey('form.id'), primary_key=True)
+    submission_count = db.Column(db.Integer, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_sum_sq = db.Column(db.Float, nullable=False, default=0)
+    score_digest = db.Column(db.JSON)  # t-digest centroids, see app/tdigest.py
+    removed_since_rebuild = db.Column(db.Integer, nullable=False, default=0)
+    rebuilt_at = db.Column(db.DateTime)
+
+class FormAnswerCount(db.Model):
+    # Per-question answer histogram rows for FormStats
+    __tablename__ = 'form_answer_count'
+
+    form_id = db.Column(db.Integer, db.ForeignKey('form.id'), primary_key=True)
+    question = db.Column(db.String(100), primary_key=True)
+    answer = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class Report(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -104,6 +141,15 @@ class Report(db.Model):
     file_path = db.Column(db.String(500))  # Path to generated report file
     data_filters = db.Column(db.JSON)  # Filters applied to data
     
+    __table_args__ = (
+        db.Index('ix_report_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_report_status_created_at', 'status', 'created_at'),
+        db.Index('ix_report_created_at', 'created_at'),
+        # GET /api/reports pages by id within a user or status
+        db.Index('ix_report_user_id_id', 'user_id', 'id'),
+        db.Index('ix_report_status_id', 'status', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -119,6 +165,26 @@ class Report(db.Model):
             'data_filters': self.data_filters
         }
 
+class ReportTemplate(db.Model):
+    __tablename__ = 'report_template'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text)
+    schema = db.Column(db.JSON)  # Layout definition, see services/pdf_engine.py
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'schema': self.schema,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'is_active': self.is_active
+        }
+
 class Settings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(100), unique=True, nullable=False)
@@ -126,6 +192,8 @@ class Settings(db.Model):
     description = db.Column(db.Text)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     updated_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    # SettingsVersion.version of the write that last changed this row
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     
     def to_dict(self):
         return {
@@ -135,4 +203,11 @@ class Settings(db.Model):
             'description': self.description,
             'updated_at': self.updated_at.isoformat(),
             'updated_by': self.updated_by
-        }
\ No newline at end of file
+        }
+
+class SettingsVersion(db.Model):
+    # Single row counting settings writes; see app/settings_store.py
+    __tablename__ = 'settings_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,159 @@
+"""Keyset pagination and streaming helpers for the listing endpoints.
+
+Both the legacy ``app.py`` routes and the blueprint use these, so nothing
+here is tied to a particular ``db`` instance or model.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, or_
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+STREAM_CHUNK_SIZE = 1000
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return limit if maximum is None else min(limit, maximum)
+
+
+def encode_cursor(values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Turn an ``after`` token back into typed key values for ``columns``."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+def _after(columns, values):
+    # Expanded form of (c1, c2) > (v1, v2); unlike a row-value comparison
+    # every database can match it against a composite index.
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def keyset_query(query, columns, after=None, limit=DEFAULT_PAGE_SIZE):
+    """The query ``keyset_page`` runs: rows after ``after``, plus one to detect a next page."""
+    if after:
+        query = query.filter(_after(columns, decode_cursor(after, columns)))
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def keyset_page(query, columns, after=None, limit=DEFAULT_PAGE_SIZE):
+    """Return ``(rows, next_cursor)`` for the page following ``after``.
+
+    ``columns`` must end with a unique column (usually the primary key) so
+    the ordering is total.  ``next_cursor`` is None on the last page.
+    """
+    rows = keyset_query(query, columns, after, limit).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
+
+
+def iter_keyset(query, columns, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield every row of ``query`` in key order, one bounded page at a time."""
+    after = None
+    while True:
+        rows, after = keyset_page(query, columns, after, chunk_size)
+        yield from rows
+        if after is None:
+            return
+
+
+class KeysetStream:
+    """Rows after ``after`` in key order, read from a server-side cursor.
+
+    With a ``limit`` one extra row is fetched; once iteration is done
+    ``next_cursor`` holds the cursor for the following page, as
+    ``keyset_page`` would have returned it.
+    """
+
+    def __init__(self, query, columns, after=None, limit=None, chunk_size=STREAM_CHUNK_SIZE):
+        if after:
+            query = query.filter(_after(columns, decode_cursor(after, columns)))
+        query = query.order_by(*columns)
+        if limit is not None:
+            query = query.limit(limit + 1)
+        self.query = query
+        self.columns = columns
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, row in enumerate(self.query.yield_per(self.chunk_size)):
+            if count == self.limit:
+                self.next_cursor = encode_cursor([getattr(last, c.key) for c in self.columns])
+                return
+            last = row
+            yield row
+
+
+def stream_rows(query, columns, after=None, limit=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield rows from a server-side cursor where the driver supports one."""
+    return KeysetStream(query, columns, after, limit, chunk_size)
+
+
+def ndjson_lines(rows, serialize):
+    for row in rows:
+        yield json.dumps(serialize(row), default=str) + '\n'
+
+
+def json_array_chunks(rows, serialize, envelope=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a JSON array (optionally wrapped as ``{envelope: [...]}``) in chunks.
+
+    Enveloped output of a limited ``KeysetStream`` ends with its
+    ``next_cursor``, the same key a paginated response carries.
+    """
+    yield '{"%s":[' % envelope if envelope else '['
+    buffer = []
+    first = True
+    for row in rows:
+        item = json.dumps(serialize(row), default=str)
+        buffer.append(item if first else ',' + item)
+        first = False
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+    if envelope and getattr(rows, 'limit', None) is not None:
+        yield '],"next_cursor":%s}' % json.dumps(rows.next_cursor)
+    else:
+        yield ']}' if envelope else ']'
@@ -0,0 +1,309 @@
+"""Background job pipeline for report generation.
+
+Job functions are registered with ``@job`` and take a ``JobContext`` as
+their first argument, which they use to report progress and to notice
+cancellation.  A job may also name an ``on_finished`` hook, which runs
+once the job reaches its final status even when no attempt started (a job
+cancelled while queued), so records the job owns never stay in progress.
+``JobPipeline`` runs them on an in-process thread pool by
+default, which needs no broker, or on Celery when ``JOB_BACKEND`` is
+``celery``.  Retries and timing are handled the same way on both.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from celery import shared_task
+
+from .metrics import record_job
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+registry = {}
+
+
+def job(name=None, retries=0, retry_delay=1.0, on_finished=None):
+    """Register a job function; failed attempts are retried with exponential backoff.
+
+    ``on_finished(status, *args, **kwargs)`` is called with the final status
+    and the job's arguments after the last attempt, or instead of any.
+    """
+    def decorator(fn):
+        fn.job_name = name or fn.__name__
+        fn.job_retries = retries
+        fn.job_retry_delay = retry_delay
+        fn.job_on_finished = on_finished
+        registry[fn.job_name] = fn
+        return fn
+    return decorator
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    def __init__(self, job_id, report=None, is_cancelled=None):
+        self.job_id = job_id
+        self.attempt = 1
+        self._report = report or (lambda progress, message: None)
+        self._is_cancelled = is_cancelled or (lambda: False)
+
+    def progress(self, done, total=None, message=None):
+        """Record progress as ``done/total`` (or a 0-1 fraction) and honour cancellation."""
+        fraction = done / total if total else done
+        self._report(round(min(max(fraction, 0.0), 1.0), 4), message)
+        self.check_cancelled()
+
+    def is_cancelled(self):
+        return self._is_cancelled()
+
+    def check_cancelled(self):
+        if self._is_cancelled():
+            raise JobCancelled()
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def new_state(job_id, name):
+    return {
+        'id': job_id,
+        'name': name,
+        'status': QUEUED,
+        'progress': 0.0,
+        'message': None,
+        'attempts': 0,
+        'result': None,
+        'error': None,
+        'timing': {
+            'queued_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'queue_seconds': None,
+            'run_seconds': None
+        }
+    }
+
+
+def execute(name, ctx, args, kwargs, on_attempt=None):
+    """Run job ``name``, retrying failures up to its ``retries`` setting."""
+    fn = registry[name]
+    attempts = fn.job_retries + 1
+    for attempt in range(1, attempts + 1):
+        ctx.attempt = attempt
+        if on_attempt:
+            on_attempt(attempt)
+        ctx.check_cancelled()
+        try:
+            return fn(ctx, *args, **kwargs)
+        except JobCancelled:
+            raise
+        except Exception:
+            if attempt == attempts:
+                raise
+            time.sleep(fn.job_retry_delay * 2 ** (attempt - 1))
+
+
+def run_with_state(name, ctx, args, kwargs, queue_seconds, on_update):
+    """Execute a job, reporting its status, outcome and timings through ``on_update``."""
+    started = time.perf_counter()
+    on_update(status=RUNNING, timing={'started_at': _now(), 'queue_seconds': round(queue_seconds, 4)})
+    try:
+        result = execute(name, ctx, args, kwargs, on_attempt=lambda n: on_update(attempts=n))
+        outcome = {'status': SUCCEEDED, 'result': result, 'progress': 1.0}
+    except JobCancelled:
+        outcome = {'status': CANCELLED}
+    except Exception as e:
+        outcome = {'status': FAILED, 'error': str(e)}
+    on_finished = registry[name].job_on_finished
+    if on_finished:
+        try:
+            on_finished(outcome['status'], *args, **kwargs)
+        except Exception as e:
+            outcome = {'status': FAILED, 'error': outcome.get('error') or str(e)}
+    run_seconds = time.perf_counter() - started
+    outcome['timing'] = {
+        'finished_at': _now(),
+        'run_seconds': round(run_seconds, 4)
+    }
+    record_job(name, outcome['status'], run_seconds, queue_seconds)
+    on_update(**outcome)
+
+
+class ThreadBackend:
+    """Runs jobs on a local thread pool and keeps their state in memory.
+
+    State is per process, so this backend suits single-process local and
+    test deployments; use Celery when several workers serve the API.
+    """
+
+    def __init__(self, app, max_workers=4, max_finished=1000):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def submit(self, name, args, kwargs):
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = new_state(job_id, name)
+            self._prune()
+        self.executor.submit(self._run, job_id, name, args, kwargs, time.perf_counter())
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            state = self.jobs.get(job_id)
+            if state is None:
+                return None
+            return {**state, 'timing': dict(state['timing'])}
+
+    def cancel(self, job_id):
+        with self.lock:
+            state = self.jobs.get(job_id)
+            if state is None or state['status'] in FINISHED:
+                return False
+            self.cancelled.add(job_id)
+            return True
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            state = self.jobs[job_id]
+            timing = fields.pop('timing', None)
+            if timing:
+                state['timing'].update(timing)
+            state.update(fields)
+            if state['status'] in FINISHED:
+                self.cancelled.discard(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, state in self.jobs.items() if state['status'] in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def _run(self, job_id, name, args, kwargs, queued):
+        update = lambda **fields: self._update(job_id, **fields)
+        ctx = JobContext(
+            job_id,
+            report=lambda progress, message: update(progress=progress, message=message),
+            is_cancelled=lambda: job_id in self.cancelled
+        )
+        with self.app.app_context():
+            run_with_state(name, ctx, args, kwargs, time.perf_counter() - queued, update)
+
+
+def _cancel_key(job_id):
+    return f'job-cancel-{job_id}'
+
+
+@shared_task(bind=True, name='app.pipeline.run_job')
+def run_celery_job(self, name, args, kwargs, queued_at):
+    job_id = self.request.id
+    state = new_state(job_id, name)
+    state['timing']['queued_at'] = datetime.utcfromtimestamp(queued_at).isoformat()
+    backend = self.app.backend
+
+    def update(**fields):
+        timing = fields.pop('timing', None)
+        if timing:
+            state['timing'].update(timing)
+        state.update(fields)
+        if state['status'] == RUNNING:
+            self.update_state(state='PROGRESS', meta=state)
+
+    def is_cancelled():
+        return hasattr(backend, 'get') and backend.get(_cancel_key(job_id)) is not None
+
+    ctx = JobContext(
+        job_id,
+        report=lambda progress, message: update(progress=progress, message=message),
+        is_cancelled=is_cancelled
+    )
+    # Queue time is measured against the submitting process's wall clock
+    run_with_state(name, ctx, args, kwargs, time.time() - queued_at, update)
+    return state
+
+
+class CeleryBackend:
+    STATES = {'PENDING': QUEUED, 'RECEIVED': QUEUED, 'STARTED': RUNNING,
+              'RETRY': RUNNING, 'FAILURE': FAILED, 'REVOKED': CANCELLED}
+
+    def __init__(self, celery):
+        self.celery = celery
+
+    def submit(self, name, args, kwargs):
+        return self.celery.send_task(run_celery_job.name, args=(name, list(args), kwargs, time.time())).id
+
+    def get(self, job_id):
+        result = self.celery.AsyncResult(job_id)
+        if result.state in ('SUCCESS', 'PROGRESS') and isinstance(result.info, dict):
+            return result.info
+        state = new_state(job_id, None)
+        state['status'] = self.STATES.get(result.state, result.state.lower())
+        if result.state == 'FAILURE':
+            state['error'] = str(result.info)
+        return state
+
+    def cancel(self, job_id):
+        state = self.get(job_id)
+        if state['status'] in FINISHED:
+            return False
+        # Running tasks see the flag on their next progress report, and
+        # queued ones before their first attempt, so both stop cleanly and
+        # run their on_finished hook.  Without a flag store, revoke drops
+        # queued tasks (skipping the hook) and running ones finish.
+        if hasattr(self.celery.backend, 'set'):
+            self.celery.backend.set(_cancel_key(job_id), b'1')
+        else:
+            self.celery.control.revoke(job_id)
+        return True
+
+
+class JobPipeline:
+    def __init__(self, app=None, celery=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app, celery)
+
+    def init_app(self, app, celery=None):
+        if app.config.get('JOB_BACKEND', 'thread') == 'celery':
+            if celery is None:
+                raise ValueError('JOB_BACKEND is celery but no Celery instance was given')
+            self.backend = CeleryBackend(celery)
+        else:
+            self.backend = ThreadBackend(app, max_workers=app.config.get('JOB_WORKERS', 4))
+        app.extensions['jobs'] = self
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue job ``fn`` (a registered function or its name) and return the job id."""
+        name = getattr(fn, 'job_name', fn)
+        if name not in registry:
+            raise ValueError(f'Unknown job: {name}')
+        return self.backend.submit(name, args, kwargs)
+
+    def get(self, job_id):
+        return self.backend.get(job_id)
+
+    def cancel(self, job_id):
+        return self.backend.cancel(job_id)
+
+    def wait(self, job_id, timeout, interval=0.05):
+        """Poll until the job finishes or ``timeout`` seconds pass; return its state."""
+        deadline = time.monotonic() + timeout
+        state = self.get(job_id)
+        while state is not None and state['status'] not in FINISHED and time.monotonic() < deadline:
+            time.sleep(interval)
+            state = self.get(job_id)
+        return state
@@ -0,0 +1,202 @@
+"""Routing read-only queries to a replica database.
+
+When ``DATABASE_REPLICA_URL`` is set, ``configure_replica`` registers it
+as the ``replica`` bind and ``RoutingSession`` sends SELECTs there, but
+only inside views decorated with ``read_replica`` or blocks wrapped in
+``use_replica()``.  Everything else, and every INSERT/UPDATE/DELETE,
+stays on the primary.
+
+Read-your-writes: once a session has flushed, its later reads in that
+request go to the primary too, and the response sets a short-lived
+cookie so the same client's next few read-only requests skip the
+replica while it catches up.  Without a replica bind all of this is a
+no-op.
+
+A replica that fails a query (unreachable, or missing the schema) is
+marked down for ``REPLICA_RETRY_SECONDS`` and reads go to the primary
+meanwhile; a ``read_replica`` view that hit the failure is answered again
+from the primary.  Jobs that need every committed row use
+``read_with_fallback``, which also checks the replica has caught up.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, make_response, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from config import engine_options
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+# What a missing table or an unreachable server raises, depending on the driver
+REPLICA_ERRORS = (OperationalError, ProgrammingError)
+
+
+class RoutingSession(Session):
+    """Session that sends opted-in reads on the default bind to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engines = self._db.engines
+        if bind is None and REPLICA_BIND in engines and engine is engines.get(None) \
+                and self._reads_from_replica(clause) and not replica_down():
+            return engines[REPLICA_BIND]
+        return engine
+
+    def _reads_from_replica(self, clause):
+        return bool(
+            self.info.get('replica')
+            and not self.info.get('replica_wrote')
+            and not self._flushing
+            # session.connection() and text() give no clause to go by
+            and getattr(clause, 'is_select', False)
+        )
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['replica_wrote'] = True
+    g.db_wrote = True
+
+
+@event.listens_for(Engine, 'handle_error')
+def _replica_failed(context):
+    if not has_app_context() or not isinstance(context.sqlalchemy_exception, REPLICA_ERRORS):
+        return
+    engines = current_app.extensions['sqlalchemy'].engines
+    if REPLICA_BIND in engines and context.engine is engines[REPLICA_BIND]:
+        current_app.extensions['replica']['down_until'] = \
+            time.monotonic() + current_app.config['REPLICA_RETRY_SECONDS']
+        g.replica_failed = True
+
+
+def replica_down():
+    """Whether a recent replica failure is sending reads to the primary."""
+    state = current_app.extensions.get('replica')
+    return bool(state) and time.monotonic() < state['down_until']
+
+
+def configure_replica(app, url):
+    """Register ``url`` as the replica bind; call before ``db.init_app``."""
+    if not url:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA_BIND] = {'url': url, **engine_options(url)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+    app.config.setdefault('REPLICA_RETRY_SECONDS', 30)
+    app.extensions['replica'] = {'down_until': 0.0}
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('db_wrote'):
+            until = time.time() + app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(STICKY_COOKIE, f'{until:.0f}', max_age=app.config['REPLICA_STICKY_SECONDS'],
+                                httponly=True, samesite='Lax')
+        return response
+
+
+def _recently_wrote():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def use_replica(session=None):
+    """Send reads in this block to the replica, even if the session wrote before it."""
+    session = session or current_app.extensions['sqlalchemy'].session
+    info = session.info
+    previous = info.get('replica'), info.get('replica_wrote')
+    info['replica'], info['replica_wrote'] = True, False
+    try:
+        yield session
+    finally:
+        info['replica'] = previous[0]
+        # Writes made inside the block still count for later reads
+        info['replica_wrote'] = bool(previous[1] or info.get('replica_wrote'))
+
+
+def replica_caught_up(column, target=None):
+    """Whether the replica has every row up to ``target`` by ``max(column)``.
+
+    ``target`` defaults to the primary's current maximum.  False without a
+    replica, while it is marked down, or when it cannot answer.
+    """
+    sqlalchemy = current_app.extensions['sqlalchemy']
+    replica = sqlalchemy.engines.get(REPLICA_BIND)
+    if replica is None or replica_down():
+        return False
+    query = sa.select(sa.func.max(column))
+    if target is None:
+        target = sqlalchemy.session.execute(query, bind_arguments={'bind': sqlalchemy.engines[None]}).scalar()
+    # A connection of its own, so a failure does not abort the session's transaction
+    try:
+        with replica.connect() as connection:
+            reached = connection.execute(query).scalar()
+    except REPLICA_ERRORS:
+        return False
+    return (reached or 0) >= (target or 0)
+
+
+def read_with_fallback(read, column, target=None):
+    """Return ``read()``, run on the replica if it has caught up on ``column``.
+
+    Otherwise, or if the replica fails part way through, ``read`` runs on
+    the primary, so it must be safe to call twice.
+    """
+    if not replica_caught_up(column, target):
+        return read()
+    session = current_app.extensions['sqlalchemy'].session
+    g.pop('replica_failed', None)
+    try:
+        with use_replica(session):
+            return read()
+    except REPLICA_ERRORS:
+        if not g.pop('replica_failed', False):
+            raise
+    session.rollback()
+    return read()
+
+
+def read_replica(view):
+    """Serve a read-only view from the replica unless this client just wrote.
+
+    A streamed body runs its queries after the view returns, so for those
+    the session stays on the replica until the response is closed.  If the
+    replica fails while the view runs, the view is run again on the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _recently_wrote() or replica_down():
+            return view(*args, **kwargs)
+        # The session object itself, not the scoped proxy: a streamed body
+        # may run under another app context and so another scoped session
+        session = current_app.extensions['sqlalchemy'].session()
+        session.info['replica'] = True
+        release = lambda: session.info.pop('replica', None)
+        g.pop('replica_failed', None)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            release()
+            if not g.pop('replica_failed', False):
+                raise
+        else:
+            # Views that turn errors into a 500 still leave the flag behind
+            if not g.pop('replica_failed', False):
+                if response.is_streamed:
+                    response.call_on_close(release)
+                else:
+                    release()
+                return response
+            release()
+        session.rollback()
+        return view(*args, **kwargs)
+    return wrapper
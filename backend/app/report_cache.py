@@ -0,0 +1,113 @@
+"""Content-addressed cache of generated report files.
+
+A report's file name is a hash of the parameters that shape it plus a
+version of the data it was built from, so a repeat request for unchanged
+data maps to a file that already exists.  Eviction keeps the directory
+under an age and total-size budget, dropping least recently used files
+first; a file's precompressed ``.gz``/``.br`` siblings count towards its
+size and go with it.  Partial files are left to their writers until they
+are older than the age limit.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .downloads import ENCODINGS, remove_with_variants
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+def cache_key(params, data_version):
+    canonical = json.dumps({'params': params, 'data_version': data_version},
+                           sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, directory='reports', max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def path_for(self, params, data_version, extension):
+        return os.path.join(self.directory, f'{cache_key(params, data_version)}.{extension}')
+
+    def lookup(self, path, indexed=True):
+        """Count and return whether ``path`` is a usable cached artifact.
+
+        ``indexed`` lets the caller fold in its own check, e.g. that a
+        completed report row still points at the file.
+        """
+        hit = indexed and os.path.isfile(path)
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            # atime is the last-used time for LRU eviction; mtime stays the
+            # creation time so download ETags and Last-Modified hold
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        return hit
+
+    def evict(self):
+        """Remove expired files, then the least recently used until under budget."""
+        if not os.path.isdir(self.directory):
+            return []
+        now = time.time()
+        files = {}
+        removed = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if '.tmp' in entry.name:
+                # Partially written; one this old was left by a worker that died mid-write
+                if now - entry.stat().st_mtime > self.max_age:
+                    self._remove_partial(entry.path)
+                continue
+            files[entry.path] = entry.stat()
+
+        entries = []
+        for path, stat in files.items():
+            if any(path.endswith(suffix) and path[:-len(suffix)] in files for _, suffix in ENCODINGS):
+                continue  # counted with the file it was compressed from
+            size = stat.st_size + sum(files[path + suffix].st_size
+                                      for _, suffix in ENCODINGS if path + suffix in files)
+            entries.append((stat.st_atime, size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for used, size, path in entries:
+            if now - used <= self.max_age and total <= self.max_bytes:
+                break
+            remove_with_variants(path)
+            total -= size
+            removed.append(path)
+
+        with self.lock:
+            self.evictions += len(removed)
+        return removed
+
+    @staticmethod
+    def _remove_partial(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
@@ -1,29 +1,45 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import current_user, jwt_required
 from .models import db
-from .services import report_service
-from .services.ai_service import get_ai_service
-from .tasks import generate_report_task
+from . import jobs
+from .services.report_service import get_report_service
+from .services.ai_runner import get_ai_runner
+from .pipeline import FAILED, SUCCEEDED
+from .tasks import batch_reports_task, generate_report_task, rebuild_form_answers_task, sync_form_responses_task
+from .answers import AnswersTableStale, crosstab, question_summary
+from .filters import FilterError, validate_filters
+from .form_stats import form_stats
+from .pagination import parse_limit
+from .replica import read_replica
+from .serializers import FORM_LIST, REPORT_LIST, SUBMISSION_LIST, json_response
+from .settings_store import DEFAULT_SETTINGS, SECRET_SETTINGS, SettingsStore
+from .auth import role_required
 
 api = Blueprint('api', __name__)
 
-from .models import Report, User
+from .models import Form, Report, Settings, SettingsVersion, Submission
+settings = SettingsStore(db, Settings, SettingsVersion, DEFAULT_SETTINGS, SECRET_SETTINGS)
+
 @api.route('/reports', methods=['POST'])
 @jwt_required()
 def create_report():
-    user_email = get_jwt_identity()
-    user = User.query.filter_by(email=user_email).first()
+    user = current_user
     data = request.get_json()
 
     if not data or 'template_id' not in data:
         return jsonify({'error': 'Missing template_id'}), 400
+    try:
+        validate_filters(data.get('data_filters'))
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Create a new report record
     new_report = Report(
         title=data.get('title'),
         report_type=data.get('report_type'),
         user_id=user.id,
-        status='processing'
+        status='processing',
+        data_filters=data.get('data_filters')
     )
     db.session.add(new_report)
     db.session.commit()
@@ -32,35 +48,206 @@ def create_report():
     data['report_id'] = new_report.id
 
     # Queue report generation task
-    task = generate_report_task.delay(user.id, data)
+    task_id = jobs.submit(generate_report_task, user.id, data)
     
     return jsonify({
-        'task_id': task.id,
+        'task_id': task_id,
         'status': 'processing',
         'report_id': new_report.id
     }), 202
 
+def listing(projection, query, order_by, key='items'):
+    """One keyset page of ``projection`` records; the next cursor is in ``next_cursor``."""
+    records, next_cursor = projection.page(query, order_by, request.args.get('after'),
+                                           parse_limit(request.args.get('limit')))
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else None
+    return json_response({key: records, 'next_cursor': next_cursor}, headers=headers)
+
+@api.route('/reports', methods=['GET'])
+@jwt_required()
+@read_replica
+def list_reports():
+    """Reports with their authors, in one query per page.
+
+    Users see their own reports; admins see everyone's and may filter by ``user_id``.
+    """
+    query = REPORT_LIST.query()
+    if request.args.get('status'):
+        query = query.filter(Report.status == request.args['status'])
+    if current_user.role != 'admin':
+        query = query.filter(Report.user_id == current_user.id)
+    elif request.args.get('user_id'):
+        user_id = request.args.get('user_id', type=int)
+        if user_id is None:
+            return jsonify({'error': 'user_id must be an integer'}), 400
+        query = query.filter(Report.user_id == user_id)
+    try:
+        return listing(REPORT_LIST, query, [Report.id], 'reports')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/forms', methods=['GET'])
+@jwt_required()
+@read_replica
+def list_forms():
+    """Forms with their creators and submission counts."""
+    query = FORM_LIST.query()
+    if request.args.get('active') is not None:
+        query = query.filter(Form.is_active.is_(request.args['active'].lower() in ('true', '1')))
+    try:
+        return listing(FORM_LIST, query, [Form.id], 'forms')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/forms/<int:form_id>/submissions', methods=['GET'])
+@jwt_required()
+@read_replica
+def list_form_submissions(form_id):
+    query = SUBMISSION_LIST.query().filter(Submission.form_id == form_id)
+    try:
+        return listing(SUBMISSION_LIST, query, [Submission.id], 'submissions')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/reports/batch', methods=['POST'])
+@role_required('admin')
+def create_batch_reports():
+    """Render one report per form (all active forms unless ``form_ids`` is given)."""
+    user = current_user
+    data = request.get_json() or {}
+    if 'template_id' not in data:
+        return jsonify({'error': 'Missing template_id'}), 400
+    workers = data.get('workers')
+    if workers is not None and (not isinstance(workers, int) or isinstance(workers, bool) or workers < 1):
+        return jsonify({'error': 'workers must be a positive integer'}), 400
+    form_ids = data.get('form_ids')
+    if form_ids is not None and (not isinstance(form_ids, list) or
+                                 any(not isinstance(i, int) or isinstance(i, bool) for i in form_ids)):
+        return jsonify({'error': 'form_ids must be a list of integers'}), 400
+    task_id = jobs.submit(batch_reports_task, user.id, data['template_id'], form_ids, workers)
+    return jsonify({'task_id': task_id, 'status': 'processing'}), 202
+
 @api.route('/reports/<task_id>', methods=['GET'])
 @jwt_required()
 def get_report_status(task_id):
-    task = generate_report_task.AsyncResult(task_id)
-    response = {
-        'task_id': task_id,
-        'status': task.status,
-    }
-    if task.status == 'SUCCESS':
-        response['result'] = task.get()
-    return jsonify(response)
-
-# @api.route('/reports/templates', methods=['GET'])
-# @jwt_required()
-# def get_report_templates():
-#     templates = report_service.get_templates()
-#     return jsonify(templates)
+    state = jobs.get(task_id)
+    if state is None:
+        return jsonify({'error': 'Unknown task'}), 404
+    return jsonify({'task_id': task_id, **state})
+
+@api.route('/reports/<task_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_report(task_id):
+    if not jobs.cancel(task_id):
+        return jsonify({'error': 'Task is not running'}), 409
+    return jsonify({'task_id': task_id, 'status': 'cancelling'}), 202
+
+@api.route('/forms/<int:form_id>/sync', methods=['POST'])
+@jwt_required()
+def sync_form(form_id):
+    form = Form.query.get_or_404(form_id)
+    if not form.google_form_id:
+        return jsonify({'error': 'Form is not linked to a Google Form'}), 400
+    data = request.get_json(silent=True) or {}
+    task_id = jobs.submit(sync_form_responses_task, form.id, data.get('summary_range'))
+    return jsonify({'task_id': task_id, 'status': 'processing'}), 202
+
+@api.route('/forms/<int:form_id>/answers/summary', methods=['GET'])
+@jwt_required()
+def form_answer_summary(form_id):
+    form = Form.query.get_or_404(form_id)
+    try:
+        return jsonify(question_summary(form))
+    except AnswersTableStale as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+@api.route('/forms/<int:form_id>/answers/crosstab', methods=['GET'])
+@jwt_required()
+def form_answer_crosstab(form_id):
+    form = Form.query.get_or_404(form_id)
+    rows, cols = request.args.get('rows'), request.args.get('cols')
+    if not rows or not cols:
+        return jsonify({'error': 'rows and cols are required'}), 400
+    try:
+        return jsonify(crosstab(form, rows, cols))
+    except AnswersTableStale as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/forms/<int:form_id>/stats', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_form_stats(form_id):
+    """Materialised form statistics; constant time whatever the submission count."""
+    Form.query.get_or_404(form_id)
+    return jsonify(form_stats(form_id))
+
+@api.route('/forms/<int:form_id>/answers/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_form_answers(form_id):
+    form = Form.query.get_or_404(form_id)
+    task_id = jobs.submit(rebuild_form_answers_task, form.id)
+    return jsonify({'task_id': task_id, 'status': 'processing'}), 202
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    state = jobs.get(job_id)
+    if state is None:
+        return jsonify({'error': 'Unknown task'}), 404
+    return jsonify(state)
+
+@api.route('/reports/templates', methods=['GET'])
+@jwt_required()
+def get_report_templates():
+    templates = get_report_service().get_templates()
+    return jsonify(templates)
 
 @api.route('/ai/analyze', methods=['POST'])
 @jwt_required()
 def analyze_data():
+    """Queue an analysis; waits up to ``wait`` seconds (default 0) for the result."""
     data = request.get_json()
-    analysis = get_ai_service().analyze_data(data)
-    return jsonify(analysis)
+    try:
+        wait = min(float(request.args.get('wait', 0)), 30)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number'}), 400
+
+    runner = get_ai_runner()
+    state = runner.wait(runner.submit('analysis', data), wait)
+    if state['status'] == SUCCEEDED:
+        return jsonify(state['result'])
+    if state['status'] == FAILED:
+        return jsonify({'error': state['error']}), 500
+    return jsonify({'request_id': state['id'], 'status': state['status'],
+                    'status_url': f"/api/ai/analyze/{state['id']}"}), 202
+
+@api.route('/ai/analyze/<request_id>', methods=['GET'])
+@jwt_required()
+def get_analysis(request_id):
+    state = get_ai_runner().get(request_id)
+    if state is None:
+        return jsonify({'error': 'Unknown request'}), 404
+    return jsonify(state)
+
+@api.route('/ai/cache', methods=['GET'])
+@jwt_required()
+def ai_cache_stats():
+    return jsonify(get_ai_runner().stats())
+
+@api.route('/settings', methods=['GET'])
+@jwt_required()
+def get_settings():
+    """Every setting, or only those named by repeated ``key`` parameters."""
+    return jsonify(settings.get_many(request.args.getlist('key') or None))
+
+@api.route('/settings', methods=['PUT', 'POST'])
+@role_required('admin')
+def update_settings():
+    try:
+        version = settings.set_many(request.get_json(silent=True), user_id=current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Settings updated successfully', 'version': version,
+                    'settings': settings.get_many()})
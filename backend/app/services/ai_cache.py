@@ -0,0 +1,253 @@
+"""Response cache for AI completions.
+
+Entries are keyed by a hash of the model name and the canonicalised
+messages.  Two stores are provided: an in-memory LRU and a SQLite file
+that survives restarts and is shared between worker processes.
+``ResponseCache`` layers them, keeps hit/miss counters and makes
+concurrent identical requests share a single upstream call.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def prompt_key(model, messages):
+    canonical = json.dumps({'model': model, 'messages': messages},
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryStore:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key):
+        """``(value, expires)`` for a live entry, else ``None``."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires=None):
+        """Store ``value`` until ``expires`` (a timestamp), but no longer than the TTL."""
+        expires = min(expires or float('inf'), time.time() + self.ttl)
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteStore:
+    """On-disk store; values are JSON, evicted by TTL and least recent access."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES * 10, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS ai_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_ai_cache_accessed ON ai_cache (accessed)')
+
+    def _connect(self):
+        # sqlite3 connections may not be shared across threads
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key):
+        """``(value, expires)`` for a live entry, else ``None``."""
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute('SELECT value, expires FROM ai_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            with connection:
+                connection.execute('DELETE FROM ai_cache WHERE key = ?', (key,))
+            return None
+        with connection:
+            connection.execute('UPDATE ai_cache SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires=None):
+        """Store ``value`` until ``expires`` (a timestamp), but no longer than the TTL."""
+        connection = self._connect()
+        now = time.time()
+        expires = min(expires or float('inf'), now + self.ttl)
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO ai_cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires, now)
+            )
+            connection.execute('DELETE FROM ai_cache WHERE expires < ?', (now,))
+            connection.execute(
+                'DELETE FROM ai_cache WHERE key IN ('
+                'SELECT key FROM ai_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM ai_cache').fetchone()[0]
+
+
+class ResponseCache:
+    """Layered cache with hit-rate metrics and single-flight computation."""
+
+    def __init__(self, stores):
+        self.stores = list(stores)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def get(self, key):
+        for depth, store in enumerate(self.stores):
+            entry = store.get_entry(key)
+            if entry is not None:
+                # Promote into the faster stores in front of this one, keeping
+                # the expiry so a promoted entry does not outlive the original
+                value, expires = entry
+                for faster in self.stores[:depth]:
+                    faster.set(key, value, expires)
+                return value
+        return None
+
+    def set(self, key, value):
+        for store in self.stores:
+            store.set(key, value)
+
+    def lookup(self, key):
+        """``get`` that counts towards the hit rate."""
+        value = self.get(key)
+        self.count('hits' if value is not None else 'misses')
+        return value
+
+    def count(self, outcome):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: True):
+        """Return the cached value for ``key`` or compute it exactly once.
+
+        Callers asking for a key that is already being computed wait for
+        that result instead of issuing their own request.  Values rejected
+        by ``cacheable`` are returned but not stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            with self.lock:
+                self.hits += 1
+            return value
+
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = {'done': threading.Event(), 'value': None, 'error': None}
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['value']
+
+        try:
+            value = compute()
+            flight['value'] = value
+            if cacheable(value):
+                self.set(key, value)
+            return value
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight['done'].set()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+                'entries': [len(store) for store in self.stores]
+            }
+
+
+def cache_from_env():
+    """Build the cache described by the ``AI_CACHE*`` environment variables.
+
+    ``AI_CACHE`` is ``memory`` (default), ``sqlite``, ``tiered`` (memory in
+    front of SQLite) or ``none``.
+    """
+    kind = os.getenv('AI_CACHE', 'memory')
+    ttl = int(os.getenv('AI_CACHE_TTL', DEFAULT_TTL))
+    max_entries = int(os.getenv('AI_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    path = os.getenv('AI_CACHE_PATH', 'instance/ai_cache.sqlite')
+
+    stores = []
+    if kind in ('memory', 'tiered'):
+        stores.append(MemoryStore(max_entries, ttl))
+    if kind in ('sqlite', 'tiered'):
+        stores.append(SQLiteStore(path, max_entries * 10 if kind == 'tiered' else max_entries, ttl))
+    return ResponseCache(stores)
+
+
+default_cache = None
+default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Process-wide cache shared by the blocking and async AI clients."""
+    global default_cache
+    if default_cache is None:
+        with default_cache_lock:
+            if default_cache is None:
+                default_cache = cache_from_env()
+    return default_cache
@@ -0,0 +1,337 @@
+"""Asynchronous execution layer for AI requests.
+
+An ``AIRunner`` owns an asyncio event loop on a background thread and an
+async OpenAI-compatible client.  Blocking callers (Flask views, report
+jobs) hand it work with ``submit`` and either poll ``get`` or wait on
+``result``; the loop keeps at most ``concurrency`` completions in flight,
+applies a per-call timeout and retries failures with jittered
+exponential backoff.
+
+Report-suggestion prompts that arrive within ``batch_window`` seconds of
+each other are coalesced into a single completion asking for one answer
+per dataset.  Results go through the same response cache as
+``AIService``, so a batched answer also serves later single requests.
+
+Building messages (``compact`` digests whole payloads with pandas) and
+response-cache reads and writes block, so they run on the loop's default
+executor; the loop thread itself only awaits.
+
+Point ``OPENAI_BASE_URL`` at a local server (see
+``benchmarks/fake_openai.py``) to exercise the whole path offline.
+"""
+import asyncio
+import functools
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from ..pipeline import FAILED, FINISHED, QUEUED, RUNNING, SUCCEEDED
+from .ai_cache import get_default_cache, prompt_key
+from .ai_service import (
+    SUGGESTIONS_SYSTEM,
+    analysis_messages,
+    compact,
+    decode_response,
+    is_cacheable,
+    model_name,
+    suggestion_messages,
+)
+
+BATCH_SUGGESTIONS_SYSTEM = (
+    SUGGESTIONS_SYSTEM + " You will be given several datasets. Answer with a JSON array holding"
+    " one suggestions object per dataset, in the same order."
+)
+
+
+def batch_suggestion_messages(datasets):
+    content = json.dumps({'datasets': [compact(data) for data in datasets]}, sort_keys=True, default=str)
+    return [
+        {'role': 'system', 'content': BATCH_SUGGESTIONS_SYSTEM},
+        {'role': 'user', 'content': content}
+    ]
+
+
+class AIRunner:
+    def __init__(self, client=None, cache=None, concurrency=4, timeout=60.0, retries=3,
+                 backoff=0.5, batch_size=8, batch_window=0.05, max_finished=1000):
+        self.client = client
+        self.cache = cache if cache is not None else get_default_cache()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_finished = max_finished
+
+        self.requests = OrderedDict()
+        self.lock = threading.Lock()
+        self.loop = None
+        self.semaphore = None
+        self.calls = 0
+        self.batches = 0
+
+        # Only touched from the loop thread
+        self.in_flight = {}
+        self.pending_suggestions = []
+        self.flush_handle = None
+
+    @classmethod
+    def from_env(cls, client=None, cache=None):
+        return cls(
+            client=client,
+            cache=cache,
+            concurrency=int(os.getenv('AI_CONCURRENCY', 4)),
+            timeout=float(os.getenv('AI_TIMEOUT', 60)),
+            retries=int(os.getenv('AI_RETRIES', 3)),
+            batch_size=int(os.getenv('AI_BATCH_SIZE', 8)),
+            batch_window=float(os.getenv('AI_BATCH_WINDOW', 0.05))
+        )
+
+    def _start(self):
+        with self.lock:
+            if self.loop is not None:
+                return
+            if self.client is None:
+                import openai
+                self.client = openai.AsyncOpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    base_url=os.getenv('OPENAI_BASE_URL') or None,
+                    max_retries=0  # retries are ours, with jitter
+                )
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self.semaphore = asyncio.Semaphore(self.concurrency)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=run, name='ai-runner', daemon=True).start()
+            ready.wait()
+            self.loop = loop
+
+    # -- blocking API -------------------------------------------------------
+
+    def submit(self, kind, data):
+        """Queue an ``'analysis'`` or ``'suggestions'`` request; returns its id."""
+        if kind not in ('analysis', 'suggestions'):
+            raise ValueError(f'Unknown AI request kind: {kind}')
+        self._start()
+        request_id = uuid.uuid4().hex
+        state = {
+            'id': request_id,
+            'kind': kind,
+            'status': QUEUED,
+            'submitted_at': time.time(),
+            'seconds': None,
+            'result': None,
+            'error': None
+        }
+        # Published with its future, so another thread never sees a state without one
+        state['future'] = asyncio.run_coroutine_threadsafe(self._run(state, kind, data), self.loop)
+        with self.lock:
+            self.requests[request_id] = state
+            self._trim()
+        return request_id
+
+    def get(self, request_id):
+        with self.lock:
+            state = self.requests.get(request_id)
+            if state is None:
+                return None
+            return {k: v for k, v in state.items() if k != 'future'}
+
+    def result(self, request_id, timeout=None):
+        """Block until the request finishes and return its result (re-raising its error)."""
+        with self.lock:
+            state = self.requests.get(request_id)
+        if state is None:
+            raise KeyError(request_id)
+        return state['future'].result(timeout)
+
+    def wait(self, request_id, timeout):
+        """Wait up to ``timeout`` seconds; returns the state either way."""
+        with self.lock:
+            state = self.requests.get(request_id)
+        if state is not None and timeout:
+            try:
+                state['future'].result(timeout)
+            except Exception:
+                pass
+        return self.get(request_id)
+
+    def run(self, kind, data, timeout=None):
+        return self.result(self.submit(kind, data), timeout)
+
+    def stats(self):
+        with self.lock:
+            statuses = [state['status'] for state in self.requests.values()]
+        return {
+            'calls': self.calls,
+            'batches': self.batches,
+            'concurrency': self.concurrency,
+            'pending': sum(1 for status in statuses if status not in FINISHED),
+            'cache': self.cache.stats()
+        }
+
+    def _trim(self):
+        finished = [key for key, state in self.requests.items() if state['status'] in FINISHED]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.requests[key]
+
+    # -- event loop side ----------------------------------------------------
+
+    async def _blocking(self, fn, *args):
+        """Run ``fn`` on the default executor so the loop keeps serving other requests."""
+        return await self.loop.run_in_executor(None, functools.partial(fn, *args))
+
+    async def _run(self, state, kind, data):
+        state['status'] = RUNNING
+        try:
+            if kind == 'analysis':
+                result = await self._cached_chat(await self._blocking(analysis_messages, data))
+            else:
+                result = await self._suggest(data)
+            state['result'] = result
+            state['status'] = SUCCEEDED
+            return result
+        except Exception as e:
+            state['error'] = str(e) or type(e).__name__
+            state['status'] = FAILED
+            raise
+        finally:
+            state['seconds'] = round(time.time() - state['submitted_at'], 3)
+
+    async def _cached_chat(self, messages, key=None):
+        """Cached, single-flight completion of ``messages``."""
+        if key is None:
+            key = prompt_key(model_name(), messages)
+        if key in self.in_flight:
+            self.cache.count('coalesced')
+            return await asyncio.shield(self.in_flight[key])
+
+        # Registered before the cache lookup yields, so identical requests wait on it
+        flight = self.in_flight[key] = self.loop.create_future()
+        try:
+            result = await self._blocking(self.cache.lookup, key)
+            if result is None:
+                result = await self._complete(messages)
+                if is_cacheable(result):
+                    await self._blocking(self.cache.set, key, result)
+            flight.set_result(result)
+            return result
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def _complete(self, messages):
+        for attempt in itertools.count():
+            try:
+                async with self.semaphore:
+                    self.calls += 1
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(model=model_name(), messages=messages),
+                        self.timeout
+                    )
+                return decode_response(response)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                # Full jitter keeps retries from a burst of failures apart
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def _suggest(self, data):
+        def prepare():
+            messages = suggestion_messages(data)
+            key = prompt_key(model_name(), messages)
+            return messages, key, self.cache.lookup(key)
+
+        messages, key, cached = await self._blocking(prepare)
+        if cached is not None:
+            return cached
+
+        future = self.loop.create_future()
+        self.pending_suggestions.append((data, messages, key, future))
+        if len(self.pending_suggestions) >= self.batch_size:
+            self._flush_suggestions()
+        elif self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.batch_window, self._flush_suggestions)
+        return await future
+
+    def _flush_suggestions(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending_suggestions = self.pending_suggestions, []
+        if batch:
+            self.loop.create_task(self._run_suggestion_batch(batch))
+
+    async def _run_suggestion_batch(self, batch):
+        try:
+            await self._answer_suggestion_batch(batch)
+        except Exception as e:
+            # Callers block on these futures, so none may be left unresolved
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _cache_results(self, keys, results):
+        for key, result in zip(keys, results):
+            if is_cacheable(result):
+                self.cache.set(key, result)
+
+    async def _answer_suggestion_batch(self, batch):
+        # Identical datasets in one window share a slot in the prompt
+        slots = OrderedDict()
+        for data, messages, key, future in batch:
+            slots.setdefault(key, (data, messages, []))[2].append(future)
+        datasets = [data for data, _, _ in slots.values()]
+
+        results = None
+        if len(datasets) > 1:
+            self.batches += 1
+            try:
+                messages = await self._blocking(batch_suggestion_messages, datasets)
+                answer = await self._complete(messages)
+                if isinstance(answer, list) and len(answer) == len(datasets):
+                    results = answer
+                    await self._blocking(self._cache_results, list(slots), results)
+            except Exception:
+                results = None
+        if results is None:
+            # Single dataset, or the model did not answer one item per dataset
+            results = await asyncio.gather(
+                *(self._cached_chat(messages, key) for key, (_, messages, _) in slots.items()),
+                return_exceptions=True
+            )
+
+        for (_, _, futures), result in zip(slots.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+ai_runner = None
+ai_runner_lock = threading.Lock()
+
+
+def get_ai_runner():
+    global ai_runner
+    if ai_runner is None:
+        with ai_runner_lock:
+            if ai_runner is None:
+                ai_runner = AIRunner.from_env()
+    return ai_runner
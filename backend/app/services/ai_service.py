@@ -1,65 +1,86 @@
-import openai
 import os
 import json
 from typing import Dict, Any
 
-class AIService:
-    def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from .ai_cache import get_default_cache, prompt_key
 
-    def analyze_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        return self._analyze_with_openai(data)
+DECODE_ERROR = {"error": "Failed to decode OpenAI response"}
 
-    def _analyze_with_openai(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        model_name = os.getenv("OPENAI_MODEL", "gpt-4")
-        response = self.openai_client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a data analysis assistant. Analyze the provided data and generate insights."
-                },
-                {
-                    "role": "user",
-                    "content": json.dumps(data)
-                }
-            ]
-        )
-        try:
-            return json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError:
-            return {"error": "Failed to decode OpenAI response"}
+ANALYSIS_SYSTEM = "You are a data analysis assistant. Analyze the provided data and generate insights."
+SUGGESTIONS_SYSTEM = "You are a report generation assistant. Provide structured suggestions for report content."
 
-    def generate_report_suggestions(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate suggestions for report content based on the data"""
-        prompt = f"""
-        Given this data: {json.dumps(data)}
+def model_name() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-4")
+
+def compact(data: Dict[str, Any]):
+    # prompt_digest needs pandas, so it is only imported with the first prompt
+    from .prompt_digest import compact_payload
+    return compact_payload(data)
+
+def analysis_messages(data: Dict[str, Any]):
+    # Payload keys are serialised sorted so equal data always hashes to the same cache key;
+    # oversized payloads are reduced to a digest that fits the prompt token budget
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM},
+        {"role": "user", "content": json.dumps(compact(data), sort_keys=True, default=str)}
+    ]
+
+def suggestion_prompt(data: Dict[str, Any]) -> str:
+    return f"""
+        Given this data: {json.dumps(compact(data), sort_keys=True, default=str)}
         Generate suggestions for:
         1. Key metrics to highlight
         2. Recommended visualizations
         3. Important trends to note
         4. Potential areas of concern
         """
-        
-        model_name = os.getenv("OPENAI_MODEL", "gpt-4")
-        response = self.openai_client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a report generation assistant. Provide structured suggestions for report content."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+
+def suggestion_messages(data: Dict[str, Any]):
+    return [
+        {"role": "system", "content": SUGGESTIONS_SYSTEM},
+        {"role": "user", "content": suggestion_prompt(data)}
+    ]
+
+def decode_response(response) -> Dict[str, Any]:
+    try:
+        return json.loads(response.choices[0].message.content)
+    except json.JSONDecodeError:
+        # A copy, so a caller changing its result cannot change the constant
+        return dict(DECODE_ERROR)
+
+def is_cacheable(result) -> bool:
+    return result != DECODE_ERROR
+
+class AIService:
+    def __init__(self, client=None, cache=None):
+        # Any object with chat.completions.create(model=..., messages=...) works as client
+        if client is None:
+            import openai
+            client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.openai_client = client
+        self.cache = cache if cache is not None else get_default_cache()
+
+    def analyze_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._analyze_with_openai(data)
+
+    def _analyze_with_openai(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._chat(analysis_messages(data))
+
+    def generate_report_suggestions(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate suggestions for report content based on the data"""
+        return self._chat(suggestion_messages(data))
+
+    def _chat(self, messages) -> Dict[str, Any]:
+        """Run one chat completion, answering identical prompts from the cache."""
+        model = model_name()
+        return self.cache.get_or_compute(
+            prompt_key(model, messages),
+            lambda: decode_response(self.openai_client.chat.completions.create(model=model, messages=messages)),
+            cacheable=is_cacheable
         )
-        
-        try:
-            return json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError:
-            return {"error": "Failed to decode OpenAI response"}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
 
 ai_service = None
 
@@ -0,0 +1,546 @@
+"""Template-driven PDF rendering on top of reportlab.
+
+A template schema (``ReportTemplate.schema``) is a JSON document::
+
+    {
+      "title": "Monthly summary",
+      "page_size": "A4",                # or "letter"
+      "orientation": "portrait",        # or "landscape"
+      "sections": [
+        {"type": "heading", "text": "{title}", "level": 1},
+        {"type": "text", "text": "Generated for {department}"},
+        {"type": "summary", "metrics": [{"label": "Responses", "key": "count"},
+                                        {"label": "Average", "key": "average", "format": "{:.1f}"}]},
+        {"type": "chart", "chart": "bar", "source": "by_group", "x": "group", "y": "count"},
+        {"type": "table", "source": "rows",
+         "columns": [{"key": "name", "label": "Name", "width": 2},
+                     {"key": "score", "label": "Score", "format": "{:.1f}", "align": "right"}]},
+        {"type": "page_break"}
+      ]
+    }
+
+``compile_template`` turns a schema into a ``CompiledTemplate`` whose
+sections have their geometry, fonts and value formatters worked out, so
+rendering only binds data.  Compiled templates are cached by schema
+content in a ``TemplateCache``.
+
+Pages are drawn directly on a canvas rather than through platypus, which
+would need every table row as a flowable up front.  Table sources may be
+iterators (or callables returning one), are consumed one row at a time
+and flushed a page at a time, so memory use does not depend on the
+number of rows beyond the compressed page streams reportlab keeps until
+the file is saved.
+"""
+import hashlib
+import json
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape, letter, portrait
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph
+
+PAGE_SIZES = {'A4': A4, 'letter': letter}
+MARGIN = 18 * mm
+FOOTER_HEIGHT = 10 * mm
+FONT = 'Helvetica'
+BOLD_FONT = 'Helvetica-Bold'
+HEADING_SIZES = {1: 18, 2: 14, 3: 12}
+MAX_CHART_POINTS = 50
+STRIPE = colors.HexColor('#f2f4f7')
+HEADER_FILL = colors.HexColor('#1f3b57')
+CHART_COLORS = [colors.HexColor(c) for c in ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b')]
+
+
+class _TemplateFormatter(string.Formatter):
+    """``str.format`` restricted to plain field names.
+
+    Templates come from users, and ``str.format`` would let a field such as
+    ``{summary.__globals__[os].environ}`` walk from a value in ``data`` to
+    anything in the process.  Fields with ``.`` or ``[`` are rejected;
+    unknown names and callables (lazy table sources) format as empty.
+    """
+
+    def get_field(self, field_name, args, kwargs):
+        if not _PLAIN_FIELD.fullmatch(field_name):
+            raise ValueError(f'Template fields must be plain names: {{{field_name}}}')
+        key = int(field_name) if field_name.isdigit() else field_name
+        return self.get_value(key, args, kwargs), field_name
+
+    def get_value(self, key, args, kwargs):
+        value = args[key] if isinstance(key, int) else kwargs.get(key, '')
+        return '' if callable(value) else value
+
+
+_PLAIN_FIELD = re.compile(r'\w+')
+_formatter = _TemplateFormatter()
+
+
+def fill(text, data):
+    """Format ``text`` with ``data``, leaving unknown fields empty.
+
+    Text with a malformed or disallowed field is returned as written.
+    """
+    try:
+        return _formatter.vformat(text, (), data)
+    except (ValueError, IndexError, KeyError, TypeError):
+        return text
+
+
+def resolve(data, path):
+    """Look up a dotted ``path`` in ``data``; callables are called to get the value."""
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value() if callable(value) else value
+
+
+def formatter(spec):
+    """Compile a column/metric format into a value -> str function."""
+    def format_value(value):
+        if value is None:
+            return ''
+        if spec:
+            try:
+                if isinstance(value, (datetime, date)) and '%' in spec:
+                    return value.strftime(spec)
+                return _formatter.format(spec, value)
+            except (ValueError, TypeError):
+                pass
+        if isinstance(value, float):
+            return f'{value:.2f}'
+        if isinstance(value, (datetime, date)):
+            return value.isoformat(sep=' ', timespec='minutes') if isinstance(value, datetime) else value.isoformat()
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return str(value)
+    return format_value
+
+
+def fit(text, width, font, size):
+    """Cut ``text`` to fit ``width`` points (marking the cut with an ellipsis).
+
+    Returns the text and its drawn width.
+    """
+    full = stringWidth(text, font, size)
+    if full <= width:
+        return text, full
+    # Start from an estimate based on average glyph width, then trim
+    keep = max(int(len(text) * width / full), 1)
+    while True:
+        clipped = text[:keep] + '...'
+        clipped_width = stringWidth(clipped, font, size)
+        if clipped_width <= width or keep == 1:
+            return clipped, clipped_width
+        keep -= 1
+
+
+def clip(text, width, font, size):
+    return fit(text, width, font, size)[0]
+
+
+class Layout:
+    def __init__(self, page_size, orientation):
+        size = PAGE_SIZES.get(page_size, A4)
+        self.page_size = landscape(size) if orientation == 'landscape' else portrait(size)
+        self.width, self.height = self.page_size
+        self.left = MARGIN
+        self.right = self.width - MARGIN
+        self.top = self.height - MARGIN
+        self.bottom = MARGIN + FOOTER_HEIGHT
+        self.content_width = self.right - self.left
+
+
+class PageWriter:
+    """Canvas wrapper that tracks the vertical cursor and starts pages as needed."""
+
+    def __init__(self, output, layout, title):
+        self.layout = layout
+        self.title = title
+        self.canvas = canvas.Canvas(output, pagesize=layout.page_size, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.pages = 0
+        self.on_new_page = None
+        self._start_page()
+
+    def _start_page(self):
+        self.pages += 1
+        self.y = self.layout.top
+        c = self.canvas
+        c.setFont(FONT, 8)
+        c.setFillColor(colors.grey)
+        c.drawString(self.layout.left, MARGIN, self.title)
+        c.drawRightString(self.layout.right, MARGIN, f'Page {self.pages}')
+        c.setFillColor(colors.black)
+
+    def new_page(self):
+        self.canvas.showPage()
+        self._start_page()
+        if self.on_new_page:
+            self.on_new_page()
+
+    def room(self):
+        return self.y - self.layout.bottom
+
+    def reserve(self, height):
+        """Make sure ``height`` points fit below the cursor, breaking the page if not."""
+        if height > self.room() and self.y < self.layout.top:
+            self.new_page()
+
+    def save(self):
+        self.canvas.save()
+
+
+class HeadingSection:
+    def __init__(self, spec, layout):
+        self.text = spec.get('text', '')
+        self.size = HEADING_SIZES.get(spec.get('level', 1), 12)
+
+    def render(self, writer, data):
+        height = self.size * 1.8
+        writer.reserve(height)
+        writer.canvas.setFont(BOLD_FONT, self.size)
+        writer.canvas.drawString(writer.layout.left, writer.y - self.size, fill(self.text, data))
+        writer.y -= height
+
+
+class TextSection:
+    def __init__(self, spec, layout):
+        self.text = spec.get('text')
+        self.source = spec.get('source')
+        self.style = ParagraphStyle('body', fontName=FONT, fontSize=spec.get('size', 10),
+                                    leading=spec.get('size', 10) * 1.4, spaceAfter=4)
+        self.width = layout.content_width
+
+    def paragraphs(self, data):
+        """Paragraph markup; template, user and AI text is escaped before tags are added."""
+        if self.text:
+            yield escape(fill(self.text, data))
+        if self.source:
+            value = resolve(data, self.source)
+            if isinstance(value, dict):
+                for key, item in value.items():
+                    item = ', '.join(map(str, item)) if isinstance(item, list) else item
+                    yield f'<b>{escape(str(key))}</b>: {escape(str(item))}'
+            elif isinstance(value, list):
+                for item in value:
+                    yield f'• {escape(str(item))}'
+            elif value is not None:
+                yield escape(str(value))
+
+    def render(self, writer, data):
+        for text in self.paragraphs(data):
+            pending = [Paragraph(text.replace('\n', '<br/>'), self.style)]
+            while pending:
+                paragraph = pending.pop(0)
+                _, height = paragraph.wrap(self.width, writer.room())
+                if height > writer.room():
+                    # Draw what fits here and carry the rest over; split() is
+                    # empty or whole when not even one line fits
+                    parts = paragraph.split(self.width, writer.room())
+                    if len(parts) > 1:
+                        paragraph, pending[:0] = parts[0], parts[1:]
+                    else:
+                        writer.new_page()
+                    _, height = paragraph.wrap(self.width, writer.room())
+                paragraph.drawOn(writer.canvas, writer.layout.left, writer.y - height)
+                writer.y -= height + self.style.spaceAfter
+
+
+class SummarySection:
+    PER_ROW = 3
+    BOX_HEIGHT = 16 * mm
+
+    def __init__(self, spec, layout):
+        self.source = spec.get('source')
+        self.metrics = [(m.get('label', m['key']), m['key'], formatter(m.get('format')))
+                        for m in spec.get('metrics', [])]
+        self.box_width = (layout.content_width - (self.PER_ROW - 1) * 4 * mm) / self.PER_ROW
+
+    def items(self, data):
+        if self.metrics:
+            values = resolve(data, self.source) if self.source else data
+            values = values if isinstance(values, dict) else {}
+            return [(label, format_value(resolve(values, key))) for label, key, format_value in self.metrics]
+        values = resolve(data, self.source) if self.source else None
+        if isinstance(values, dict):
+            plain = formatter(None)
+            return [(str(key), plain(value)) for key, value in values.items()]
+        return []
+
+    def render(self, writer, data):
+        items = self.items(data)
+        c = writer.canvas
+        for start in range(0, len(items), self.PER_ROW):
+            writer.reserve(self.BOX_HEIGHT + 4 * mm)
+            for column, (label, value) in enumerate(items[start:start + self.PER_ROW]):
+                x = writer.layout.left + column * (self.box_width + 4 * mm)
+                y = writer.y - self.BOX_HEIGHT
+                c.setFillColor(STRIPE)
+                c.roundRect(x, y, self.box_width, self.BOX_HEIGHT, 2 * mm, stroke=0, fill=1)
+                c.setFillColor(colors.grey)
+                c.setFont(FONT, 8)
+                c.drawString(x + 3 * mm, y + self.BOX_HEIGHT - 5 * mm, clip(label, self.box_width - 6 * mm, FONT, 8))
+                c.setFillColor(colors.black)
+                c.setFont(BOLD_FONT, 14)
+                c.drawString(x + 3 * mm, y + 3.5 * mm, clip(value, self.box_width - 6 * mm, BOLD_FONT, 14))
+            writer.y -= self.BOX_HEIGHT + 4 * mm
+
+
+class TableSection:
+    def __init__(self, spec, layout):
+        self.source = spec.get('source', 'rows')
+        self.font_size = spec.get('font_size', 8)
+        self.row_height = self.font_size * 1.8
+        columns = spec.get('columns') or []
+        weights = [float(column.get('width', 1)) for column in columns]
+        total = sum(weights) or 1
+        self.left = layout.left
+        self.columns = []
+        x = layout.left
+        for column, weight in zip(columns, weights):
+            width = layout.content_width * weight / total
+            self.columns.append({
+                'key': column['key'],
+                'label': clip(column.get('label', column['key']), width - 6, BOLD_FONT, self.font_size),
+                'x': x,
+                'width': width,
+                'right': column.get('align') == 'right',
+                'format': formatter(column.get('format'))
+            })
+            x += width
+        self.width = layout.content_width
+
+    def _draw_header(self, writer):
+        c = writer.canvas
+        y = writer.y - self.row_height
+        c.setFillColor(HEADER_FILL)
+        c.rect(self.left, y, self.width, self.row_height, stroke=0, fill=1)
+        c.setFillColor(colors.white)
+        c.setFont(BOLD_FONT, self.font_size)
+        baseline = y + (self.row_height - self.font_size) / 2 + 1
+        for column in self.columns:
+            if column['right']:
+                c.drawRightString(column['x'] + column['width'] - 3, baseline, column['label'])
+            else:
+                c.drawString(column['x'] + 3, baseline, column['label'])
+        c.setFillColor(colors.black)
+        c.setFont(FONT, self.font_size)
+        writer.y = y
+
+    def render(self, writer, data):
+        rows = resolve(data, self.source) or []
+        c = writer.canvas
+        writer.reserve(self.row_height * 3)
+        self._draw_header(writer)
+        # Repeat the header on pages this table spills onto
+        writer.on_new_page = lambda: self._draw_header(writer)
+        # Cell text for a page goes into one text object, drawn over that
+        # page's stripes when the page is full
+        text = c.beginText()
+        text.setFont(FONT, self.font_size)
+        count = 0
+        try:
+            for row in rows:
+                if writer.room() < self.row_height:
+                    c.drawText(text)
+                    writer.new_page()
+                    text = c.beginText()
+                    text.setFont(FONT, self.font_size)
+                y = writer.y - self.row_height
+                if count % 2:
+                    c.setFillColor(STRIPE)
+                    c.rect(self.left, y, self.width, self.row_height, stroke=0, fill=1)
+                    c.setFillColor(colors.black)
+                baseline = y + (self.row_height - self.font_size) / 2 + 1
+                is_mapping = isinstance(row, dict)
+                for index, column in enumerate(self.columns):
+                    value = row.get(column['key']) if is_mapping else row[index]
+                    cell, width = fit(column['format'](value), column['width'] - 6, FONT, self.font_size)
+                    x = column['x'] + column['width'] - 3 - width if column['right'] else column['x'] + 3
+                    text.setTextOrigin(x, baseline)
+                    text.textOut(cell)
+                writer.y = y
+                count += 1
+            c.drawText(text)
+        finally:
+            writer.on_new_page = None
+        writer.y -= 4 * mm
+        writer.rows += count
+
+
+class ChartSection:
+    def __init__(self, spec, layout):
+        self.kind = spec.get('chart', 'bar')
+        self.source = spec.get('source')
+        self.x = spec.get('x', 'label')
+        self.y = spec.get('y', 'value')
+        self.title = spec.get('title')
+        self.width = layout.content_width
+        self.height = spec.get('height', 70) * mm
+
+    def points(self, data):
+        value = resolve(data, self.source)
+        if isinstance(value, dict):
+            points = list(value.items())
+        else:
+            points = [(item.get(self.x), item.get(self.y)) for item in value or [] if isinstance(item, dict)]
+        return [(str(label), float(v or 0)) for label, v in points[:MAX_CHART_POINTS]]
+
+    def drawing(self, points):
+        labels = [label for label, _ in points]
+        values = [v for _, v in points]
+        drawing = Drawing(self.width, self.height)
+        if self.kind == 'pie':
+            chart = Pie()
+            chart.width = chart.height = self.height - 10 * mm
+            chart.x = (self.width - chart.width) / 2
+            chart.y = 5 * mm
+            chart.data = values
+            chart.labels = labels
+            for index in range(len(values)):
+                chart.slices[index].fillColor = CHART_COLORS[index % len(CHART_COLORS)]
+        else:
+            chart = HorizontalLineChart() if self.kind == 'line' else VerticalBarChart()
+            chart.x, chart.y = 30, 20
+            chart.width, chart.height = self.width - 40, self.height - 30
+            chart.data = [values]
+            chart.categoryAxis.categoryNames = labels
+            chart.categoryAxis.labels.fontSize = 6
+            chart.categoryAxis.labels.angle = 30 if len(labels) > 8 else 0
+            chart.categoryAxis.labels.boxAnchor = 'ne' if len(labels) > 8 else 'n'
+            chart.valueAxis.valueMin = min(0, min(values))
+            chart.valueAxis.labels.fontSize = 7
+            if self.kind == 'line':
+                chart.lines[0].strokeColor = CHART_COLORS[0]
+            else:
+                chart.bars[0].fillColor = CHART_COLORS[0]
+        drawing.add(chart)
+        return drawing
+
+    def render(self, writer, data):
+        points = self.points(data)
+        if not points:
+            return
+        title_height = 14 if self.title else 0
+        writer.reserve(self.height + title_height)
+        if self.title:
+            writer.canvas.setFont(BOLD_FONT, 10)
+            writer.canvas.drawString(writer.layout.left, writer.y - 10, fill(self.title, data))
+            writer.y -= title_height
+        renderPDF.draw(self.drawing(points), writer.canvas, writer.layout.left, writer.y - self.height)
+        writer.y -= self.height + 4 * mm
+
+
+class PageBreakSection:
+    def __init__(self, spec, layout):
+        pass
+
+    def render(self, writer, data):
+        if writer.y < writer.layout.top:
+            writer.new_page()
+
+
+SECTION_TYPES = {
+    'heading': HeadingSection,
+    'text': TextSection,
+    'summary': SummarySection,
+    'table': TableSection,
+    'chart': ChartSection,
+    'page_break': PageBreakSection,
+}
+
+
+def default_sections(schema):
+    """Sections for schemas that only list ``fields`` (as the template editor does)."""
+    fields = [field for field in schema.get('fields', []) if isinstance(field, dict)]
+    columns = [{'key': field.get('key') or field.get('name') or field.get('label'),
+                'label': field.get('label') or field.get('name') or field.get('key')}
+               for field in fields]
+    columns = [column for column in columns if column['key']]
+    sections = [
+        {'type': 'heading', 'text': schema.get('title', '{title}')},
+        {'type': 'summary', 'source': 'summary'},
+        {'type': 'text', 'source': 'ai_suggestions'},
+    ]
+    if columns:
+        sections.append({'type': 'table', 'source': 'rows', 'columns': columns})
+    return sections
+
+
+class CompiledTemplate:
+    def __init__(self, schema):
+        schema = schema or {}
+        self.title = schema.get('title', 'Report')
+        self.layout = Layout(schema.get('page_size', 'A4'), schema.get('orientation', 'portrait'))
+        self.sections = []
+        for spec in schema.get('sections') or default_sections(schema):
+            section_type = SECTION_TYPES.get(spec.get('type'))
+            if section_type is None:
+                raise ValueError(f"Unknown report section type: {spec.get('type')}")
+            self.sections.append(section_type(spec, self.layout))
+
+    def render(self, output, data):
+        """Draw the report for ``data`` into ``output`` (a path or binary file object)."""
+        started = time.perf_counter()
+        writer = PageWriter(output, self.layout, fill(self.title, data))
+        writer.rows = 0
+        for section in self.sections:
+            section.render(writer, data)
+        writer.save()
+        return {'pages': writer.pages, 'rows': writer.rows,
+                'seconds': round(time.perf_counter() - started, 3)}
+
+
+def schema_key(schema):
+    return hashlib.sha256(json.dumps(schema or {}, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class TemplateCache:
+    """LRU of compiled templates keyed by schema content, so edits recompile."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, schema):
+        key = schema_key(schema)
+        with self.lock:
+            compiled = self.entries.get(key)
+            if compiled is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        compiled = CompiledTemplate(schema)
+        with self.lock:
+            self.entries[key] = compiled
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return compiled
+
+
+template_cache = TemplateCache()
+
+
+def compile_template(schema):
+    return template_cache.get(schema)
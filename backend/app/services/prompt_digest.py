@@ -0,0 +1,267 @@
+"""Compact statistical digests of tabular data for AI prompts.
+
+Sending raw records to the model stops working once a form has a few
+thousand responses.  ``build_digest`` profiles a DataFrame column by
+column (distribution summaries for numbers, top-k values for answers,
+IQR outliers, per-group breakdowns) and renders it at the most detailed
+level that fits a token budget, so the prompt stays bounded however many
+rows there are.  ``compact_payload`` applies this to whatever dict a
+caller was about to serialise into a prompt.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv('AI_PROMPT_TOKEN_BUDGET', 3000))
+# Lists of records shorter than this are cheap enough to send as they are
+MIN_RECORDS_TO_DIGEST = 20
+MAX_STRING_CHARS = 2000
+
+# Detail levels tried in order until the rendered digest fits the budget
+LEVELS = [
+    {'top_k': 10, 'groups': 20, 'outliers': 5},
+    {'top_k': 5, 'groups': 10, 'outliers': 3},
+    {'top_k': 3, 'groups': 5, 'outliers': 0},
+    {'top_k': 1, 'groups': 0, 'outliers': 0},
+]
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English and JSON
+    return len(text) // 4 + 1
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def _round(value):
+    if value is None or (isinstance(value, float) and not np.isfinite(value)):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else float(f'{value:.4g}')
+
+
+def _hashable(value):
+    if isinstance(value, (dict, list)):
+        return _dumps(value)
+    return value
+
+
+def _numeric_profile(values, max_outliers):
+    array = values.to_numpy(dtype=float)
+    q1, median, q3 = np.percentile(array, [25, 50, 75])
+    iqr = q3 - q1
+    low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    outliers = array[(array < low) | (array > high)]
+    # Most extreme first, measured by distance from the median
+    extreme = outliers[np.argsort(-np.abs(outliers - median))][:max_outliers]
+    return {
+        'type': 'number',
+        'mean': _round(array.mean()),
+        'std': _round(array.std(ddof=1)) if len(array) > 1 else 0,
+        'min': _round(array.min()),
+        'p25': _round(q1),
+        'p50': _round(median),
+        'p75': _round(q3),
+        'max': _round(array.max()),
+        'outliers': {'count': int(len(outliers)), 'values': [_round(v) for v in extreme]}
+    }
+
+
+def _categorical_profile(values, top_k):
+    # Multi-select answers arrive as lists; count each choice separately
+    if values.map(lambda v: isinstance(v, list)).any():
+        values = values.explode().dropna()
+    values = values.map(_hashable).astype(str)
+    counts = values.value_counts()
+    top = counts.head(top_k)
+    return {
+        'type': 'category',
+        'distinct': int(len(counts)),
+        'top': [[value[:100], int(count)] for value, count in top.items()]
+    }
+
+
+def _datetime_profile(values):
+    return {'type': 'datetime', 'min': values.min().isoformat(), 'max': values.max().isoformat()}
+
+
+def profile_column(series, top_k=LEVELS[0]['top_k'], max_outliers=LEVELS[0]['outliers']):
+    present = series.dropna()
+    profile = {'count': int(len(present)), 'missing': int(len(series) - len(present))}
+    if present.empty:
+        return profile
+    if pd.api.types.is_datetime64_any_dtype(present):
+        profile.update(_datetime_profile(present))
+        return profile
+    numbers = pd.to_numeric(present, errors='coerce') if present.dtype == object else present
+    if pd.api.types.is_numeric_dtype(numbers) and not pd.api.types.is_bool_dtype(numbers) \
+            and numbers.notna().mean() >= 0.9:
+        profile.update(_numeric_profile(numbers.dropna(), max_outliers))
+    else:
+        profile.update(_categorical_profile(present, top_k))
+    return profile
+
+
+def group_breakdown(frame, by, max_groups=LEVELS[0]['groups']):
+    """Row counts and numeric means for the largest ``max_groups`` groups of ``by``."""
+    numeric = [name for name in frame.columns
+               if name != by and pd.api.types.is_numeric_dtype(frame[name])
+               and not pd.api.types.is_bool_dtype(frame[name])]
+    grouped = frame.groupby(frame[by].map(_hashable), dropna=True)
+    sizes = grouped.size().sort_values(ascending=False)
+    means = grouped[numeric].mean() if numeric else None
+    rows = []
+    for key, size in sizes.head(max_groups).items():
+        row = {'group': key, 'rows': int(size)}
+        if means is not None:
+            row['mean'] = {name: _round(means.at[key, name]) for name in numeric}
+        rows.append(row)
+    return {'by': by, 'groups': int(len(sizes)), 'top': rows}
+
+
+def profile_frame(frame, group_by=None):
+    """Profile every column at the most detailed level."""
+    profile = {
+        'rows': int(len(frame)),
+        'fields': {str(name): profile_column(frame[name]) for name in frame.columns}
+    }
+    if group_by and group_by in frame:
+        profile['breakdown'] = group_breakdown(frame, group_by)
+    return profile
+
+
+def render(profile, level, omit=()):
+    """Cut a full profile down to ``level``'s top-k, group and outlier limits."""
+    fields = {}
+    for name, field in profile['fields'].items():
+        if name in omit:
+            continue
+        field = dict(field)
+        if 'top' in field:
+            field['top'] = field['top'][:level['top_k']]
+        if 'outliers' in field:
+            outliers = field['outliers']
+            if level['outliers']:
+                field['outliers'] = {'count': outliers['count'], 'values': outliers['values'][:level['outliers']]}
+            else:
+                field['outliers'] = outliers['count']
+        fields[name] = field
+    digest = {'rows': profile['rows'], 'fields': fields}
+    if 'breakdown' in profile and level['groups']:
+        breakdown = profile['breakdown']
+        digest['breakdown'] = {**breakdown, 'top': breakdown['top'][:level['groups']]}
+    if omit:
+        digest['omitted_fields'] = sorted(omit)
+    return digest
+
+
+def build_digest(frame, budget=DEFAULT_TOKEN_BUDGET, group_by=None):
+    """Profile ``frame`` and render it as detailed as ``budget`` tokens allow.
+
+    If even the coarsest level is too big, the sparsest fields are left out
+    (and listed under ``omitted_fields``) until it fits.
+    """
+    profile = profile_frame(frame, group_by)
+    for level in LEVELS:
+        digest = render(profile, level)
+        if estimate_tokens(_dumps(digest)) <= budget:
+            return digest
+
+    by_coverage = sorted(profile['fields'], key=lambda name: profile['fields'][name]['count'])
+    omit = set()
+    for name in by_coverage:
+        omit.add(name)
+        digest = render(profile, LEVELS[-1], omit)
+        if estimate_tokens(_dumps(digest)) <= budget:
+            break
+    return digest
+
+
+def submissions_frame(rows):
+    """DataFrame of submission rows with one column per response field.
+
+    ``rows`` are ``(responses, score, submitted_at, ...)`` tuples or
+    mappings with those keys; response fields are prefixed ``q.``.
+    """
+    records = [row if isinstance(row, dict) else row._asdict() for row in rows]
+    base = pd.DataFrame.from_records(records)
+    if base.empty:
+        return base
+    answers = pd.json_normalize([r if isinstance(r, dict) else {} for r in base.pop('responses')], max_level=0)
+    answers.columns = [f'q.{name}' for name in answers.columns]
+    return pd.concat([base, answers], axis=1)
+
+
+def submissions_digest(rows, budget=DEFAULT_TOKEN_BUDGET, group_by=None):
+    return build_digest(submissions_frame(rows), budget, group_by)
+
+
+def _is_records(value):
+    return isinstance(value, list) and len(value) >= MIN_RECORDS_TO_DIGEST \
+        and all(isinstance(item, dict) for item in value)
+
+
+def _truncate_text(text, budget):
+    """``{'truncated': text}`` cut down until it fits ``budget`` tokens."""
+    text = text[:budget * 4]
+    while text:
+        # Escaping makes the serialised text longer than the raw text
+        tokens = estimate_tokens(_dumps({'truncated': text}))
+        if tokens <= budget:
+            break
+        text = text[:min(len(text) - 1, len(text) * budget // tokens)]
+    return {'truncated': text}
+
+
+def _truncate_keys(data, budget):
+    """The leading keys of ``data`` that fit ``budget`` tokens, plus a count of the rest."""
+    kept = {}
+    used = estimate_tokens(_dumps({'omitted_keys': len(data)}))
+    for key, value in data.items():
+        cost = estimate_tokens(_dumps({key: value}))
+        if used + cost > budget:
+            break
+        kept[key] = value
+        used += cost
+    if len(kept) < len(data):
+        kept['omitted_keys'] = len(data) - len(kept)
+    return kept
+
+
+def compact_payload(data, budget=DEFAULT_TOKEN_BUDGET):
+    """Return ``data`` itself if it fits ``budget`` tokens, otherwise a reduced copy.
+
+    Long lists of records are replaced by their digests (sharing the
+    budget), other long lists by their size and first items, and long
+    strings are truncated.  If that is still too big, only the leading
+    keys that fit are kept and the rest are counted in ``omitted_keys``.
+    """
+    if estimate_tokens(_dumps(data)) <= budget:
+        return data
+    if _is_records(data):
+        return {'digest': build_digest(pd.DataFrame.from_records(data), budget)}
+    if not isinstance(data, dict):
+        return _truncate_text(_dumps(data), budget)
+
+    record_keys = [key for key, value in data.items() if _is_records(value)]
+    share = max(budget // (len(record_keys) + 1), 100)
+    compacted = {}
+    for key, value in data.items():
+        if key in record_keys:
+            compacted[key] = {'digest': build_digest(pd.DataFrame.from_records(value), share)}
+        elif isinstance(value, list) and len(value) > MIN_RECORDS_TO_DIGEST:
+            compacted[key] = {'items': len(value), 'first': value[:MIN_RECORDS_TO_DIGEST]}
+        elif isinstance(value, str) and len(value) > MAX_STRING_CHARS:
+            compacted[key] = value[:MAX_STRING_CHARS] + '...'
+        elif isinstance(value, dict) and estimate_tokens(_dumps(value)) > share:
+            compacted[key] = compact_payload(value, share)
+        else:
+            compacted[key] = value
+    # Many small keys can add up to far more than the budget
+    if estimate_tokens(_dumps(compacted)) <= budget:
+        return compacted
+    return _truncate_keys(compacted, budget)
@@ -1,63 +1,138 @@
-from ..models import Report#, ReportTemplate
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from reportlab.pdfgen import canvas
+from ..models import ReportTemplate, Submission, db
+from ..replica import read_with_fallback
+from ..filters import apply_filters
+from .response_sync import ResponseSync, SheetsBatchWriter
 import json
 import os
+import uuid
 
 class ReportService:
-    def __init__(self):
+    def __init__(self, services=None):
         self.credentials = None
+        # Built API clients keyed by (name, version); pre-filled to use fakes
+        self.services = dict(services or {})
         self.initialize_google_credentials()
 
     def initialize_google_credentials(self):
         # Initialize Google credentials from environment variables
         token_info = os.getenv("GOOGLE_TOKEN_INFO")
         if token_info:
+            from google.oauth2.credentials import Credentials
             self.credentials = Credentials.from_authorized_user_info(json.loads(token_info))
 
+    def get_service(self, name, version):
+        if (name, version) not in self.services:
+            if not self.credentials:
+                raise ValueError("Google credentials not initialized")
+            # googleapiclient is slow to import and only needed once a client is built
+            from googleapiclient.discovery import build
+            self.services[name, version] = build(name, version, credentials=self.credentials)
+        return self.services[name, version]
+
+    def sync_form_responses(self, form, progress=None):
+        return ResponseSync(self.get_service('forms', 'v1')).sync_form(form, progress)
+
     def get_templates(self):
-        # templates = ReportTemplate.query.filter_by(is_active=True).all()
-        # return [{'id': t.id, 'name': t.name, 'description': t.description} for t in templates]
-        return []
+        templates = ReportTemplate.query.filter_by(is_active=True).all()
+        return [t.to_dict() for t in templates]
 
     def generate_report(self, template_id, data):
-        # template = ReportTemplate.query.get(template_id)
-        # if not template:
-        #     raise ValueError("Template not found")
+        template = None
+        if template_id is not None:
+            template = ReportTemplate.query.get(template_id)
+            if not template:
+                raise ValueError("Template not found")
 
-        # # Generate PDF report
-        output_path = f"reports/report_{template_id}_{data.get('id')}.pdf"
-        # self.generate_pdf(template, data, output_path)
+        # Generate PDF report
+        output_path = f"reports/report_{template_id}_{data.get('report_id') or data.get('id')}.pdf"
+        self.generate_pdf(template, data, output_path)
 
-        # # If template is linked to Google Sheets, update the sheet
-        # if data.get('update_sheet'):
-        #     self.update_google_sheet(data)
+        # If template is linked to Google Sheets, update the sheet
+        if data.get('update_sheet'):
+            self.update_google_sheet(data)
 
         return output_path
 
     def generate_pdf(self, template, data, output_path):
-        c = canvas.Canvas(output_path)
-        # Add PDF generation logic here based on template and data
-        c.drawString(100, 750, f"Report: {template.name}")
-        c.save()
+        """Render ``data`` with the template's compiled layout; returns page and row counts.
+
+        With a ``form_id`` the form's submissions are available to table
+        sections as ``rows`` (streamed from the database) and their score
+        statistics as ``summary``, both narrowed by ``data_filters`` (see
+        ``app/filters.py``).
+        """
+        from .pdf_engine import compile_template
+
+        sources = {'title': template.name if template else 'Report', **data}
+        form_id = data.get('form_id')
+        filters = data.get('data_filters')
+        if form_id:
+            sources.setdefault('rows', lambda: self.submission_rows(form_id, filters=filters))
+            sources.setdefault('summary', lambda: self.submission_summary(form_id, filters))
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A unique partial name, so concurrent renders to the same path never share one
+        partial = f'{output_path}.tmp-{uuid.uuid4().hex}'
+        try:
+            # Submission rows and summaries are full scans; read them from the
+            # replica once it has every submission the primary has
+            compiled = compile_template(template.schema if template else None)
+            stats = read_with_fallback(lambda: compiled.render(partial, sources), Submission.id)
+            os.replace(partial, output_path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return stats
+
+    def submission_rows(self, form_id, chunk_size=1000, filters=None):
+        query = (db.session.query(Submission.id, Submission.respondent_name, Submission.respondent_email,
+                                  Submission.score, Submission.submitted_at, Submission.responses)
+                 .filter(Submission.form_id == form_id))
+        query = (apply_filters(query, filters)
+                 .order_by(Submission.submitted_at, Submission.id)
+                 .execution_options(yield_per=chunk_size))
+        for row in query:
+            record = dict(row.responses or {})
+            record.update(id=row.id, respondent_name=row.respondent_name, respondent_email=row.respondent_email,
+                          score=row.score, submitted_at=row.submitted_at)
+            yield record
+
+    def submission_summary(self, form_id, filters=None):
+        query = db.session.query(
+            db.func.count(Submission.id), db.func.avg(Submission.score),
+            db.func.min(Submission.score), db.func.max(Submission.score)
+        ).filter(Submission.form_id == form_id)
+        count, average, lowest, highest = apply_filters(query, filters).one()
+        return {'responses': count, 'average_score': average, 'min_score': lowest, 'max_score': highest}
 
     def update_google_sheet(self, data):
-        if not self.credentials:
-            raise ValueError("Google credentials not initialized")
-
-        service = build('sheets', 'v4', credentials=self.credentials)
-        spreadsheet_id = data.get('spreadsheet_id')
-        range_name = data.get('range_name', 'Sheet1!A1')
-        
-        values = [[data.get('value1'), data.get('value2')]]
-        body = {'values': values}
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id,
-            range=range_name,
-            valueInputOption='RAW',
-            body=body
-        ).execute()
-
-report_service = ReportService()
+        """Write report values to a sheet in batched ``values.batchUpdate`` calls.
+
+        ``data['updates']`` is a list of ``{'range': ..., 'values': [[...]]}``;
+        without it the single ``value1``/``value2`` row at ``range_name`` is
+        written as before.  Returns the number of API calls made.
+        """
+        service = self.get_service('sheets', 'v4')
+        writer = SheetsBatchWriter(service, data.get('spreadsheet_id'))
+
+        updates = data.get('updates')
+        if updates is None:
+            updates = [{
+                'range': data.get('range_name', 'Sheet1!A1'),
+                'values': [[data.get('value1'), data.get('value2')]]
+            }]
+        for update in updates:
+            writer.add(update['range'], update['values'])
+        writer.flush()
+        return writer.calls
+
+report_service = None
+
+def get_report_service():
+    # Built on first use, so importing the routes does not load Google credentials
+    global report_service
+    if report_service is None:
+        report_service = ReportService()
+    return report_service
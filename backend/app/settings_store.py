@@ -0,0 +1,171 @@
+"""Settings rows behind a process-local cache keyed by a version counter.
+
+Every write bumps the single ``settings_version`` row and stamps the rows
+it changes with the new version.  A process keeps a dict of decoded
+values and the version it reflects; the first settings read of each
+request compares that with the stored counter (one primary-key lookup)
+and, only when it moved, loads the rows stamped after it.  Everything
+else is a dictionary lookup, and a write in one worker reaches the
+others on their next request without re-reading the table.
+
+Values are stored as JSON text, so booleans and numbers survive the
+round trip; rows written by hand as plain text come back as strings.
+
+Only the keys in ``DEFAULT_SETTINGS`` can be written: they are the fields
+the settings pages (settings.html and the React Settings page) post, so a
+new field on either page needs its key added here.  ``SECRET_SETTINGS``
+are write-only over the API: ``get_many`` leaves them out unless asked.
+"""
+import json
+import threading
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import g, has_request_context
+from sqlalchemy.dialects import postgresql, sqlite
+
+MAX_KEY_LENGTH = 100
+MAX_VALUE_LENGTH = 1000
+COUNTER_ID = 1
+
+# Served for keys nobody has saved yet; also the only keys that may be written
+DEFAULT_SETTINGS = {
+    'companyName': 'StratoSys Report',
+    'timezone': 'UTC+8',
+    'emailNotifications': True,
+    'language': 'English',
+    'dateFormat': 'DD/MM/YYYY',
+    'formSubmissionNotifications': True,
+    'reportNotifications': True,
+    'enableNotifications': True,
+    'openaiApiKey': None,
+    'googleApiKey': None,
+    'smtpServer': None,
+    'smtpPort': None,
+    'emailUsername': None,
+    'emailPassword': None,
+    'enableAutoReports': True,
+    'enableAutoEmails': True,
+    'reportSchedule': None
+}
+
+# Credentials: stored like any other setting but never echoed back to clients
+SECRET_SETTINGS = frozenset({'openaiApiKey', 'googleApiKey', 'emailPassword'})
+
+
+def _decode(value):
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class SettingsStore:
+    """Cached settings; with ``defaults``, only their keys can be written."""
+
+    def __init__(self, db, model, version_model, defaults=None, secrets=()):
+        self.db = db
+        self.model = model
+        self.version_model = version_model
+        self.defaults = dict(defaults or {})
+        self.secrets = frozenset(secrets)
+        self.values = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def _stored_version(self):
+        counter = self.version_model.__table__
+        return self.db.session.execute(
+            sa.select(counter.c.version).where(counter.c.id == COUNTER_ID)).scalar() or 0
+
+    def refresh(self, force=False):
+        """Bring the cache up to the stored version; at most once per request unless ``force``."""
+        checked = f'settings_checked_{id(self)}'
+        if not force and has_request_context() and g.get(checked):
+            return
+        version = self._stored_version()
+        with self.lock:
+            if version != self.version:
+                table = self.model.__table__
+                query = sa.select(table.c.key, table.c.value)
+                if self.version is not None and version > self.version:
+                    query = query.where(table.c.version > self.version)
+                    values = dict(self.values)
+                else:
+                    # First load, or the counter went backwards (restored database)
+                    values = {}
+                for key, value in self.db.session.execute(query):
+                    values[key] = _decode(value)
+                self.values, self.version = values, version
+        if has_request_context():
+            setattr(g, checked, True)
+
+    def get(self, key, default=None):
+        self.refresh()
+        return self.values.get(key, self.defaults.get(key, default))
+
+    def get_many(self, keys=None, include_secrets=False):
+        """Values for ``keys`` (every setting when ``None``), with the defaults filled in.
+
+        Secret keys are left out unless ``include_secrets`` is set.
+        """
+        self.refresh()
+        values = {**self.defaults, **self.values}
+        if keys is None:
+            keys = values
+        return {key: values.get(key) for key in keys
+                if include_secrets or key not in self.secrets}
+
+    def set_many(self, values, user_id=None):
+        """Write ``values`` (a dict) as one new version and commit; returns the version."""
+        if not isinstance(values, dict) or not values:
+            raise ValueError('Settings must be a non-empty object')
+        for key, value in values.items():
+            if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+                raise ValueError(f'Invalid setting key: {key!r}')
+            if self.defaults and key not in self.defaults:
+                raise ValueError(f'Unknown setting: {key}')
+            if value is not None and not isinstance(value, (str, int, float, bool)):
+                raise ValueError(f'{key} must be a string, number, boolean or null')
+            if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+                raise ValueError(f'{key} is longer than {MAX_VALUE_LENGTH} characters')
+
+        session = self.db.session
+        counter = self.version_model.__table__
+        # The counter row lock also serialises concurrent writers, so versions commit in order
+        bumped = session.execute(counter.update().where(counter.c.id == COUNTER_ID)
+                                 .values(version=counter.c.version + 1))
+        if bumped.rowcount == 0:
+            session.execute(counter.insert().values(id=COUNTER_ID, version=1))
+        version = self._stored_version()
+
+        now = datetime.utcnow()
+        rows = [{'key': key, 'value': json.dumps(value), 'version': version,
+                 'updated_at': now, 'updated_by': user_id} for key, value in values.items()]
+        self._upsert(rows)
+        session.commit()
+        self.refresh(force=True)
+        return version
+
+    def _upsert(self, rows):
+        session = self.db.session
+        table = self.model.__table__
+        dialect = session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(index_elements=['key'], set_={
+                name: stmt.excluded[name] for name in ('value', 'version', 'updated_at', 'updated_by')
+            })
+            session.execute(stmt, rows)
+            return
+        existing = set(session.execute(sa.select(table.c.key)
+                                       .where(table.c.key.in_([row['key'] for row in rows]))).scalars())
+        updates = [row for row in rows if row['key'] in existing]
+        inserts = [row for row in rows if row['key'] not in existing]
+        for row in updates:
+            session.execute(table.update().where(table.c.key == row['key']).values(**row))
+        if inserts:
+            session.execute(table.insert(), inserts)
@@ -1,28 +1,68 @@
-from celery import shared_task
-from .services.report_service import report_service
-from .services.ai_service import get_ai_service
-from .models import Report, db
+import json
+import os
+from .services.report_service import get_report_service
+from .services.ai_runner import get_ai_runner
+from .models import Form, Report, ReportTemplate, Submission, db
+from .pipeline import CANCELLED, SUCCEEDED, job
+from .replica import read_with_fallback
+from .answers import rebuild_answers
+from .filters import apply_filters
 
-@shared_task
-def generate_report_task(user_id, data):
+# Submission columns shared with batch render workers, with their snapshot types
+BATCH_COLUMNS = {
+    'id': 'int',
+    'form_id': 'int',
+    'respondent_name': 'string',
+    'respondent_email': 'string',
+    'score': 'float',
+    'submitted_at': 'datetime',
+    'responses': 'string',
+}
+
+def finish_generate_report(status, user_id, data):
+    """Give the report row its final status, also when no attempt started."""
+    db.session.rollback()
+    report = db.session.get(Report, data.get('report_id')) if data.get('report_id') else None
+    if report is not None and status != SUCCEEDED:
+        report.status = 'cancelled' if status == CANCELLED else 'failed'
+        db.session.commit()
+
+@job('generate_report', retries=2, on_finished=finish_generate_report)
+def generate_report_task(ctx, user_id, data):
+    report = Report.query.get(data.get('report_id'))
     try:
+        if report:
+            report.status = 'processing'
+            db.session.commit()
+
         # Get AI suggestions for the report
-        suggestions = get_ai_service().generate_report_suggestions(data)
+        ctx.progress(0.1, message='Requesting AI suggestions')
+        # Goes through the shared runner so concurrent reports batch their prompts.
+        # The model sees a bounded digest of the form's responses, never the rows.
+        if report and report.data_filters:
+            data = {**data, 'data_filters': report.data_filters}
+        prompt_data = dict(data)
+        if data.get('form_id'):
+            from .services.prompt_digest import submissions_digest
+            rows = db.session.query(Submission.responses, Submission.score, Submission.submitted_at) \
+                .filter(Submission.form_id == data['form_id'])
+            prompt_data['submissions'] = submissions_digest(apply_filters(rows, data.get('data_filters')))
+        suggestions = get_ai_runner().run('suggestions', prompt_data)
         
         # Merge suggestions with user data
         enriched_data = {**data, 'ai_suggestions': suggestions}
         
         # Generate the report
-        output_path = report_service.generate_report(
+        ctx.progress(0.5, message='Rendering report')
+        output_path = get_report_service().generate_report(
             template_id=data.get('template_id'),
             data=enriched_data
         )
         
         # Update report status in database
-        report = Report.query.get(data.get('report_id'))
         if report:
             report.status = 'completed'
-            report.output_url = output_path
+            report.file_path = output_path
             db.session.commit()
         
         return {
@@ -31,14 +71,127 @@ def generate_report_task(user_id, data):
             'suggestions': suggestions
         }
         
-    except Exception as e:
-        # Update report status to failed
-        report = Report.query.get(data.get('report_id'))
-        if report:
-            report.status = 'failed'
+    except BaseException:
+        # finish_generate_report or the next attempt sets the status
+        db.session.rollback()
+        raise
+
+@job('sync_form_responses', retries=2)
+def sync_form_responses_task(ctx, form_id, summary_range=None):
+    """Pull new Google Forms responses and optionally write a summary to the linked sheet."""
+    form = Form.query.get(form_id)
+    if form is None or not form.google_form_id:
+        raise ValueError(f'Form {form_id} is not linked to a Google Form')
+
+    stats = get_report_service().sync_form_responses(
+        form, progress=lambda s: ctx.progress(0, message=f"Synced {s['fetched']} responses")
+    )
+
+    if summary_range and form.google_sheet_id:
+        count, average = db.session.query(
+            db.func.count(Submission.id), db.func.avg(Submission.score)
+        ).filter(Submission.form_id == form.id).one()
+        get_report_service().update_google_sheet({
+            'spreadsheet_id': form.google_sheet_id,
+            'updates': [{
+                'range': summary_range,
+                'values': [
+                    ['Responses', count],
+                    ['Average score', round(average, 2) if average is not None else None],
+                    ['Last synced', stats['watermark']]
+                ]
+            }]
+        })
+    return stats
+
+@job('sync_all_forms')
+def sync_all_forms_task(ctx):
+    forms = Form.query.filter(Form.is_active.is_(True), Form.google_form_id.isnot(None)).all()
+    results = {}
+    for done, form in enumerate(forms):
+        ctx.progress(done, len(forms), message=f'Syncing form {form.id}')
+        try:
+            results[form.id] = get_report_service().sync_form_responses(form)
+        except Exception as e:
+            db.session.rollback()
+            results[form.id] = {'error': str(e)}
+    return results
+
+@job('rebuild_form_answers')
+def rebuild_form_answers_task(ctx, form_id):
+    """Recreate a form's columnar answers table from its submissions."""
+    form = Form.query.get(form_id)
+    if form is None:
+        raise ValueError(f'Form {form_id} not found')
+    rows = rebuild_answers(form)
+    db.session.commit()
+    return {'form_id': form_id, 'rows': rows}
+
+@job('batch_reports')
+def batch_reports_task(ctx, user_id, template_id, form_ids=None, workers=None):
+    """Render one report per form on a process pool sharing a memory-mapped snapshot."""
+    from .batch_reports import Snapshot, remove_snapshot, render_batch, temporary_snapshot_dir
+
+    template = ReportTemplate.query.get(template_id)
+    if template is None:
+        raise ValueError('Template not found')
+    forms = Form.query.filter(Form.id.in_(form_ids)) if form_ids else Form.query.filter(Form.is_active.is_(True))
+    forms = {form.id: form for form in forms}
+    if not forms:
+        raise ValueError('No forms to report on')
+
+    ctx.progress(0, message='Snapshotting submissions')
+    query = (db.session.query(*(getattr(Submission, name) for name in BATCH_COLUMNS))
+             .filter(Submission.form_id.in_(list(forms)))
+             .execution_options(yield_per=5000))
+
+    def read_columns():
+        columns = {name: [] for name in BATCH_COLUMNS}
+        for row in query:
+            for name, value in zip(BATCH_COLUMNS, row):
+                columns[name].append(json.dumps(value) if name == 'responses' and value is not None else value)
+        return columns
+
+    # From the replica only once it has every submission the primary has
+    columns = read_with_fallback(read_columns, Submission.id)
+    snapshot_dir = temporary_snapshot_dir()
+    try:
+        snapshot = Snapshot.write(snapshot_dir, columns, BATCH_COLUMNS, partition_by='form_id')
+
+        reports = {}
+        for form_id in snapshot.partitions:
+            reports[form_id] = Report(title=f'{template.name}: {forms[form_id].title}', report_type='batch',
+                                      format='pdf', status='processing', user_id=user_id)
+            db.session.add(reports[form_id])
+        db.session.commit()
+
+        def on_done(result, done, total):
+            report = reports[result['key']]
+            report.status = 'completed'
+            report.file_path = result['path']
             db.session.commit()
-            
-        return {
-            'status': 'error',
-            'error': str(e)
-        }
+            ctx.progress(done, total, message=f'Rendered {done} of {total} reports')
+
+        try:
+            results = render_batch(
+                snapshot, template.schema, os.path.join('reports', f'batch_{ctx.job_id}'), workers=workers,
+                extra={'by_key': {form_id: {'title': form.title} for form_id, form in forms.items()}},
+                expand='responses', on_done=on_done, is_cancelled=ctx.is_cancelled
+            )
+        finally:
+            for report in reports.values():
+                if report.status == 'processing':
+                    report.status = 'failed'
+            db.session.commit()
+    finally:
+        remove_snapshot(snapshot_dir)
+    ctx.check_cancelled()
+
+    return {
+        'reports': [{'report_id': reports[r['key']].id, 'form_id': r['key'], 'pages': r['pages'],
+                     'rows': r['rows'], 'seconds': r['seconds']} for r in results],
+        'rows': snapshot.rows,
+        # No partition, so no Report: say so rather than leave them out silently
+        'skipped': [{'form_id': form_id, 'reason': 'no submissions'}
+                    for form_id in sorted(set(forms) - set(snapshot.partitions))]
+    }
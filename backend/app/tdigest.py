@@ -0,0 +1,112 @@
+"""A small merging t-digest for streaming quantiles.
+
+The digest keeps a sorted list of ``(mean, weight)`` centroids whose size
+is bounded by ``compression``: centroids near the median may absorb many
+values, those near the tails only a few, so extreme quantiles stay
+accurate.  It serialises to a plain list, which is how ``FormStats``
+stores it in a JSON column.
+
+``remove`` takes weight back out of the centroid nearest the value.  That
+keeps counts exact and quantiles close, but not as tight as a digest
+built from scratch, so callers that delete often should rebuild now and
+then.
+"""
+import bisect
+import math
+
+DEFAULT_COMPRESSION = 200
+# Unmerged centroids are allowed to pile up to this multiple of compression
+BUFFER_FACTOR = 3
+
+
+class TDigest:
+    def __init__(self, compression=DEFAULT_COMPRESSION, centroids=None):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        for mean, weight in sorted(centroids or []):
+            self.means.append(float(mean))
+            self.weights.append(float(weight))
+        self.total = sum(self.weights)
+
+    @classmethod
+    def from_list(cls, data, compression=DEFAULT_COMPRESSION):
+        return cls(compression, data or [])
+
+    def to_list(self):
+        self.compress()
+        return [[round(mean, 10), weight] for mean, weight in zip(self.means, self.weights)]
+
+    def __len__(self):
+        return len(self.means)
+
+    def add(self, value, weight=1.0):
+        index = bisect.bisect(self.means, value)
+        self.means.insert(index, float(value))
+        self.weights.insert(index, float(weight))
+        self.total += weight
+        if len(self.means) > BUFFER_FACTOR * self.compression:
+            self.compress()
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def remove(self, value, weight=1.0):
+        """Take ``weight`` out of the centroids nearest ``value``."""
+        while weight > 0 and self.means:
+            index = bisect.bisect_left(self.means, value)
+            if index == len(self.means) or (
+                    index > 0 and value - self.means[index - 1] <= self.means[index] - value):
+                index -= 1
+            taken = min(weight, self.weights[index])
+            self.weights[index] -= taken
+            self.total -= taken
+            weight -= taken
+            if self.weights[index] <= 0:
+                del self.means[index], self.weights[index]
+
+    def _scale(self, q):
+        # k1 scale function: centroids shrink towards both tails
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def compress(self):
+        """Merge neighbouring centroids while each spans at most one unit of the scale."""
+        if len(self.means) <= 1:
+            return
+        total = self.total
+        means, weights = [self.means[0]], [self.weights[0]]
+        cumulative = 0.0
+        k_start = self._scale(0.0)
+        for mean, weight in zip(self.means[1:], self.weights[1:]):
+            proposed = weights[-1] + weight
+            if self._scale((cumulative + proposed) / total) - k_start <= 1:
+                means[-1] += (mean - means[-1]) * weight / proposed
+                weights[-1] = proposed
+            else:
+                cumulative += weights[-1]
+                k_start = self._scale(cumulative / total)
+                means.append(mean)
+                weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        """Approximate ``q`` quantile (0 <= q <= 1); None when empty."""
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+        target = q * self.total
+        cumulative = 0.0
+        # Each centroid's mean sits at the middle of its weight
+        previous_center, previous_mean = None, None
+        for mean, weight in zip(self.means, self.weights):
+            center = cumulative + weight / 2
+            if target <= center:
+                if previous_center is None:
+                    return mean
+                fraction = (target - previous_center) / (center - previous_center)
+                return previous_mean + (mean - previous_mean) * fraction
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        return self.means[-1]
@@ -0,0 +1,4 @@
+"""Performance checks and benchmarks for the backend.
+
+Run them from ``backend/``, e.g. ``python -m benchmarks.query_plans``.
+"""
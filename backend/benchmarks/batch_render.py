@@ -0,0 +1,81 @@
+"""Measure how batch report rendering scales with worker processes.
+
+Writes a synthetic memory-mapped snapshot (``--partitions`` reports of
+``--rows`` rows each) and renders the whole batch with 1, 2, 4, ... up to
+``--max-workers`` processes, reporting wall time, pages/sec and speedup
+over one worker:
+
+    python -m benchmarks.batch_render --partitions 16 --rows 5000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.batch_reports import Snapshot, remove_snapshot, render_batch
+
+SCHEMA = {
+    'title': 'Group {partition}',
+    'sections': [
+        {'type': 'heading', 'text': 'Group {partition}'},
+        {'type': 'summary', 'source': 'summary'},
+        {'type': 'table', 'source': 'rows', 'columns': [
+            {'key': 'id', 'label': 'ID', 'align': 'right'},
+            {'key': 'name', 'label': 'Name', 'width': 2},
+            {'key': 'score', 'label': 'Score', 'format': '{:.1f}', 'align': 'right'},
+            {'key': 'date', 'label': 'Submitted', 'width': 1.6}
+        ]}
+    ]
+}
+KINDS = {'id': 'int', 'group': 'int', 'name': 'string', 'score': 'float', 'date': 'datetime'}
+
+
+def synthetic_columns(partitions, rows):
+    total = partitions * rows
+    start = datetime(2024, 1, 1)
+    return {
+        'id': list(range(1, total + 1)),
+        'group': [i % partitions for i in range(total)],
+        'name': [f'Respondent {i}' for i in range(total)],
+        'score': [random.uniform(0, 100) for _ in range(total)],
+        'date': [start + timedelta(minutes=i) for i in range(total)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--partitions', type=int, default=16)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    snapshot_dir = tempfile.mkdtemp(prefix='report-snapshot-')
+    output_dir = tempfile.mkdtemp(prefix='batch-reports-')
+    try:
+        started = time.perf_counter()
+        snapshot = Snapshot.write(snapshot_dir, synthetic_columns(args.partitions, args.rows), KINDS, 'group')
+        snapshot_seconds = time.perf_counter() - started
+
+        runs = []
+        workers = 1
+        while workers <= args.max_workers:
+            started = time.perf_counter()
+            results = render_batch(snapshot, SCHEMA, output_dir, workers=workers)
+            seconds = time.perf_counter() - started
+            pages = sum(result['pages'] for result in results)
+            runs.append({'workers': workers, 'seconds': round(seconds, 3), 'pages': pages,
+                         'pages_per_sec': round(pages / seconds, 1),
+                         'speedup': round(runs[0]['seconds'] / seconds, 2) if runs else 1.0})
+            workers *= 2
+        print(json.dumps({'partitions': args.partitions, 'rows_per_partition': args.rows,
+                          'snapshot_seconds': round(snapshot_seconds, 3), 'runs': runs}, indent=2))
+    finally:
+        remove_snapshot(snapshot_dir)
+        remove_snapshot(output_dir)
+
+
+if __name__ == '__main__':
+    main()
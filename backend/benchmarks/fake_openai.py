@@ -0,0 +1,129 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers ``POST /v1/chat/completions`` after a fixed delay with a JSON
+object (or, for batched suggestion prompts, one object per dataset) and
+records how many requests were in flight at once.  Running the module
+drives a burst of AI requests through ``AIRunner`` against it:
+
+    python -m benchmarks.fake_openai --requests 200 --latency 0.2
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.1, fail_every=0):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/v1'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests += 1
+            number = server.requests
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.latency)
+            if server.fail_every and number % server.fail_every == 0:
+                return self._send(500, {'error': {'message': 'injected failure'}})
+            self._send(200, completion(body))
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def completion(body):
+    content = body['messages'][-1]['content']
+    try:
+        datasets = json.loads(content).get('datasets')
+    except (ValueError, AttributeError):
+        datasets = None
+    if datasets is not None:
+        answer = [{'key_metrics': sorted(data)} for data in datasets]
+    else:
+        answer = {'summary': f'{len(content)} characters analysed'}
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body['model'],
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': json.dumps(answer)}}]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--fail-every', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AI_CACHE', 'memory')
+    from app.services.ai_cache import cache_from_env
+    from app.services.ai_runner import AIRunner
+    import openai
+
+    server = FakeOpenAI(latency=args.latency, fail_every=args.fail_every).start()
+    client = openai.AsyncOpenAI(api_key='fake', base_url=server.base_url, max_retries=0)
+    runner = AIRunner(client=client, cache=cache_from_env(), concurrency=args.concurrency, backoff=0.05)
+
+    started = time.perf_counter()
+    ids = [runner.submit('suggestions' if i % 2 else 'analysis', {'report': i % (args.requests // 2 or 1), 'n': i})
+           for i in range(args.requests)]
+    failed = 0
+    for request_id in ids:
+        try:
+            runner.result(request_id)
+        except Exception:
+            failed += 1
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'requests': args.requests,
+        'failed': failed,
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(args.requests / elapsed, 1),
+        'upstream_calls': server.requests,
+        'max_upstream_concurrency': server.max_active,
+        'runner': runner.stats()
+    }, indent=2))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""Load-test the legacy API endpoints against a seeded SQLite database.
+
+Seeds a SQLite file with ``--rows`` synthetic submissions and
+``--reports`` report records (kept between runs, so large scales are
+only seeded once), then drives the real ``app.py`` application:
+
+* a serial pass through the Flask test client, ``--samples`` requests
+  per endpoint, for uncontended latency;
+* a load phase of ``--workers`` processes, each with its own app and
+  test client, issuing a weighted mix of requests for ``--seconds``.
+
+It reports p50/p95/p99 latency, throughput, errors and peak RSS per
+endpoint and writes everything, with the commit it ran on, to a JSON
+file; ``--compare`` prints the change against an earlier result:
+
+    python -m benchmarks.load_test --rows 100000 --workers 4 --seconds 20
+    python -m benchmarks.load_test --rows 100000 --compare benchmarks/results/<old>.json
+
+Scales from 1k to 10M rows are supported; seeding 10M rows takes a few
+minutes and about 2 GB of disk.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND, 'benchmarks', 'results')
+
+SEED_CHUNK = 50000
+GROUPS = ['Group A', 'Group B', 'Group C', 'Group D', 'Group E']
+REPORT_TYPES = ['summary', 'detailed', 'analytics']
+
+# name -> (weight in the load mix, method, path, JSON body)
+ENDPOINTS = {
+    'submissions page': (4, 'GET', '/api/submissions?limit=100', None),
+    'submissions filtered': (2, 'GET', '/api/submissions?group=Group+B&min_score=50&sort=date&limit=100', None),
+    'dashboard stats': (4, 'GET', '/api/dashboard/stats', None),
+    'reports list': (1, 'GET', '/api/reports', None),
+    'generate report (cached)': (1, 'POST', '/generate-report', {'report_type': 'summary', 'format': 'csv', 'wait': 30}),
+    'download report': (2, 'GET', '/download-report/{report_id}', None),
+}
+
+
+def load_app(database):
+    """Import ``app.py`` against ``database``; it is shadowed by the ``app`` package."""
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    os.environ.setdefault('JOB_BACKEND', 'thread')
+    sys.path.insert(0, BACKEND)
+    spec = importlib.util.spec_from_file_location('legacy_app', os.path.join(BACKEND, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_submissions(start, count, rng):
+    first = datetime(2024, 1, 1)
+    for i in range(start, start + count):
+        yield {
+            'name': f'Respondent {i}',
+            'email': f'respondent{i}@example.com',
+            # about one in ten submissions is unscored
+            'score': round(rng.uniform(0, 100), 2) if rng.random() > 0.1 else 0,
+            'date': first + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+            'group': rng.choice(GROUPS),
+            'responses': {'q1': rng.randint(1, 5), 'q2': rng.choice(['yes', 'no'])},
+        }
+
+
+def seed(legacy, rows, reports, seed_value):
+    """Bring the database up to ``rows`` submissions and ``reports`` reports."""
+    db, Submission, Report = legacy.db, legacy.Submission, legacy.Report
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    legacy.init_db()
+    existing = Submission.query.count()
+    added = 0
+    while existing + added < rows:
+        count = min(SEED_CHUNK, rows - existing - added)
+        db.session.execute(Submission.__table__.insert(),
+                           list(synthetic_submissions(existing + added, count, rng)))
+        db.session.commit()
+        added += count
+    if added:
+        legacy.rebuild_rollups()
+
+    existing_reports = Report.query.count()
+    if existing_reports < reports:
+        db.session.execute(Report.__table__.insert(), [
+            {'title': f'Report {i}', 'report_type': rng.choice(REPORT_TYPES), 'format': 'pdf',
+             'created_at': datetime(2024, 1, 1) + timedelta(minutes=i), 'status': 'completed', 'user_id': 1}
+            for i in range(existing_reports, reports)
+        ])
+        db.session.commit()
+    return {'submissions': Submission.query.count(), 'reports': Report.query.count(),
+            'added_submissions': added, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def request(client, name, report_id):
+    _, method, path, body = ENDPOINTS[name]
+    started = time.perf_counter()
+    response = client.open(path.format(report_id=report_id), method=method, json=body)
+    response.get_data()
+    response.close()
+    return time.perf_counter() - started, response.status_code
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+def summarise(samples, seconds=None):
+    """Latency percentiles (ms), request count, errors and throughput per endpoint."""
+    summary = {}
+    for name in ENDPOINTS:
+        timings = sorted(t for n, t, _ in samples if n == name)
+        if not timings:
+            continue
+        errors = sum(1 for n, _, status in samples if n == name and status >= 400)
+        summary[name] = {
+            'requests': len(timings),
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+            'rps': round(len(timings) / (seconds or sum(timings)), 1),
+        }
+    return summary
+
+
+def prepare_report(legacy, client):
+    """Generate one export so the download and cached-generation requests have a file."""
+    started = time.perf_counter()
+    response = client.post('/generate-report', json={'report_type': 'summary', 'format': 'csv', 'wait': 600})
+    seconds = time.perf_counter() - started
+    data = response.get_json()
+    if response.status_code != 200 or 'report_id' not in data:
+        raise SystemExit(f'/generate-report failed: {response.status_code} {data}')
+    return data['report_id'], round(seconds * 1000, 2)
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def load_worker(database, workdir, report_id, index, start_at, seconds, seed_value):
+    """One load-generator process: its own app and test client, a weighted request mix."""
+    os.chdir(workdir)
+    legacy = load_app(database)
+    client = legacy.app.test_client()
+    rng = random.Random(seed_value + index)
+    names = list(ENDPOINTS)
+    weights = [ENDPOINTS[name][0] for name in names]
+    samples = []
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        elapsed, status = request(client, name, report_id)
+        samples.append((name, elapsed, status))
+    return samples, peak_rss_mb()
+
+
+def run_load(database, workdir, report_id, workers, seconds, seed_value):
+    # Workers start together once every one of them has imported the app
+    start_at = time.time() + 5 + workers
+    with get_context('spawn').Pool(workers) as pool:
+        results = pool.starmap(load_worker, [
+            (database, workdir, report_id, index, start_at, seconds, seed_value) for index in range(workers)
+        ])
+    samples = [sample for worker_samples, _ in results for sample in worker_samples]
+    return {
+        'workers': workers,
+        'seconds': seconds,
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status in samples if status >= 400),
+        'throughput_rps': round(len(samples) / seconds, 1),
+        'peak_rss_mb_per_worker': max(rss for _, rss in results),
+        'endpoints': summarise(samples, seconds),
+    }
+
+
+def git_revision():
+    def git(*args):
+        result = subprocess.run(['git', *args], cwd=BACKEND, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+    return {'commit': git('rev-parse', '--short', 'HEAD'), 'dirty': bool(git('status', '--porcelain'))}
+
+
+def compare(result, baseline):
+    """Print the change in p95 latency and throughput against ``baseline``."""
+    print(f'compared with {baseline["meta"]["revision"]["commit"]} ({baseline["meta"]["started_at"]}):')
+    for phase in ('serial', 'load'):
+        if phase not in baseline or phase not in result:
+            continue
+        old = baseline[phase] if phase == 'serial' else baseline[phase]['endpoints']
+        new = result[phase] if phase == 'serial' else result[phase]['endpoints']
+        for name in new:
+            if name not in old:
+                continue
+            change = (new[name]['p95_ms'] - old[name]['p95_ms']) / old[name]['p95_ms'] * 100
+            print(f'  {phase:6} {name:26} p95 {old[name]["p95_ms"]:9.2f} -> {new[name]["p95_ms"]:9.2f} ms '
+                  f'({change:+.1f}%)')
+    if 'load' in baseline and 'load' in result:
+        old, new = baseline['load']['throughput_rps'], result['load']['throughput_rps']
+        print(f'  load   throughput {old} -> {new} req/s ({(new - old) / old * 100:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='submissions to seed (1k to 10M)')
+    parser.add_argument('--reports', type=int, default=1000, help='report records to seed')
+    parser.add_argument('--db', help='SQLite file to seed or reuse (default: one per scale in the temp dir)')
+    parser.add_argument('--samples', type=int, default=50, help='serial requests per endpoint')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seconds', type=float, default=20, help='length of the load phase; 0 skips it')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>-<rows>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    database = os.path.abspath(args.db or os.path.join(tempfile.gettempdir(), f'stratosys-bench-{args.rows}.db'))
+    # Report files and the export cache go in a scratch directory next to the database
+    workdir = f'{database}.files'
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    revision = git_revision()
+    legacy = load_app(database)
+    client = legacy.app.test_client()
+    result = {'meta': {
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': vars(args),
+    }}
+
+    with legacy.app.app_context():
+        result['seed'] = seed(legacy, args.rows, args.reports, args.seed)
+        print(f'seeded: {json.dumps(result["seed"])}', file=sys.stderr)
+    report_id, result['generate_report_cold_ms'] = prepare_report(legacy, client)
+
+    samples = []
+    for name in ENDPOINTS:
+        for _ in range(args.samples):
+            elapsed, status = request(client, name, report_id)
+            samples.append((name, elapsed, status))
+    result['serial'] = summarise(samples)
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    if args.seconds > 0:
+        result['load'] = run_load(database, workdir, report_id, args.workers, args.seconds, args.seed)
+
+    output = output or os.path.join(RESULTS_DIR, f'{revision["commit"] or "unknown"}-{args.rows}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f'written to {output}', file=sys.stderr)
+    if baseline:
+        with open(baseline) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Measure PDF rendering throughput of the report engine.
+
+Renders a template with a summary, a chart and a long table fed from a
+generator, and reports pages/sec, rows/sec, peak RSS and how long a
+compile takes compared with a cache hit:
+
+    python -m benchmarks.pdf_render --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.exporters import peak_rss_bytes
+from app.services.pdf_engine import CompiledTemplate, compile_template, template_cache
+
+SCHEMA = {
+    'title': 'Benchmark report',
+    'sections': [
+        {'type': 'heading', 'text': '{title}'},
+        {'type': 'text', 'text': 'Synthetic submissions rendered by the benchmark.'},
+        {'type': 'summary', 'source': 'summary'},
+        {'type': 'chart', 'chart': 'bar', 'source': 'by_group', 'title': 'Submissions per group'},
+        {'type': 'table', 'source': 'rows', 'columns': [
+            {'key': 'id', 'label': 'ID', 'width': 0.6, 'align': 'right'},
+            {'key': 'name', 'label': 'Name', 'width': 2},
+            {'key': 'email', 'label': 'Email', 'width': 3},
+            {'key': 'group', 'label': 'Group'},
+            {'key': 'score', 'label': 'Score', 'format': '{:.1f}', 'align': 'right'},
+            {'key': 'date', 'label': 'Submitted', 'width': 1.6, 'format': '%Y-%m-%d %H:%M'}
+        ]}
+    ]
+}
+
+
+def rows(count):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        yield {'id': i + 1, 'name': f'Respondent {i}', 'email': f'respondent{i}@example.com',
+               'group': random.choice('ABCDE'), 'score': random.uniform(0, 100),
+               'date': start + timedelta(minutes=i)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    CompiledTemplate(SCHEMA)
+    compile_seconds = time.perf_counter() - started
+    compile_template(SCHEMA)
+    started = time.perf_counter()
+    compiled = compile_template(SCHEMA)
+    cached_seconds = time.perf_counter() - started
+
+    data = {
+        'summary': {'Responses': args.rows, 'Groups': 5},
+        'by_group': {group: args.rows // 5 for group in 'ABCDE'},
+        'rows': lambda: rows(args.rows)
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'report.pdf')
+        stats = compiled.render(path, data)
+        size = os.path.getsize(path)
+
+    print(json.dumps({
+        'rows': stats['rows'],
+        'pages': stats['pages'],
+        'seconds': stats['seconds'],
+        'pages_per_sec': round(stats['pages'] / stats['seconds'], 1),
+        'rows_per_sec': round(stats['rows'] / stats['seconds']),
+        'file_bytes': size,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'compile_ms': round(compile_seconds * 1000, 3),
+        'cached_compile_ms': round(cached_seconds * 1000, 3),
+        'template_cache': {'hits': template_cache.hits, 'misses': template_cache.misses}
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Check that the hot query paths are served by indexes on SQLite.
+
+Builds the schemas of ``app.models`` and the legacy ``app.py`` in
+in-memory databases, runs ``EXPLAIN QUERY PLAN`` for each query the
+endpoints and jobs issue, and fails if any of them scans a table or sorts
+in a temporary B-tree.  Listings are checked with the queries their views
+build (projection, filters and keyset clause), not hand-written copies.
+
+    python -m benchmarks.query_plans
+"""
+import os
+import sys
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('JOB_BACKEND', 'thread')
+
+from sqlalchemy import func
+
+from app import create_app, db
+from app.models import Form, Report, Settings, Submission, User
+from app.pagination import encode_cursor, keyset_query
+from app.serializers import FORM_LIST, REPORT_LIST
+from benchmarks.load_test import load_app
+
+LIMIT = 100
+
+
+def hot_queries():
+    return {
+        'form submissions, newest first': Submission.query.filter_by(form_id=1)
+            .order_by(Submission.submitted_at.desc()),
+        'form submissions in a date window': Submission.query.filter(
+            Submission.form_id == 1,
+            Submission.submitted_at >= '2024-01-01', Submission.submitted_at < '2024-02-01'),
+        'form score range': Submission.query.filter(
+            Submission.form_id == 1, Submission.score.between(50, 80)),
+        'form stats': db.session.query(func.count(Submission.id), func.avg(Submission.score))
+            .filter(Submission.form_id == 1),
+        'submissions in a date window': Submission.query.filter(
+            Submission.submitted_at >= '2024-01-01').order_by(Submission.submitted_at),
+        'top scores': Submission.query.order_by(Submission.score.desc()).limit(10),
+        'response sync lookup': db.session.query(Submission.google_response_id, Submission.id)
+            .filter(Submission.form_id == 1, Submission.google_response_id.in_(['a', 'b'])),
+        'user submissions': Submission.query.filter_by(user_id=1),
+        # GET /api/reports for a non-admin user, first page and a later one
+        'report listing for a user': keyset_query(
+            REPORT_LIST.query().filter(Report.user_id == 1), [Report.id], limit=LIMIT),
+        'report listing for a user, next page': keyset_query(
+            REPORT_LIST.query().filter(Report.user_id == 1), [Report.id], encode_cursor([500]), LIMIT),
+        'report listing by status': keyset_query(
+            REPORT_LIST.query().filter(Report.status == 'processing'), [Report.id], limit=LIMIT),
+        'reports by status': Report.query.filter_by(status='processing').order_by(Report.created_at),
+        # GET /api/forms, whose last_submitted_at is a correlated MAX(submitted_at)
+        'form listing': keyset_query(FORM_LIST.query(), [Form.id], encode_cursor([500]), LIMIT),
+        'forms by creator': Form.query.filter_by(created_by=1),
+        'setting by key': Settings.query.filter_by(key='companyName'),
+        'user by email': User.query.filter_by(email='admin@stratosys.com'),
+    }
+
+
+def legacy_hot_queries(legacy):
+    """Queries of the legacy ``app.py`` views; call inside its app context."""
+    Submission = legacy.Submission
+    queries = {}
+    listings = {
+        'legacy submissions by date, two groups': '/fetch-data?sort=date&group=Group+A&group=Group+B',
+        'legacy submissions by date, one group and scores': '/fetch-data?sort=date&group=Group+B&min_score=50',
+        'legacy submissions by id, one group': '/api/submissions?group=Group+B',
+    }
+    for name, url in listings.items():
+        with legacy.app.test_request_context(url):
+            query, columns = legacy.submission_listing_query()
+            after = encode_cursor(['2024-06-01T00:00:00', 500][-len(columns):])
+            queries[name] = keyset_query(query, columns, after, LIMIT)
+    # /generate-report looks for a finished report at the cache path first
+    queries['legacy report cache lookup'] = legacy.completed_report_query('/reports/cache/abc.csv').limit(1)
+    queries['legacy export chunk'] = keyset_query(
+        legacy.db.session.query(Submission.id, Submission.name).filter(Submission.id <= 10000),
+        [Submission.id], encode_cursor([5000]), 5000)
+    queries['legacy data version'] = legacy.db.session.query(func.max(Submission.id))
+    return queries
+
+
+def plan(query, engine=None):
+    engine = engine or db.engine
+    statement = query.statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+    with engine.connect() as connection:
+        return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}')]
+
+
+def problems(details):
+    found = []
+    for detail in details:
+        if detail.startswith('SCAN') and 'USING' not in detail:
+            found.append(detail)
+        if 'TEMP B-TREE' in detail:
+            found.append(detail)
+    return found
+
+
+def check(queries, engine=None):
+    failed = False
+    for name, query in queries.items():
+        details = plan(query, engine)
+        bad = problems(details)
+        failed = failed or bool(bad)
+        print(f"{'FAIL' if bad else 'ok  '} {name}: {'; '.join(details)}")
+    return failed
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        failed = check(hot_queries())
+
+    legacy = load_app(':memory:')
+    with legacy.app.app_context():
+        legacy.db.create_all()
+        failed = check(legacy_hot_queries(legacy), legacy.db.engine) or failed
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
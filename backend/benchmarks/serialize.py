@@ -0,0 +1,106 @@
+"""Measure rows/sec serialised by the listing endpoints' two code paths.
+
+Seeds an in-memory database with users, forms, submissions and reports,
+then times listing reports with their authors and forms with submission
+counts, once the ``to_dict`` way (ORM objects, one lazy load per row,
+stdlib ``json``) and once through ``app.serializers`` projections, and
+counts the SQL statements each issues:
+
+    python -m benchmarks.serialize --reports 20000 --forms 2000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('JOB_BACKEND', 'thread')
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Form, Report, Submission, User
+from app.serializers import FORM_LIST, REPORT_LIST, dumps
+
+
+def seed(users, forms, reports, submissions_per_form):
+    db.session.bulk_insert_mappings(User, [
+        {'id': i, 'email': f'user{i}@example.com', 'full_name': f'User {i}'} for i in range(1, users + 1)
+    ])
+    db.session.bulk_insert_mappings(Form, [
+        {'id': i, 'title': f'Form {i}', 'created_by': random.randint(1, users), 'fields': []}
+        for i in range(1, forms + 1)
+    ])
+    db.session.bulk_insert_mappings(Submission, [
+        {'form_id': form_id, 'score': random.uniform(0, 100), 'responses': {'q1': random.randint(1, 5)}}
+        for form_id in range(1, forms + 1) for _ in range(submissions_per_form)
+    ])
+    db.session.bulk_insert_mappings(Report, [
+        {'title': f'Report {i}', 'report_type': 'summary', 'user_id': random.randint(1, users)}
+        for i in range(reports)
+    ])
+    db.session.commit()
+
+
+def orm_reports():
+    data = []
+    for report in Report.query.all():
+        row = report.to_dict()
+        row['author'] = report.author.full_name  # lazy load per report
+        data.append(row)
+    return json.dumps(data).encode()
+
+
+def orm_forms():
+    data = []
+    for form in Form.query.all():
+        row = form.to_dict()
+        row['submission_count'] = len(form.submissions)  # lazy load per form
+        data.append(row)
+    return json.dumps(data).encode()
+
+
+def projected_reports():
+    return dumps(REPORT_LIST.records(REPORT_LIST.query().order_by(Report.id)))
+
+
+def projected_forms():
+    return dumps(FORM_LIST.records(FORM_LIST.query().order_by(Form.id)))
+
+
+def measure(name, fn, rows, statements):
+    db.session.expunge_all()
+    statements[0] = 0
+    started = time.perf_counter()
+    size = len(fn())
+    seconds = time.perf_counter() - started
+    return {'path': name, 'rows': rows, 'seconds': round(seconds, 3),
+            'rows_per_sec': round(rows / seconds), 'statements': statements[0], 'bytes': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--forms', type=int, default=2000)
+    parser.add_argument('--reports', type=int, default=20000)
+    parser.add_argument('--submissions-per-form', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.users, args.forms, args.reports, args.submissions_per_form)
+        statements = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *_: statements.__setitem__(0, statements[0] + 1))
+        for name, fn, rows in [
+            ('reports: to_dict + lazy author', orm_reports, args.reports),
+            ('reports: projection + orjson', projected_reports, args.reports),
+            ('forms: to_dict + lazy submissions', orm_forms, args.forms),
+            ('forms: projection + orjson', projected_forms, args.forms),
+        ]:
+            print(json.dumps(measure(name, fn, rows, statements)))
+
+
+if __name__ == '__main__':
+    main()
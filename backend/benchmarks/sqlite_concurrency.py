@@ -0,0 +1,134 @@
+"""Compare SQLite throughput under concurrent readers and writers.
+
+Runs the same mixed workload (single-row inserts committed one at a
+time, like ``create_submission``, against aggregate reads, like the
+dashboard stats) from several worker processes, once with SQLAlchemy's
+default engine setup and once with the engine profile from ``config.py``
+(WAL, ``synchronous=NORMAL``, busy_timeout, mmap), and reports
+operations/sec and "database is locked" errors for each:
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 4 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from multiprocessing import get_context
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+
+from app.engine_profile import install_sqlite_pragmas
+from config import engine_options
+
+SEED_ROWS = 20000
+
+metadata = sa.MetaData()
+submissions = sa.Table(
+    'submission', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('email', sa.String(120), nullable=False),
+    sa.Column('score', sa.Float),
+    sa.Column('group', sa.String(50)),
+    sa.Column('date', sa.Float, index=True)
+)
+
+
+def make_engine(path, profile):
+    uri = f'sqlite:///{path}'
+    if profile == 'default':
+        return sa.create_engine(uri)
+    engine = sa.create_engine(uri, **engine_options(uri))
+    install_sqlite_pragmas(engine)
+    return engine
+
+
+def seed(path, profile):
+    engine = make_engine(path, profile)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(submissions.insert(), [
+            {'email': f'seed{i}@example.com', 'score': random.uniform(0, 100),
+             'group': random.choice('ABCDE'), 'date': time.time()}
+            for i in range(SEED_ROWS)
+        ])
+    engine.dispose()
+
+
+def worker(path, profile, role, seconds, results):
+    engine = make_engine(path, profile)
+    operations = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                if role == 'writer':
+                    connection.execute(submissions.insert().values(
+                        email=f'w{os.getpid()}-{operations}@example.com', score=random.uniform(0, 100),
+                        group=random.choice('ABCDE'), date=time.time()))
+                else:
+                    connection.execute(
+                        sa.select(submissions.c.group, sa.func.count(), sa.func.avg(submissions.c.score))
+                        .group_by(submissions.c.group)
+                    ).all()
+            operations += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    latencies.sort()
+    results.put({
+        'role': role, 'operations': operations, 'errors': errors,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None
+    })
+
+
+def run(profile, writers, readers, seconds):
+    directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+    path = os.path.join(directory, 'bench.db')
+    seed(path, profile)
+
+    context = get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(path, profile, role, seconds, results))
+                 for role in ['writer'] * writers + ['reader'] * readers]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = {'profile': profile}
+    for role in ('writer', 'reader'):
+        mine = [r for r in collected if r['role'] == role]
+        p99 = [r['p99_ms'] for r in mine if r['p99_ms'] is not None]
+        summary[role + 's'] = {
+            'ops_per_sec': round(sum(r['operations'] for r in mine) / seconds, 1),
+            'locked_errors': sum(r['errors'] for r in mine),
+            'worst_p99_ms': max(p99) if p99 else None
+        }
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=['default', 'tuned', 'both'], default='both')
+    args = parser.parse_args()
+
+    profiles = ['default', 'tuned'] if args.profile == 'both' else [args.profile]
+    for profile in profiles:
+        print(json.dumps(run(profile, args.writers, args.readers, args.seconds)))
+
+
+if __name__ == '__main__':
+    main()
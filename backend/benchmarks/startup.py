@@ -0,0 +1,82 @@
+"""Measure application start-up with ``python -X importtime``.
+
+Imports each entry point in a fresh interpreter, totals the import time
+the interpreter reports, lists the slowest top-level packages and fails
+if start-up goes over budget or loads a module that should wait until
+first use (pandas, reportlab, openai, ...):
+
+    python -m benchmarks.startup --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    'package': 'from app import create_app; create_app()',
+    'legacy': ('import importlib.util; '
+               'spec = importlib.util.spec_from_file_location("legacy_app", "app.py"); '
+               'spec.loader.exec_module(importlib.util.module_from_spec(spec))'),
+}
+# Imported inside the functions that need them, never at start-up
+DEFERRED = ('pandas', 'numpy', 'reportlab', 'openai', 'googleapiclient', 'openpyxl')
+
+
+def import_times(code):
+    """``{module: (self_us, cumulative_us)}`` for one fresh interpreter running ``code``."""
+    env = dict(os.environ, DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'),
+               JOB_BACKEND='thread', PYTHONPATH=BACKEND)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=BACKEND,
+                            env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(result.stderr[-2000:])
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative))
+    return modules
+
+
+def measure(name, code, runs):
+    samples = [import_times(code) for _ in range(runs)]
+    # The fastest run is the least disturbed by whatever else the machine is doing
+    modules = min(samples, key=lambda m: sum(self_us for self_us, _ in m.values()))
+    top_level = {module: cumulative for module, (_, cumulative) in modules.items() if '.' not in module}
+    return {
+        'entry_point': name,
+        'import_ms': round(sum(self_us for self_us, _ in modules.values()) / 1000, 1),
+        'modules': len(modules),
+        'slowest': [[module, round(us / 1000, 1)]
+                    for module, us in sorted(top_level.items(), key=lambda item: -item[1])[:8]],
+        'deferred_loaded': sorted(m for m in DEFERRED if m in modules),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)))
+    parser.add_argument('--entry-point', choices=sorted(ENTRY_POINTS), action='append')
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.entry_point or sorted(ENTRY_POINTS):
+        result = measure(name, ENTRY_POINTS[name], args.runs)
+        print(json.dumps(result))
+        if result['import_ms'] > args.budget_ms:
+            failures.append(f'{name}: {result["import_ms"]} ms is over the {args.budget_ms} ms budget')
+        if result['deferred_loaded']:
+            failures.append(f'{name}: imports {", ".join(result["deferred_loaded"])} at start-up')
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
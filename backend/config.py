@@ -7,8 +7,24 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///stratosys.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica for reporting and dashboard reads (see app/replica.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-change-in-production'
     
+    # Database engine profile. The pool settings apply to server databases
+    # (Postgres, MySQL); SQLite gets the pragmas below on every new connection
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # seconds
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    # WAL lets readers run alongside the single writer; NORMAL only syncs at
+    # checkpoints, which is still crash-safe in WAL mode
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)  # milliseconds
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+    
     # Google API Configuration
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
@@ -27,6 +43,51 @@ class Config:
     # File Upload Configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    
+    # Report downloads: 'x-accel' hands the file to nginx through an internal
+    # location (DOWNLOAD_ACCEL_PREFIX aliased to the backend directory),
+    # 'x-sendfile' to Apache/lighttpd; unset serves it from the WSGI server
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD')
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX') or '/protected/'
+    
+    # Background Job Configuration
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+    JOB_BACKEND = os.environ.get('JOB_BACKEND') or ('celery' if CELERY_BROKER_URL else 'thread')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 4)
+    
+    # Metrics (see app/metrics.py). Requests slower than this many seconds are
+    # logged with their slowest SQL; 0 turns the log off. Celery pool
+    # processes serve /metrics on JOB_METRICS_PORT plus their pool index
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS') or 1.0)
+    JOB_METRICS_PORT = int(os.environ.get('JOB_METRICS_PORT') or 0)
+
+def engine_options(uri, settings=Config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``uri`` under the configured profile."""
+    if uri.startswith('sqlite'):
+        # pysqlite's own lock wait, in seconds; the pragma covers other callers
+        return {'connect_args': {'timeout': settings.SQLITE_BUSY_TIMEOUT / 1000}}
+    return {
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING
+    }
+
+def sqlite_pragmas(settings=Config):
+    """``(name, value)`` pragmas run on each new SQLite connection."""
+    journal_mode = settings.SQLITE_JOURNAL_MODE.upper()
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    if journal_mode not in ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'):
+        raise ValueError(f'Invalid SQLITE_JOURNAL_MODE: {journal_mode}')
+    if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        raise ValueError(f'Invalid SQLITE_SYNCHRONOUS: {synchronous}')
+    return [
+        ('journal_mode', journal_mode),
+        ('synchronous', synchronous),
+        ('busy_timeout', int(settings.SQLITE_BUSY_TIMEOUT)),
+        ('mmap_size', int(settings.SQLITE_MMAP_SIZE))
+    ]
 
 class DevelopmentConfig(Config):
     DEBUG = True
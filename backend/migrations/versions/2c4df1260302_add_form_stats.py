@@ -0,0 +1,44 @@
+"""Add materialised form stats
+
+Revision ID: 2c4df1260302
+Revises: a3c91e4f7b20
+Create Date: 2026-10-16 21:05:17.284311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c4df1260302'
+down_revision = 'a3c91e4f7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('form_stats',
+    sa.Column('form_id', sa.Integer(), nullable=False),
+    sa.Column('submission_count', sa.Integer(), nullable=False),
+    sa.Column('score_count', sa.Integer(), nullable=False),
+    sa.Column('score_sum', sa.Float(), nullable=False),
+    sa.Column('score_sum_sq', sa.Float(), nullable=False),
+    sa.Column('score_digest', sa.JSON(), nullable=True),
+    sa.Column('removed_since_rebuild', sa.Integer(), nullable=False),
+    sa.Column('rebuilt_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['form_id'], ['form.id'], ),
+    sa.PrimaryKeyConstraint('form_id')
+    )
+    op.create_table('form_answer_count',
+    sa.Column('form_id', sa.Integer(), nullable=False),
+    sa.Column('question', sa.String(length=100), nullable=False),
+    sa.Column('answer', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['form_id'], ['form.id'], ),
+    sa.PrimaryKeyConstraint('form_id', 'question', 'answer')
+    )
+
+
+def downgrade():
+    op.drop_table('form_answer_count')
+    op.drop_table('form_stats')
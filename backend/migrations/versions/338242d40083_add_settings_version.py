@@ -0,0 +1,36 @@
+"""Add settings versions for the settings cache
+
+Revision ID: 338242d40083
+Revises: 2c4df1260302
+Create Date: 2026-10-16 21:20:41.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '338242d40083'
+down_revision = '2c4df1260302'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    settings_version = op.create_table('settings_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(settings_version, [{'id': 1, 'version': 0}])
+    with op.batch_alter_table('settings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_settings_version'), ['version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('settings', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_settings_version'))
+        batch_op.drop_column('version')
+
+    op.drop_table('settings_version')
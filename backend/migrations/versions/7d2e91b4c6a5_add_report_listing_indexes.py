@@ -0,0 +1,28 @@
+"""Add indexes for the keyset report listing
+
+Revision ID: 7d2e91b4c6a5
+Revises: 338242d40083
+Create Date: 2026-10-16 23:05:12.418330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e91b4c6a5'
+down_revision = '338242d40083'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.create_index('ix_report_user_id_id', ['user_id', 'id'], unique=False)
+        batch_op.create_index('ix_report_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_status_id')
+        batch_op.drop_index('ix_report_user_id_id')
@@ -0,0 +1,132 @@
+"""Reconcile schema with models and add indexes for hot query paths
+
+Revision ID: a3c91e4f7b20
+Revises: 2fd6689365cb
+Create Date: 2026-10-16 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e4f7b20'
+down_revision = '2fd6689365cb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # user: columns added to the model after the initial migration
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('full_name', sa.String(length=100), nullable=False, server_default=''))
+        batch_op.add_column(sa.Column('role', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('department', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('is_active', sa.Boolean(), nullable=True))
+
+    op.create_table('form',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('google_form_id', sa.String(length=100), nullable=True),
+    sa.Column('google_sheet_id', sa.String(length=100), nullable=True),
+    sa.Column('fields', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=False),
+    sa.Column('responses_synced_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_form_created_by', 'form', ['created_by'], unique=False)
+
+    op.create_table('submission',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('form_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('respondent_name', sa.String(length=100), nullable=True),
+    sa.Column('respondent_email', sa.String(length=120), nullable=True),
+    sa.Column('responses', sa.JSON(), nullable=True),
+    sa.Column('score', sa.Float(), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(), nullable=True),
+    sa.Column('google_response_id', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['form_id'], ['form.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_submission_form_submitted_at', 'submission', ['form_id', 'submitted_at'], unique=False)
+    op.create_index('ix_submission_form_score', 'submission', ['form_id', 'score'], unique=False)
+    op.create_index('ix_submission_submitted_at', 'submission', ['submitted_at'], unique=False)
+    op.create_index('ix_submission_score', 'submission', ['score'], unique=False)
+    op.create_index('ix_submission_user_id', 'submission', ['user_id'], unique=False)
+    op.create_index('uq_submission_form_response', 'submission', ['form_id', 'google_response_id'], unique=True)
+
+    # report: output_url became file_path; template_id/data are no longer on the model
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.alter_column('title', existing_type=sa.String(length=120), type_=sa.String(length=200),
+                              existing_nullable=False)
+        batch_op.add_column(sa.Column('report_type', sa.String(length=50), nullable=False, server_default='custom'))
+        batch_op.add_column(sa.Column('format', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('file_path', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('data_filters', sa.JSON(), nullable=True))
+    op.execute('UPDATE report SET file_path = output_url')
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_column('output_url')
+        batch_op.drop_column('data')
+        batch_op.drop_column('template_id')
+        batch_op.create_index('ix_report_user_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_report_status_created_at', ['status', 'created_at'], unique=False)
+        batch_op.create_index('ix_report_created_at', ['created_at'], unique=False)
+
+    # settings.key is unique, which already gives it an index
+    op.create_table('settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.Text(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_by', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['updated_by'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('settings')
+
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_created_at')
+        batch_op.drop_index('ix_report_status_created_at')
+        batch_op.drop_index('ix_report_user_created_at')
+        batch_op.add_column(sa.Column('template_id', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('data', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('output_url', sa.String(length=500), nullable=True))
+    op.execute('UPDATE report SET output_url = file_path')
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_column('data_filters')
+        batch_op.drop_column('file_path')
+        batch_op.drop_column('format')
+        batch_op.drop_column('report_type')
+        batch_op.alter_column('title', existing_type=sa.String(length=200), type_=sa.String(length=120),
+                              existing_nullable=False)
+
+    op.drop_index('uq_submission_form_response', table_name='submission')
+    op.drop_index('ix_submission_user_id', table_name='submission')
+    op.drop_index('ix_submission_score', table_name='submission')
+    op.drop_index('ix_submission_submitted_at', table_name='submission')
+    op.drop_index('ix_submission_form_score', table_name='submission')
+    op.drop_index('ix_submission_form_submitted_at', table_name='submission')
+    op.drop_table('submission')
+
+    op.drop_index('ix_form_created_by', table_name='form')
+    op.drop_table('form')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_active')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('department')
+        batch_op.drop_column('role')
+        batch_op.drop_column('full_name')
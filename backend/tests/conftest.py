@@ -0,0 +1,77 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The tests import the ``app`` package from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['JOB_BACKEND'] = 'thread'
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+from app import create_app, db  # noqa: E402
+from app.models import Form, User  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def session(app):
+    """``db.session`` in an app context; every table is emptied afterwards."""
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def user(session):
+    user = User(email='owner@example.com', full_name='Owner', role='admin')
+    session.add(user)
+    session.commit()
+    return user
+
+
+@pytest.fixture
+def make_form(session, user):
+    def make_form(fields=None, title='Survey'):
+        form = Form(title=title, created_by=user.id, fields=fields or [])
+        session.add(form)
+        session.commit()
+        return form
+    return make_form
+
+
+@pytest.fixture(scope='session')
+def legacy_app():
+    """The legacy ``app.py`` module, which shares its name with the package."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+    spec = importlib.util.spec_from_file_location('legacy_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.app.config['TESTING'] = True
+    with module.app.app_context():
+        module.db.create_all()
+    return module
+
+
+@pytest.fixture
+def legacy(legacy_app):
+    """``legacy_app`` in an app context; every table is emptied afterwards."""
+    db = legacy_app.db
+    with legacy_app.app.app_context():
+        yield legacy_app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
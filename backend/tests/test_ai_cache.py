@@ -0,0 +1,96 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services.ai_cache import MemoryStore, ResponseCache, SQLiteStore
+from app.services.ai_service import DECODE_ERROR, AIService
+
+
+class StubClient:
+    """``chat.completions.create`` that answers slowly and counts its calls."""
+
+    def __init__(self, content='{"summary": "ok"}', delay=0.05):
+        self.content = content
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+
+def run_concurrently(fn, count):
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def call(index):
+        start.wait()
+        results[index] = fn()
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_requests_make_one_upstream_call():
+    client = StubClient()
+    service = AIService(client=client, cache=ResponseCache([MemoryStore()]))
+
+    results = run_concurrently(lambda: service.analyze_data({'scores': [1, 2, 3]}), 8)
+
+    assert results == [{'summary': 'ok'}] * 8
+    assert client.calls == 1
+    stats = service.cache_stats()
+    assert stats['misses'] == 1 and stats['hits'] + stats['coalesced'] == 7
+
+    assert service.analyze_data({'scores': [1, 2, 3]}) == {'summary': 'ok'}
+    assert client.calls == 1
+
+
+def test_undecodable_answers_are_not_cached_or_shared():
+    client = StubClient(content='not json', delay=0)
+    service = AIService(client=client, cache=ResponseCache([MemoryStore()]))
+
+    first = service.analyze_data({'a': 1})
+    assert first == DECODE_ERROR
+    first['error'] = 'changed by a caller'
+    assert service.analyze_data({'a': 1}) == DECODE_ERROR
+    assert client.calls == 2
+
+
+def test_entries_expire_after_their_ttl():
+    store = MemoryStore(ttl=0.05)
+    store.set('key', {'v': 1})
+    assert store.get('key') == {'v': 1}
+    time.sleep(0.06)
+    assert store.get('key') is None
+
+
+def test_promoted_entries_keep_their_remaining_ttl(tmp_path):
+    shared = SQLiteStore(str(tmp_path / 'cache.sqlite'), ttl=0.2)
+    shared.set('key', {'v': 1})
+    time.sleep(0.1)
+
+    local = MemoryStore(ttl=3600)
+    cache = ResponseCache([local, shared])
+    assert cache.get('key') == {'v': 1}
+    assert local.get_entry('key')[1] == shared.get_entry('key')[1]
+
+    time.sleep(0.12)
+    assert cache.get('key') is None
+
+
+def test_the_lru_drops_the_least_recently_used_entry():
+    store = MemoryStore(max_entries=2)
+    store.set('a', 1)
+    store.set('b', 2)
+    store.get('a')
+    store.set('c', 3)
+    assert (store.get('a'), store.get('b'), store.get('c')) == (1, None, 3)
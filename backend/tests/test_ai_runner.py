@@ -0,0 +1,88 @@
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+openai = pytest.importorskip('openai')
+
+from app.services.ai_cache import MemoryStore, ResponseCache  # noqa: E402
+from app.services.ai_runner import AIRunner  # noqa: E402
+from benchmarks.fake_openai import FakeOpenAI  # noqa: E402
+
+
+@pytest.fixture
+def make_runner():
+    servers = []
+
+    def make_runner(latency=0.02, fail_every=0, **options):
+        server = FakeOpenAI(latency=latency, fail_every=fail_every).start()
+        servers.append(server)
+        client = openai.AsyncOpenAI(api_key='fake', base_url=server.base_url, max_retries=0)
+        options.setdefault('backoff', 0.01)
+        return AIRunner(client=client, cache=ResponseCache([MemoryStore()]), **options), server
+
+    yield make_runner
+    for server in servers:
+        server.shutdown()
+
+
+def test_in_flight_calls_stay_within_the_concurrency_limit(make_runner):
+    runner, server = make_runner(concurrency=3)
+    ids = [runner.submit('analysis', {'report': i}) for i in range(12)]
+    results = [runner.result(request_id, timeout=10) for request_id in ids]
+    assert all('summary' in result for result in results)
+    assert server.requests == 12
+    assert server.max_active <= 3
+
+
+def test_identical_requests_share_one_upstream_call(make_runner):
+    runner, server = make_runner(latency=0.1)
+    ids = [runner.submit('analysis', {'report': 'same'}) for _ in range(8)]
+    results = [runner.result(request_id, timeout=10) for request_id in ids]
+    assert len({str(result) for result in results}) == 1
+    assert server.requests == 1
+
+
+def test_suggestions_in_one_window_are_batched(make_runner):
+    runner, server = make_runner(batch_window=0.2)
+    ids = [runner.submit('suggestions', {'report': i}) for i in range(4)]
+    results = [runner.result(request_id, timeout=10) for request_id in ids]
+    assert results == [{'key_metrics': ['report']}] * 4
+    assert server.requests == 1
+    assert runner.stats()['batches'] == 1
+
+
+def test_suggestion_batches_accept_datetimes_and_decimals(make_runner):
+    runner, _ = make_runner(batch_window=0.2)
+    ids = [runner.submit('suggestions', {'at': datetime(2024, 1, i + 1), 'total': Decimal(i)})
+           for i in range(3)]
+    assert all(runner.result(request_id, timeout=10) for request_id in ids)
+
+
+def test_a_failed_batch_fails_every_caller(make_runner):
+    runner, _ = make_runner(fail_every=1, retries=0, batch_window=0.2)
+    ids = [runner.submit('suggestions', {'report': i}) for i in range(3)]
+    for request_id in ids:
+        with pytest.raises(openai.APIError):
+            runner.result(request_id, timeout=10)
+        assert runner.get(request_id)['status'] == 'failed'
+
+
+def test_slow_message_building_does_not_hold_up_other_requests(make_runner, monkeypatch):
+    from app.services import ai_runner as module
+
+    build = module.analysis_messages
+
+    def analysis_messages(data):
+        if data.get('slow'):
+            time.sleep(0.5)
+        return build(data)
+
+    monkeypatch.setattr(module, 'analysis_messages', analysis_messages)
+    runner, _ = make_runner(latency=0)
+    slow = runner.submit('analysis', {'slow': True})
+    fast = runner.submit('analysis', {'report': 'small'})
+    runner.result(fast, timeout=10)
+    assert runner.get(slow)['status'] != 'succeeded'
+    runner.result(slow, timeout=10)
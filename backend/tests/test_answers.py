@@ -0,0 +1,117 @@
+import pytest
+import sqlalchemy as sa
+
+from app import answers, jobs
+from app.answers import AnswersTableStale, answer_columns, answers_frame, question_summary, rebuild_answers
+from app.models import Submission
+
+FIELDS = [
+    {'id': 'age', 'type': 'number'},
+    {'id': 'Favourite colour', 'type': 'radio'},
+    {'id': 'tags', 'type': 'checkbox', 'options': ['a', 'B!']},
+]
+
+
+@pytest.fixture(autouse=True)
+def drop_side_tables(session):
+    yield
+    answers.metadata.drop_all(session.connection())
+    answers._tables.clear()
+    answers._rebuilding.clear()
+    session.commit()
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Form ids whose rebuild job was submitted; the tests run the rebuild themselves."""
+    submitted = []
+    monkeypatch.setattr(jobs, 'submit', lambda name, form_id: submitted.append((name, form_id)))
+    return submitted
+
+
+def side_table_ids(session, form_id):
+    return sorted(session.execute(sa.text(f'SELECT submission_id FROM form_{form_id}_answers')).scalars())
+
+
+@pytest.fixture
+def form(make_form, session):
+    form = make_form(FIELDS)
+    session.add_all([
+        Submission(form_id=form.id, score=1, responses={'age': 30, 'Favourite colour': 'red', 'tags': ['a']}),
+        Submission(form_id=form.id, score=2, responses={'age': '41', 'Favourite colour': 'blue', 'tags': ['B!']}),
+    ])
+    session.commit()
+    return form
+
+
+def column_names(fields):
+    return {column.key: column.name for column in answer_columns(fields) if column.kind != 'option'}
+
+
+def test_column_names_follow_field_ids_not_positions():
+    names = column_names(FIELDS)
+    assert names['age'] == 'q_age'
+    assert column_names(list(reversed(FIELDS))) == names
+    assert column_names(FIELDS[1:]) == {key: name for key, name in names.items() if key != 'age'}
+    # Ids that slug alike still get their own columns
+    clashing = [{'id': 'colour', 'type': 'text'}, {'id': 'Colour', 'type': 'text'}]
+    assert len(set(column_names(clashing).values())) == 2
+    assert all(len(column.name) <= 63 for column in answer_columns([{'id': 'x' * 100, 'type': 'checkbox',
+                                                                     'options': ['y' * 100]}]))
+
+
+def test_reordering_and_removing_fields_keeps_answers_with_their_questions(session, form):
+    form.fields = [FIELDS[2], FIELDS[0]]
+    session.commit()
+    summary = question_summary(form)
+    assert summary['age']['mean'] == pytest.approx(35.5)
+    assert summary['tags']['counts'] == {'a': 1, 'B!': 1}
+    assert 'Favourite colour' not in summary
+
+
+def test_type_change_leaves_the_rebuild_to_the_job(session, form, queued):
+    form.fields = [{'id': 'age', 'type': 'text'}, *FIELDS[1:]]
+    session.commit()
+    with pytest.raises(AnswersTableStale):
+        answers_frame(form, columns=['q_age'])
+    # A submission arriving meanwhile is stored; its answers wait for the rebuild
+    session.add(Submission(form_id=form.id, score=3, responses={'age': 'n/a'}))
+    session.commit()
+    assert queued == [('rebuild_form_answers', form.id)]
+
+    assert rebuild_answers(form) == 3
+    session.commit()
+    frame = answers_frame(form, columns=['q_age'])
+    assert sorted(frame['q_age']) == ['30', '41', 'n/a']
+    table = sa.inspect(session.connection()).get_columns(f'form_{form.id}_answers')
+    assert {column['name']: column['type'].python_type for column in table}['q_age'] is str
+
+
+def test_a_new_question_is_filled_from_existing_responses(session, form, queued):
+    session.add(Submission(form_id=form.id, score=3, responses={'age': 50, 'city': 'Ipoh'}))
+    session.commit()
+    form.fields = FIELDS + [{'id': 'city', 'type': 'text'}]
+    session.commit()
+    with pytest.raises(AnswersTableStale):
+        question_summary(form)
+    assert queued == [('rebuild_form_answers', form.id)]
+    rebuild_answers(form)
+    session.commit()
+    assert question_summary(form)['city']['top'] == [['Ipoh', 1]]
+
+
+def test_moving_a_submission_removes_it_from_the_old_form(session, form, make_form):
+    other = make_form(FIELDS, title='Other')
+    submission = Submission.query.filter_by(form_id=form.id).first()
+    submission.form_id = other.id
+    session.commit()
+    assert submission.id not in side_table_ids(session, form.id)
+    assert side_table_ids(session, other.id) == [submission.id]
+
+
+def test_the_table_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(answers, 'MAX_CACHED_TABLES', 2)
+    for form_id in range(1, 5):
+        answers.answers_table(form_id, FIELDS)
+    assert [key[0] for key in answers._tables] == [3, 4]
+    assert sorted(answers.metadata.tables) == ['form_3_answers', 'form_4_answers']
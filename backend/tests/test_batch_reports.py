@@ -0,0 +1,54 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import batch_reports
+from app.models import ReportTemplate, Submission, User
+from app.pipeline import JobContext
+from app.tasks import batch_reports_task
+
+
+@pytest.fixture
+def template(session):
+    template = ReportTemplate(name='Summary', schema={'elements': []})
+    session.add(template)
+    session.commit()
+    return template
+
+
+def post(app, user, body):
+    with app.test_request_context():
+        token = create_access_token(identity=user)
+    return app.test_client().post('/api/reports/batch', json=body,
+                                  headers={'Authorization': f'Bearer {token}'})
+
+
+def test_batch_reports_are_admin_only(app, session, template):
+    member = User(email='member@example.com', full_name='Member', role='user')
+    session.add(member)
+    session.commit()
+    assert post(app, member, {'template_id': template.id}).status_code == 403
+
+
+@pytest.mark.parametrize('form_ids', [1, '1,2', [1, '2'], [True], [1.5]])
+def test_form_ids_must_be_a_list_of_integers(app, user, template, form_ids):
+    response = post(app, user, {'template_id': template.id, 'form_ids': form_ids})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'form_ids must be a list of integers'}
+
+
+def test_forms_without_submissions_are_listed_as_skipped(session, user, make_form, template, monkeypatch):
+    full, empty = make_form(title='Full'), make_form(title='Empty')
+    session.add_all(Submission(form_id=full.id, score=i) for i in range(3))
+    session.commit()
+
+    def render_batch(snapshot, schema, output_dir, on_done=None, **kwargs):
+        results = [{'key': key, 'path': f'{output_dir}/{key}.pdf', 'pages': 1, 'rows': stop - start,
+                    'seconds': 0.0} for key, (start, stop) in snapshot.partitions.items()]
+        for done, result in enumerate(results, 1):
+            on_done(result, done, len(results))
+        return results
+    monkeypatch.setattr(batch_reports, 'render_batch', render_batch)
+
+    result = batch_reports_task(JobContext('test'), user.id, template.id, [full.id, empty.id])
+    assert [report['form_id'] for report in result['reports']] == [full.id]
+    assert result['skipped'] == [{'form_id': empty.id, 'reason': 'no submissions'}]
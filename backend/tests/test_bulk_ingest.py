@@ -0,0 +1,111 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from app.ingest import Batch, validate_batch
+
+ROWS = [
+    {'name': 'Ada', 'email': 'ada@example.com', 'score': 90, 'group': 'A', 'date': '2024-03-01T10:00:00Z'},
+    {'name': 'Bob', 'email': 'bob@example.com', 'score': 75.5, 'group': 'B', 'date': '2024-03-01T12:00:00+02:00'},
+    {'name': 'Cy', 'email': 'cy@example.com', 'date': '2024-03-02'},
+]
+
+
+@pytest.fixture
+def client(legacy):
+    return legacy.app.test_client()
+
+
+def stored(legacy):
+    Submission = legacy.Submission
+    return [(s.name, s.score, s.group, s.date) for s in Submission.query.order_by(Submission.id)]
+
+
+def expected_rows():
+    return [
+        ('Ada', 90.0, 'A', datetime(2024, 3, 1, 10)),
+        ('Bob', 75.5, 'B', datetime(2024, 3, 1, 10)),
+        ('Cy', 0.0, 'Default', datetime(2024, 3, 2)),
+    ]
+
+
+def as_csv(rows):
+    lines = ['name,email,score,group,date']
+    for row in rows:
+        lines.append(','.join(str(row.get(key, '')) for key in ('name', 'email', 'score', 'group', 'date')))
+    return '\n'.join(lines) + '\n'
+
+
+def test_json_array(client, legacy):
+    response = client.post('/api/submissions/bulk', json=ROWS)
+    assert response.status_code == 201
+    assert response.get_json()['inserted'] == 3
+    assert stored(legacy) == expected_rows()
+    stats = client.get('/api/dashboard/stats').get_json()
+    assert stats['totalSubmissions'] == 3
+
+
+def test_ndjson_reports_bad_lines_by_row(client, legacy):
+    body = '\n'.join([json.dumps(ROWS[0]), '{not json', json.dumps(ROWS[1]), '', json.dumps(ROWS[2])])
+    response = client.post('/api/submissions/bulk', data=body, content_type='application/x-ndjson')
+    data = response.get_json()
+    assert response.status_code == 201
+    assert data['inserted'] == 3 and data['failed'] == 1
+    assert data['errors'] == [{'row': 1, 'errors': {'row': 'Invalid JSON'}}]
+    assert stored(legacy) == expected_rows()
+
+
+def test_csv_body_and_upload(client, legacy):
+    response = client.post('/api/submissions/bulk', data=as_csv(ROWS[:2]), content_type='text/csv')
+    assert response.get_json()['inserted'] == 2
+
+    upload = {'file': (io.BytesIO(as_csv(ROWS[2:]).encode()), 'rows.csv')}
+    response = client.post('/api/submissions/bulk', data=upload, content_type='multipart/form-data')
+    assert response.get_json()['inserted'] == 1
+    assert stored(legacy) == expected_rows()
+
+
+def test_invalid_rows_are_skipped_and_reported(client, legacy):
+    rows = ROWS + [
+        {'email': 'x@example.com'},
+        {'name': 'Dee', 'email': 'dee@example.com', 'score': 'high', 'date': 'yesterday'},
+        {'name': 'E' * 101, 'email': 'e@example.com', 'score': True},
+    ]
+    data = client.post('/api/submissions/bulk', json=rows).get_json()
+    assert data['inserted'] == 3 and data['failed'] == 3
+    assert data['errors'] == [
+        {'row': 3, 'errors': {'name': 'is required'}},
+        {'row': 4, 'errors': {'score': 'must be a number', 'date': 'must be an ISO 8601 date'}},
+        {'row': 5, 'errors': {'name': 'must be at most 100 characters', 'score': 'must be a number'}},
+    ]
+    assert stored(legacy) == expected_rows()
+
+
+def test_atomic_mode_commits_all_or_nothing(client, legacy):
+    rows = ROWS + [{'name': 'Dee', 'email': 'dee@example.com', 'score': 'high'}]
+    response = client.post('/api/submissions/bulk?atomic=1', json=rows)
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 0 and response.get_json()['failed'] == 1
+    assert stored(legacy) == []
+    assert client.get('/api/dashboard/stats').get_json()['totalSubmissions'] == 0
+
+    response = client.post('/api/submissions/bulk?atomic=1', json=ROWS)
+    assert response.status_code == 201
+    assert stored(legacy) == expected_rows()
+
+
+def test_body_that_is_not_a_list_of_objects_is_rejected(client):
+    response = client.post('/api/submissions/bulk', json={'name': 'Ada'})
+    assert response.status_code == 400
+
+
+def test_valid_rows_convert_the_same_with_or_without_a_bad_neighbour(legacy):
+    # A clean column takes the fast path, one with a bad row goes row by row
+    clean, _ = validate_batch(Batch.from_records([dict(row) for row in ROWS]), legacy.SUBMISSION_SCHEMA)
+    mixed_rows = [dict(row) for row in ROWS] + [{'name': 7, 'email': ' z@example.com ', 'score': 'x',
+                                                   'date': 'never'}]
+    mixed, errors = validate_batch(Batch.from_records(mixed_rows), legacy.SUBMISSION_SCHEMA)
+    assert [error['row'] for error in errors] == [3]
+    assert mixed == clean
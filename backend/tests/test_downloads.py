@@ -0,0 +1,26 @@
+import gzip
+import os
+import threading
+
+from app.downloads import precompress
+
+
+def test_concurrent_precompress_publishes_complete_variants(tmp_path):
+    path = tmp_path / 'report.csv'
+    path.write_text('name,score\n' + 'someone,42\n' * 50000)
+
+    threads = [threading.Thread(target=precompress, args=(str(path),)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(os.listdir(tmp_path)) == ['report.csv', 'report.csv.gz']
+    assert gzip.decompress((tmp_path / 'report.csv.gz').read_bytes()) == path.read_bytes()
+
+
+def test_precompress_drops_variants_that_save_nothing(tmp_path):
+    path = tmp_path / 'noise.csv'
+    path.write_bytes(os.urandom(4096))
+    assert precompress(str(path)) == []
+    assert os.listdir(tmp_path) == ['noise.csv']
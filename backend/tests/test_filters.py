@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.filters import FilterError, apply_filters, validate_filters
+from app.models import Submission
+
+
+@pytest.fixture
+def submissions(session, make_form):
+    form = make_form()
+    recent = datetime.utcnow() - timedelta(days=1)
+    rows = [
+        ('Alice', 'alice@example.com', 10, datetime(2024, 1, 10),
+         {'dept': 'Sales', 'rating': 4, 'address': {'city': 'Oslo'}}),
+        ('Bob', 'bob_1@example.com', 50, datetime(2024, 2, 15), {'dept': 'Ops', 'rating': 2}),
+        ('Carol', 'carol@example.com', 90, recent,
+         {'dept': 'Sales', 'rating': 5, 'address': {'city': 'Rome'}}),
+        ('Dan', None, 70, datetime(2024, 3, 1), {'dept': 'HR'}),
+    ]
+    session.add_all([
+        Submission(form_id=form.id, respondent_name=name, respondent_email=email, score=score,
+                   submitted_at=submitted_at, responses=responses)
+        for name, email, score, submitted_at, responses in rows
+    ])
+    session.commit()
+
+
+def matching(session, spec):
+    query = apply_filters(session.query(Submission.respondent_name), spec)
+    return {name for name, in query}
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ({'field': 'score', 'op': 'eq', 'value': 50}, {'Bob'}),
+    ({'field': 'score', 'op': 'ne', 'value': 50}, {'Alice', 'Carol', 'Dan'}),
+    ({'field': 'score', 'op': 'lt', 'value': 50}, {'Alice'}),
+    ({'field': 'score', 'op': 'lte', 'value': 50}, {'Alice', 'Bob'}),
+    ({'field': 'score', 'op': 'gt', 'value': 70}, {'Carol'}),
+    ({'field': 'score', 'op': 'gte', 'value': 70}, {'Carol', 'Dan'}),
+    ({'field': 'score', 'op': 'between', 'value': [10, 50]}, {'Alice', 'Bob'}),
+    ({'field': 'score', 'op': 'in', 'value': [10, 90]}, {'Alice', 'Carol'}),
+    ({'field': 'score', 'op': 'not_in', 'value': [10, 90]}, {'Bob', 'Dan'}),
+    ({'field': 'submitted_at', 'op': 'between', 'value': ['2024-01-01', '2024-02-28']}, {'Alice', 'Bob'}),
+    ({'field': 'submitted_at', 'op': 'lt', 'value': '2024-02-01'}, {'Alice'}),
+    ({'field': 'submitted_at', 'op': 'within', 'value': {'days': 7}}, {'Carol'}),
+    ({'field': 'respondent_email', 'op': 'contains', 'value': 'example'}, {'Alice', 'Bob', 'Carol'}),
+    ({'field': 'respondent_email', 'op': 'contains', 'value': '_1'}, {'Bob'}),
+    ({'field': 'respondent_email', 'op': 'contains', 'value': '%'}, set()),
+    ({'field': 'respondent_email', 'op': 'is_null'}, {'Dan'}),
+    ({'field': 'respondent_email', 'op': 'is_null', 'value': False}, {'Alice', 'Bob', 'Carol'}),
+    ({'field': 'respondent_email', 'op': 'exists'}, {'Alice', 'Bob', 'Carol'}),
+    ({'field': 'responses.dept', 'op': 'eq', 'value': 'Sales'}, {'Alice', 'Carol'}),
+    ({'field': 'responses.dept', 'op': 'in', 'value': ['Ops', 'HR']}, {'Bob', 'Dan'}),
+    ({'field': 'responses.dept', 'op': 'not_in', 'value': ['Sales']}, {'Bob', 'Dan'}),
+    ({'field': 'responses.rating', 'op': 'gte', 'value': 4}, {'Alice', 'Carol'}),
+    ({'field': 'responses.address.city', 'op': 'exists'}, {'Alice', 'Carol'}),
+    ({'field': 'responses.address.city', 'op': 'exists', 'value': False}, {'Bob', 'Dan'}),
+    ({'field': 'responses.address.city', 'op': 'eq', 'value': 'Rome'}, {'Carol'}),
+    ([{'field': 'score', 'op': 'gt', 'value': 20}, {'field': 'responses.dept', 'value': 'Sales'}], {'Carol'}),
+    ({'any': [{'field': 'score', 'op': 'lt', 'value': 20}, {'field': 'score', 'op': 'gt', 'value': 80}]},
+     {'Alice', 'Carol'}),
+    ({'not': {'field': 'score', 'op': 'eq', 'value': 50}}, {'Alice', 'Carol', 'Dan'}),
+    ({'all': []}, {'Alice', 'Bob', 'Carol', 'Dan'}),
+    ({'any': []}, set()),
+])
+def test_filter_returns_matching_rows(session, submissions, spec, expected):
+    assert matching(session, spec) == expected
+
+
+def test_no_filter_returns_everything(session, submissions):
+    assert matching(session, None) == {'Alice', 'Bob', 'Carol', 'Dan'}
+
+
+@pytest.mark.parametrize('spec', [
+    {'field': 'score', 'op': 'like', 'value': 1},
+    {'field': 'password', 'value': 'x'},
+    {'field': 'score', 'op': 'between', 'value': [1]},
+    {'field': 'score', 'op': 'in', 'value': []},
+    {'field': 'score', 'op': 'in', 'value': [1, 'a']},
+    {'field': 'score', 'op': 'contains', 'value': '1'},
+    {'field': 'score', 'op': 'within', 'value': {'days': 1}},
+    {'field': 'submitted_at', 'op': 'within', 'value': {'years': 1}},
+    {'field': 'submitted_at', 'value': 'yesterday'},
+    {'field': 'submitted_at', 'op': 'within', 'value': {'days': 1e10}},
+    {'field': 'submitted_at', 'op': 'within', 'value': {'weeks': 10 ** 8}},
+    {'field': 'score', 'value': 'abc'},
+    {'field': 'score', 'op': 'gt', 'value': True},
+    {'field': 'score', 'op': 'between', 'value': [1, '9']},
+    {'field': 'form_id', 'op': 'in', 'value': [1.5]},
+    {'field': 'respondent_email', 'value': 7},
+    {'field': 'responses.', 'value': 1},
+    {'field': 'score', 'value': 1, 'extra': True},
+    {'all': [], 'any': []},
+    'score > 1',
+])
+def test_invalid_filters_are_rejected(spec):
+    with pytest.raises(FilterError):
+        validate_filters(spec)
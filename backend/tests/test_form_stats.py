@@ -0,0 +1,174 @@
+import pytest
+from sqlalchemy import event
+
+from app.form_stats import form_stats, rebuild_form_stats
+from app.models import Form, Submission
+
+FIELDS = [
+    {'id': 'colour', 'type': 'radio', 'options': ['red', 'green', 'blue']},
+    {'id': 'tags', 'type': 'checkbox', 'options': ['a', 'b', 'c']},
+    {'id': 'comment', 'type': 'text'},
+]
+
+
+def comparable(stats):
+    """The parts of ``form_stats`` that running totals and a rebuild must agree on."""
+    scores = dict(stats['scores'])
+    quantiles = scores.pop('quantiles', {})
+    return {
+        'submissions': stats['submissions'],
+        'count': scores['count'],
+        'mean': pytest.approx(scores.get('mean')),
+        'variance': pytest.approx(scores.get('variance')),
+        'quantiles': {name: pytest.approx(value) for name, value in quantiles.items()},
+        'questions': stats['questions'],
+    }
+
+
+def assert_matches_rebuild(session, *forms):
+    running = {form.id: comparable(form_stats(form.id)) for form in forms}
+    for form in forms:
+        rebuild_form_stats(form)
+    session.commit()
+    for form in forms:
+        rebuilt = form_stats(form.id)
+        assert rebuilt['removed_since_rebuild'] == 0
+        assert running[form.id] == comparable(rebuilt)
+
+
+@pytest.fixture
+def forms(make_form):
+    return make_form(FIELDS, 'First'), make_form(FIELDS, 'Second')
+
+
+def submission(form, score, colour=None, tags=None, comment='free text'):
+    responses = {'comment': comment}
+    if colour is not None:
+        responses['colour'] = colour
+    if tags is not None:
+        responses['tags'] = tags
+    return Submission(form_id=form.id, score=score, responses=responses)
+
+
+def test_insert(session, forms):
+    first, second = forms
+    session.add_all([
+        submission(first, 10, 'red', ['a']),
+        submission(first, 20, 'green', ['a', 'b']),
+        submission(first, None, 'red'),
+        submission(second, 5, 'blue', ['c']),
+    ])
+    session.commit()
+    session.add(submission(first, 30, 'blue', []))
+    session.commit()
+
+    stats = form_stats(first.id)
+    assert stats['submissions'] == 4
+    assert stats['scores']['count'] == 3
+    assert stats['scores']['mean'] == pytest.approx(20)
+    assert stats['questions'] == {'colour': {'red': 2, 'green': 1, 'blue': 1}, 'tags': {'a': 2, 'b': 1}}
+    assert_matches_rebuild(session, first, second)
+
+
+def test_update(session, forms):
+    first, second = forms
+    rows = [submission(first, score, 'red', ['a']) for score in (10, 20, 30)]
+    session.add_all(rows)
+    session.commit()
+
+    rows[0].score = 15
+    rows[1].responses = {'colour': 'green', 'tags': ['b', 'c']}
+    rows[2].score = None
+    session.commit()
+    # Updates that touch nothing the stats use leave them alone
+    rows[0].respondent_name = 'Renamed'
+    session.commit()
+
+    stats = form_stats(first.id)
+    assert stats['scores']['count'] == 2
+    assert stats['scores']['mean'] == pytest.approx(17.5)
+    assert stats['questions'] == {'colour': {'red': 2, 'green': 1}, 'tags': {'a': 2, 'b': 1, 'c': 1}}
+    assert_matches_rebuild(session, first, second)
+
+
+def test_delete(session, forms):
+    first, second = forms
+    rows = [submission(first, score, colour) for score, colour in ((10, 'red'), (20, 'green'), (30, 'red'))]
+    session.add_all(rows)
+    session.commit()
+
+    session.delete(rows[1])
+    session.delete(rows[2])
+    session.commit()
+
+    stats = form_stats(first.id)
+    assert stats['submissions'] == 1
+    assert stats['removed_since_rebuild'] == 2
+    # Answers whose count drops to zero are removed from the histogram
+    assert stats['questions'] == {'colour': {'red': 1}}
+    assert_matches_rebuild(session, first, second)
+
+
+def test_move_between_forms(session, forms):
+    first, second = forms
+    rows = [submission(first, score, 'red', ['a']) for score in (10, 20)]
+    session.add_all(rows + [submission(second, 40, 'blue')])
+    session.commit()
+
+    rows[0].form_id = second.id
+    session.commit()
+    rows[1].form_id = second.id
+    rows[1].score = 25
+    session.commit()
+
+    assert form_stats(first.id)['submissions'] == 0
+    stats = form_stats(second.id)
+    assert stats['submissions'] == 3
+    assert stats['scores']['mean'] == pytest.approx(25)
+    assert_matches_rebuild(session, first, second)
+
+
+def test_rollback_discards_pending_changes(session, forms):
+    first, second = forms
+    session.add(submission(first, 10, 'red'))
+    session.commit()
+
+    session.add(submission(first, 99, 'green'))
+    session.flush()
+    session.rollback()
+
+    assert form_stats(first.id)['submissions'] == 1
+    assert_matches_rebuild(session, first, second)
+
+
+def test_fields_are_read_once_per_flush(session, forms):
+    first, second = forms
+    statements = []
+
+    def count_form_reads(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('SELECT form.fields'):
+            statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, 'before_cursor_execute', count_form_reads)
+    try:
+        session.add_all([submission(first, score, 'red') for score in range(20)]
+                        + [submission(second, 5, 'blue')])
+        session.commit()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_form_reads)
+
+    assert len(statements) == 2
+    assert form_stats(first.id)['submissions'] == 20
+    assert_matches_rebuild(session, first, second)
+
+
+def test_stats_follow_fields_changed_in_the_same_flush(session, forms):
+    first, second = forms
+    form = session.get(Form, first.id)
+    form.fields = [{'id': 'colour', 'type': 'text'}]
+    session.add(submission(first, 10, 'red'))
+    session.commit()
+
+    assert form_stats(first.id)['questions'] == {}
+    assert_matches_rebuild(session, first, second)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from app.models import Submission
+from app.pagination import json_array_chunks, keyset_page, ndjson_lines, parse_limit, stream_rows
+
+
+@pytest.fixture
+def submissions(session, make_form):
+    form = make_form()
+    session.add_all(Submission(id=i, form_id=form.id, score=i) for i in range(1, 6))
+    session.commit()
+    return Submission.query
+
+
+def ids(rows):
+    return [row.id for row in rows]
+
+
+def test_streams_apply_the_limit_and_cursor_of_a_page(submissions):
+    columns = [Submission.id]
+    page, cursor = keyset_page(submissions, columns, limit=2)
+
+    rows = stream_rows(submissions, columns, limit=2)
+    assert ids(rows) == ids(page) == [1, 2]
+    assert rows.next_cursor == cursor
+
+    rows = stream_rows(submissions, columns, after=cursor, limit=1)
+    assert ids(rows) == [3]
+    assert ids(stream_rows(submissions, columns, after=rows.next_cursor)) == [4, 5]
+
+
+def test_enveloped_json_streams_carry_the_next_cursor(submissions):
+    columns = [Submission.id]
+    serialize = lambda row: row.id  # noqa: E731
+
+    limited = json.loads(''.join(json_array_chunks(stream_rows(submissions, columns, limit=1),
+                                                   serialize, envelope='data')))
+    assert limited['data'] == [1]
+    assert ids(stream_rows(submissions, columns, after=limited['next_cursor'], limit=1)) == [2]
+
+    last = json.loads(''.join(json_array_chunks(stream_rows(submissions, columns, limit=5),
+                                                serialize, envelope='data')))
+    assert last == {'data': [1, 2, 3, 4, 5], 'next_cursor': None}
+    assert json.loads(''.join(json_array_chunks(stream_rows(submissions, columns),
+                                                serialize, envelope='data'))) == {'data': [1, 2, 3, 4, 5]}
+    assert ''.join(ndjson_lines(stream_rows(submissions, columns, limit=1), serialize)) == '1\n'
+
+
+def test_stream_limits_are_validated_but_not_capped():
+    assert parse_limit(None, default=None, maximum=None) is None
+    assert parse_limit('50000', default=None, maximum=None) == 50000
+    with pytest.raises(ValueError):
+        parse_limit('0', default=None, maximum=None)
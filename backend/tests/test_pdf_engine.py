@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from app.services.pdf_engine import fill, formatter
+
+SECRET = 'not-for-templates'
+
+
+@pytest.fixture
+def data(monkeypatch):
+    monkeypatch.setenv('PDF_ENGINE_SECRET', SECRET)
+    return {'title': 'Monthly', 'count': 3, 'summary': lambda: {'count': 3}, 'rows': [{'name': 'a'}]}
+
+
+def test_fill_formats_plain_fields(data):
+    assert fill('{title}: {count:>3} of {missing}', data) == 'Monthly:   3 of '
+
+
+@pytest.mark.parametrize('text', [
+    '{summary.__globals__[os].environ}',
+    '{summary.__globals__}',
+    '{rows[0]}',
+    '{title.__class__}',
+    '{count:{summary.__globals__}}',
+])
+def test_fill_rejects_attribute_and_index_lookups(data, text):
+    assert fill(text, data) == text
+    assert SECRET not in fill(text, data)
+
+
+def test_fill_leaves_callables_empty(data):
+    assert fill('[{summary}]', data) == '[]'
+
+
+def test_value_formats_cannot_traverse_the_value():
+    format_value = formatter('{0.__class__.__init__.__globals__[os].environ}')
+    assert format_value(os) == str(os)
+    assert formatter('{:.1f}')(2.25) == '2.2'
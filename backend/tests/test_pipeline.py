@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from app.pipeline import CANCELLED, FAILED, SUCCEEDED, ThreadBackend, job
+
+finished = []
+release = threading.Event()
+
+
+def record_finish(status, label):
+    finished.append((status, label))
+
+
+@job('test_blocking', on_finished=record_finish)
+def blocking_job(ctx, label):
+    release.wait(5)
+    ctx.check_cancelled()
+    return label
+
+
+@job('test_failing', retries=1, retry_delay=0, on_finished=record_finish)
+def failing_job(ctx, label):
+    raise RuntimeError(f'{label} broke')
+
+
+@pytest.fixture
+def backend(app):
+    finished.clear()
+    release.clear()
+    backend = ThreadBackend(app, max_workers=1)
+    yield backend
+    release.set()
+    backend.executor.shutdown(wait=True)
+
+
+def wait(backend, job_id):
+    backend.executor.submit(lambda: None).result(5)
+    return backend.get(job_id)
+
+
+def test_job_cancelled_while_queued_runs_its_finish_hook(backend):
+    running = backend.submit('test_blocking', ('running',), {})
+    queued = backend.submit('test_blocking', ('queued',), {})
+    assert backend.cancel(queued)
+    release.set()
+
+    assert wait(backend, running)['status'] == SUCCEEDED
+    state = wait(backend, queued)
+    assert state['status'] == CANCELLED
+    assert state['attempts'] == 1
+    assert finished == [(SUCCEEDED, 'running'), (CANCELLED, 'queued')]
+
+
+def test_finish_hook_runs_once_after_the_last_retry(backend):
+    state = wait(backend, backend.submit('test_failing', ('export',), {}))
+    assert state['status'] == FAILED
+    assert state['error'] == 'export broke'
+    assert state['attempts'] == 2
+    assert finished == [(FAILED, 'export')]
@@ -0,0 +1,88 @@
+"""Routing between two SQLite files: a primary and a replica that lags or lacks the schema."""
+import pytest
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+
+from app.replica import RoutingSession, configure_replica, read_replica, read_with_fallback, replica_caught_up
+
+replica_db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+class Entry(replica_db.Model):
+    id = replica_db.Column(replica_db.Integer, primary_key=True)
+    label = replica_db.Column(replica_db.String(20))
+
+
+class Tag(replica_db.Model):
+    id = replica_db.Column(replica_db.Integer, primary_key=True)
+
+
+def labels():
+    return [entry.label for entry in Entry.query.order_by(Entry.id)]
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make_app(replica_schema=True):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path}/primary.db'
+        configure_replica(app, f'sqlite:///{tmp_path}/replica.db')
+        replica_db.init_app(app)
+
+        @app.route('/entries')
+        @read_replica
+        def entries():
+            try:
+                return jsonify(labels())
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
+        with app.app_context():
+            replica_db.create_all(bind_key=[None])
+            replica_db.session.add(Entry(id=1, label='primary'))
+            replica_db.session.commit()
+            if replica_schema:
+                # A replica that has caught up to a different row, to tell them apart
+                Entry.__table__.create(replica_db.engines['replica'])
+                with replica_db.engines['replica'].begin() as connection:
+                    connection.execute(Entry.__table__.insert(), {'id': 1, 'label': 'replica'})
+        return app
+    return make_app
+
+
+def test_read_replica_views_read_from_the_replica(make_app):
+    app = make_app()
+    assert app.test_client().get('/entries').get_json() == ['replica']
+    with app.app_context():
+        assert labels() == ['primary']
+
+
+def test_views_fall_back_to_the_primary_when_the_replica_lacks_the_schema(make_app):
+    app = make_app(replica_schema=False)
+    client = app.test_client()
+    assert client.get('/entries').get_json() == ['primary']
+    # Marked down, so later requests skip it without failing first
+    assert client.get('/entries').get_json() == ['primary']
+
+
+def test_jobs_read_the_replica_only_once_it_has_caught_up(make_app):
+    app = make_app()
+    with app.app_context():
+        assert replica_caught_up(Entry.id)
+        assert read_with_fallback(labels, Entry.id) == ['replica']
+
+        replica_db.session.add(Entry(id=2, label='new'))
+        replica_db.session.commit()
+        assert not replica_caught_up(Entry.id)
+        assert read_with_fallback(labels, Entry.id) == ['primary', 'new']
+        assert read_with_fallback(labels, Entry.id, target=1) == ['replica']
+
+
+def test_jobs_fall_back_to_the_primary_when_the_replica_fails(make_app):
+    app = make_app()
+    with app.app_context():
+        # Caught up on entries, but the replica has no tag table
+        assert read_with_fallback(lambda: (labels(), Tag.query.count()), Entry.id) == (['primary'], 0)
+
+        Entry.__table__.drop(replica_db.engines['replica'])
+        assert read_with_fallback(labels, Entry.id) == ['primary']
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+
+from app.form_stats import form_stats
+from app.models import Submission
+from app.services.response_sync import ResponseSync, SheetsBatchWriter, parse_timestamp
+
+
+class Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeForms:
+    """Answers ``forms().responses().list(...)`` like the Forms API, from a list of responses."""
+
+    def __init__(self):
+        self.items = []
+        self.requests = []
+
+    def forms(self):
+        return self
+
+    def responses(self):
+        return self
+
+    def list(self, formId, pageSize, filter=None, pageToken=None):
+        self.requests.append({'filter': filter, 'pageToken': pageToken})
+        matching = self.items
+        if filter:
+            since = parse_timestamp(filter.split('>=')[1].strip())
+            matching = [r for r in matching if parse_timestamp(r['lastSubmittedTime']) >= since]
+        start = int(pageToken or 0)
+        page = {'responses': matching[start:start + pageSize]}
+        if start + pageSize < len(matching):
+            page['nextPageToken'] = str(start + pageSize)
+        return Call(page)
+
+    def add(self, response_id, submitted, score, colour):
+        self.items = [r for r in self.items if r['responseId'] != response_id]
+        self.items.append({
+            'responseId': response_id,
+            'createTime': submitted,
+            'lastSubmittedTime': submitted,
+            'totalScore': score,
+            'answers': {'colour': {'textAnswers': {'answers': [{'value': colour}]}}},
+        })
+
+
+@pytest.fixture
+def forms_api():
+    api = FakeForms()
+    api.add('r1', '2024-03-01T10:00:00.000000Z', 5, 'red')
+    api.add('r2', '2024-03-01T11:00:00.123456789Z', 7, 'blue')
+    api.add('r3', '2024-03-02T09:30:00Z', 9, 'red')
+    return api
+
+
+@pytest.fixture
+def form(make_form, session):
+    form = make_form(fields=[{'id': 'colour', 'type': 'radio', 'options': ['red', 'blue']}])
+    form.google_form_id = 'google-form'
+    session.commit()
+    return form
+
+
+def stored(session, form):
+    return sorted(session.query(Submission.google_response_id, Submission.score)
+                  .filter(Submission.form_id == form.id))
+
+
+def test_first_sync_pages_through_every_response(session, form, forms_api):
+    stats = ResponseSync(forms_api, page_size=2).sync_form(form)
+
+    assert stats['fetched'] == 3 and stats['inserted'] == 3 and stats['updated'] == 0
+    assert [request['pageToken'] for request in forms_api.requests] == [None, '2']
+    assert forms_api.requests[0]['filter'] is None
+    assert form.responses_synced_at == datetime(2024, 3, 2, 9, 30)
+    assert stored(session, form) == [('r1', 5), ('r2', 7), ('r3', 9)]
+
+
+def test_later_syncs_start_at_the_cursor_and_skip_duplicates(session, form, forms_api):
+    sync = ResponseSync(forms_api, page_size=2)
+    sync.sync_form(form)
+    forms_api.requests.clear()
+
+    # Nothing new: only the response at the cursor comes back, and it is not stored twice
+    stats = sync.sync_form(form)
+    assert forms_api.requests[0]['filter'] == 'timestamp >= 2024-03-02T09:30:00.000000Z'
+    assert stats['fetched'] == 1 and stats['inserted'] == 0 and stats['updated'] == 1
+    assert stored(session, form) == [('r1', 5), ('r2', 7), ('r3', 9)]
+
+    forms_api.add('r4', '2024-03-03T08:00:00Z', 4, 'blue')
+    forms_api.add('r3', '2024-03-03T07:00:00Z', 10, 'blue')  # edited after the last sync
+    stats = sync.sync_form(form)
+    assert stats['inserted'] == 1 and stats['updated'] == 1
+    assert form.responses_synced_at == datetime(2024, 3, 3, 8)
+    assert stored(session, form) == [('r1', 5), ('r2', 7), ('r3', 10), ('r4', 4)]
+    assert form_stats(form.id)['submissions'] == 4
+
+
+def test_sheet_updates_go_out_in_as_few_calls_as_possible():
+    calls = []
+
+    class Sheets:
+        def spreadsheets(self):
+            return self
+
+        def values(self):
+            return self
+
+        def batchUpdate(self, spreadsheetId, body):
+            calls.append(len(body['data']))
+            return Call({})
+
+    writer = SheetsBatchWriter(Sheets(), 'sheet')
+    for row in range(1200):
+        writer.add(f'A{row}', [[row]])
+    writer.flush()
+    assert calls == [500, 500, 200]
+    assert writer.calls == 3
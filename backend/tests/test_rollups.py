@@ -0,0 +1,92 @@
+import pytest
+
+from app.aggregates import histogram_bucket, histogram_percentile
+
+BULK = [
+    {'name': 'Ada', 'email': 'ada@example.com', 'score': 90, 'group': 'A', 'date': '2024-03-01T10:00:00'},
+    {'name': 'Bob', 'email': 'bob@example.com', 'score': 90, 'group': 'A', 'date': '2024-03-01T11:00:00'},
+    {'name': 'Cy', 'email': 'cy@example.com', 'score': 72.345, 'group': 'B', 'date': '2024-03-01T23:59:59'},
+    {'name': 'Dee', 'email': 'dee@example.com', 'group': 'B', 'date': '2024-03-02T00:00:00'},
+    {'name': 'Eve', 'email': 'eve@example.com', 'score': 0, 'group': '', 'date': '2024-03-02T08:00:00'},
+    {'name': 'Fay', 'email': 'fay@example.com', 'score': 12.5, 'date': '2024-03-03T08:00:00'},
+]
+
+
+@pytest.fixture
+def client(legacy):
+    return legacy.app.test_client()
+
+
+def rollup_state(legacy):
+    """Every rollup and histogram row, comparable between running totals and a rebuild."""
+    rollups = {
+        (r.scope, r.key): (r.count, r.score_count, pytest.approx(r.score_sum),
+                           None if r.score_max is None else pytest.approx(r.score_max))
+        for r in legacy.SubmissionRollup.query
+    }
+    buckets = {b.bucket: b.count for b in legacy.ScoreBucket.query}
+    return rollups, buckets
+
+
+def assert_matches_rebuild(legacy, client):
+    running, running_stats = rollup_state(legacy), client.get('/api/dashboard/stats?days=100000').get_json()
+    legacy.rebuild_rollups()
+    assert rollup_state(legacy) == running
+    assert client.get('/api/dashboard/stats?days=100000').get_json() == running_stats
+
+
+def test_single_and_bulk_submissions_match_a_rebuild(legacy, client):
+    for score, group in ((40, 'A'), (0, 'B'), (55.555, 'C')):
+        response = client.post('/api/submissions', json={'name': 'N', 'email': 'n@example.com',
+                                                          'score': score, 'group': group})
+        assert response.status_code == 201
+    assert client.post('/api/submissions/bulk', json=BULK[:3]).status_code == 201
+    assert client.post('/api/submissions/bulk', json=BULK[3:]).status_code == 201
+
+    rollups, buckets = rollup_state(legacy)
+    assert rollups[('all', '')][:2] == (9, 6)
+    assert rollups[('group', 'A')][:2] == (3, 3)
+    # An empty group is missing, like an empty CSV cell, so it takes the default
+    assert rollups[('group', 'Default')][:2] == (2, 1)
+    assert rollups[('day', '2024-03-01')][:2] == (3, 3)
+    assert buckets[histogram_bucket(90)] == 2
+    assert_matches_rebuild(legacy, client)
+
+
+def test_rejected_rows_are_left_out_of_the_rollups(legacy, client):
+    rows = BULK + [{'name': 'Gil', 'email': 'gil@example.com', 'score': 'high'}]
+    assert client.post('/api/submissions/bulk?atomic=1', json=rows).status_code == 200
+    assert rollup_state(legacy) == ({}, {})
+
+    assert client.post('/api/submissions/bulk', json=rows).get_json()['inserted'] == len(BULK)
+    assert_matches_rebuild(legacy, client)
+
+
+def test_dashboard_percentiles_interpolate_between_scored_submissions(legacy, client):
+    rows = [{'name': 'N', 'email': 'n@example.com', 'score': score} for score in (40, 10, 30, 20, 0)]
+    client.post('/api/submissions/bulk', json=rows)
+
+    stats = client.get('/api/dashboard/stats').get_json()
+    assert stats['totalSubmissions'] == 5
+    # The unscored 0 is left out: the quantiles are over 10, 20, 30 and 40
+    assert stats['percentiles'] == {'p25': 17.5, 'p50': 25.0, 'p75': 32.5, 'p90': 37.0}
+    assert stats['medianScore'] == 25.0
+    assert stats['averageScore'] == 25.0 and stats['topScore'] == 40
+
+
+@pytest.mark.parametrize('scores, q, expected', [
+    ([], 0.5, 0),
+    ([7], 0.9, 7),
+    ([1, 2, 3], 0.5, 2),
+    ([1, 2, 3, 4], 0.5, 2.5),
+    ([5, 5, 5, 10], 0.5, 5),
+    ([5, 5, 5, 10], 0.9, 8.5),
+    ([1, 2, 3, 4], 0, 1),
+    ([1, 2, 3, 4], 1, 4),
+    ([1.234, 1.236], 0.5, 1.235),
+])
+def test_histogram_percentile(scores, q, expected):
+    buckets = {}
+    for score in scores:
+        buckets[histogram_bucket(score)] = buckets.get(histogram_bucket(score), 0) + 1
+    assert histogram_percentile(sorted(buckets.items()), len(scores), q) == pytest.approx(expected)
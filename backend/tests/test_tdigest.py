@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.tdigest import TDigest
+
+QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+# Allowed error, as a fraction of the population, in the rank of each estimate
+RANK_TOLERANCE = 0.01
+
+
+def rank_error(values, q, estimate):
+    ordered = sorted(values)
+    below = sum(1 for value in ordered if value < estimate)
+    return abs(below / len(ordered) - q)
+
+
+@pytest.fixture
+def values():
+    rng = random.Random(7)
+    return [rng.gauss(50, 15) for _ in range(20000)] + [rng.uniform(0, 1000) for _ in range(500)]
+
+
+def test_quantiles_after_add(values):
+    digest = TDigest()
+    digest.update(values)
+    restored = TDigest.from_list(digest.to_list())
+
+    assert restored.total == len(values)
+    assert len(restored) <= digest.compression
+    for q in QUANTILES:
+        assert rank_error(values, q, restored.quantile(q)) <= RANK_TOLERANCE
+
+
+def test_quantiles_after_remove(values):
+    rng = random.Random(11)
+    digest = TDigest()
+    digest.update(values)
+    removed = set(rng.sample(range(len(values)), len(values) // 4))
+    for index in removed:
+        digest.remove(values[index])
+    kept = [value for index, value in enumerate(values) if index not in removed]
+
+    assert digest.total == pytest.approx(len(kept))
+    for q in QUANTILES:
+        assert rank_error(kept, q, digest.quantile(q)) <= RANK_TOLERANCE
+
+
+def test_small_digest_is_exact():
+    digest = TDigest()
+    digest.update([1, 2, 3, 4, 5])
+    assert digest.quantile(0) == 1
+    assert digest.quantile(0.5) == 3
+    assert digest.quantile(1) == 5
+    digest.remove(5)
+    assert digest.quantile(1) == 4
+    assert TDigest().quantile(0.5) is None
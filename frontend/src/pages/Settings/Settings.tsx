@@ -43,13 +43,28 @@ export default function Settings() {
   const [isTestingConnection, setIsTestingConnection] = useState(false);
 
   const updateSettingsMutation = useMutation({
-    mutationFn: async (data: any) => {
+    mutationFn: async (data: Record<string, unknown>) => {
+      const token = localStorage.getItem('token');
       const response = await fetch('/api/settings', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        },
         body: JSON.stringify(data),
       });
-      return response.json();
+      const body = await response.json().catch(() => ({}));
+      if (response.status === 401) {
+        localStorage.removeItem('token');
+        throw new Error('Your session has expired. Please sign in again.');
+      }
+      if (response.status === 403) {
+        throw new Error('Only administrators can change settings.');
+      }
+      if (!response.ok) {
+        throw new Error(body.error || 'Error updating settings. Please try again.');
+      }
+      return body;
     },
   });
 
@@ -72,9 +87,25 @@ export default function Settings() {
 
   const handleSaveSettings = async (event: React.FormEvent) => {
     event.preventDefault();
-    const formData = new FormData(event.target as HTMLFormElement);
-    const data = Object.fromEntries(formData.entries());
-    await updateSettingsMutation.mutateAsync(data);
+    const form = event.target as HTMLFormElement;
+    const data: Record<string, unknown> = {};
+    Array.from(form.elements).forEach((element) => {
+      const input = element as HTMLInputElement;
+      if (!input.name) return;
+      if (input.type === 'checkbox') {
+        data[input.name] = input.checked;
+      } else if (input.type === 'password' && !input.value) {
+        // Leave stored credentials alone unless a new one was typed
+        return;
+      } else {
+        data[input.name] = input.value;
+      }
+    });
+    try {
+      await updateSettingsMutation.mutateAsync(data);
+    } catch {
+      // Shown through updateSettingsMutation.error below
+    }
   };
 
   return (
@@ -263,7 +294,8 @@ export default function Settings() {
 
         {updateSettingsMutation.isError && (
           <Alert severity="error" sx={{ m: 3 }}>
-            Error updating settings. Please try again.
+            {(updateSettingsMutation.error as Error)?.message ||
+              'Error updating settings. Please try again.'}
           </Alert>
         )}
       </Paper>
@@ -77,9 +77,24 @@ export const updateReportTemplate = async (
   return data;
 };
 
-export const analyzeData = async (data: any): Promise<any> => {
-  const { data: result } = await api.post('/ai/analyze', data);
-  return result;
+// Analysis runs in the background: the POST answers 202 with a request id
+// until the result is ready, so poll it.
+export const analyzeData = async (data: any, pollInterval = 1000): Promise<any> => {
+  const response = await api.post('/ai/analyze', data, { params: { wait: 5 } });
+  if (response.status !== 202) {
+    return response.data;
+  }
+  const requestId = response.data.request_id;
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, pollInterval));
+    const { data: state } = await api.get(`/ai/analyze/${requestId}`);
+    if (state.status === 'succeeded') {
+      return state.result;
+    }
+    if (state.status === 'failed') {
+      throw new Error(state.error || 'Analysis failed');
+    }
+  }
 };
 
 // Error handler